@@ -1,6 +1,10 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import CustomUser, UserDocument
+from django.db import connections, transaction
+
+from . import search
+from .models import CustomUser, DocumentBlob, StorageUsage, UserDocument
+from .storage import add_usage
 
 #注册自定义用户模型到后台
 admin.site.register(CustomUser, UserAdmin)
@@ -9,4 +13,40 @@ admin.site.register(CustomUser, UserAdmin)
 @admin.register(UserDocument)
 class UserDocumentAdmin(admin.ModelAdmin):
     list_display = ('title', 'owner', 'uploaded_at')
+    list_select_related = ('owner',)
     search_fields = ('title', 'owner__username')
+
+    def get_search_results(self, request, queryset, search_term):
+        # 用全文索引代替对两张表的 LIKE '%...%' 扫描；搜索词太短或不是 SQLite 时仍用 search_fields
+        match = search.match_expression(search_term)
+        if match is None or not search.is_supported(connections[queryset.db]):
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(pk__in=search.matching_ids(match)), False
+
+    def save_model(self, request, obj, form, change):
+        # 在后台上传、替换文件或修改所有者时同步存储用量（后台不检查配额）
+        old = UserDocument.objects.filter(pk=obj.pk).values_list('owner_id', 'size').first() if change else None
+        if 'document' in form.changed_data:
+            obj.size = obj.document.size
+        with transaction.atomic():
+            super().save_model(request, obj, form, change)
+            if old != (obj.owner_id, obj.size):
+                if old is not None:
+                    add_usage(old[0], -old[1])
+                add_usage(obj.owner_id, obj.size)
+
+#注册内容寻址存储的文档数据（只读查看引用计数）
+@admin.register(DocumentBlob)
+class DocumentBlobAdmin(admin.ModelAdmin):
+    list_display = ('sha256', 'content_type', 'size', 'page_count', 'refcount', 'created_at')
+    search_fields = ('sha256',)
+    readonly_fields = ('sha256', 'file', 'size', 'content_type', 'refcount', 'created_at', 'page_count', 'processed_at')
+
+#注册存储用量（由上传、删除文档时增量维护，只读查看）
+@admin.register(StorageUsage)
+class StorageUsageAdmin(admin.ModelAdmin):
+    list_display = ('user', 'used_bytes')
+    list_select_related = ('user',)
+    search_fields = ('user__username',)
+    ordering = ('-used_bytes',)
+    readonly_fields = ('user', 'used_bytes')
@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate, pre_migrate
 
 
 class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounts'
+
+    def ready(self):
+        from . import signals  # 注册信号处理函数
+        pre_migrate.connect(signals.drop_search_triggers, sender=self)
+        post_migrate.connect(signals.install_search_index, sender=self)
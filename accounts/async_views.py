@@ -0,0 +1,140 @@
+"""
+accounts 的异步视图，ASGI 部署（myproject/settings/asgi.py，ASYNC_VIEWS = True）时由 accounts/urls.py 使用
+与 views.py 中的同名视图行为一致，数据库操作使用异步 ORM，表单校验等同步代码放到线程中执行
+"""
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth import alogin
+from django.contrib.auth.decorators import login_required
+from django.contrib.auth.forms import AuthenticationForm
+from django.shortcuts import redirect, render, resolve_url
+from django.utils.http import url_has_allowed_host_and_scheme
+from django.utils.translation import gettext_lazy as _  #翻译相关
+from django.views import View
+from django.views.decorators.cache import never_cache
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from django.views.decorators.debug import sensitive_post_parameters
+
+from .forms import DocumentUploadForm, ProfileForm, RegisterForm
+from .hashing import arun
+from .models import UserDocument
+from .pagination import apaginate_documents
+from .uploads import ContentAddressedUploadHandler
+from .views import document_list, download_document, search_documents  # 这几个视图保持同步
+
+logger = logging.getLogger(__name__)
+
+
+async def load_user(request):
+    """
+    异步地取出当前用户并替换 request.user
+    模板（auth 上下文处理器）会访问 request.user，惰性加载会在事件循环中查询数据库而报错
+    """
+    request.user = await request.auser()
+    return request.user
+
+
+class CustomLoginView(View):
+    """CustomLoginView 的异步版本，认证（数据库查询和密码哈希）在密码哈希线程池中执行，不阻塞事件循环"""
+    template_name = 'accounts/login.html'
+    redirect_field_name = 'next'
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # 装饰 as_view 返回的协程函数（method_decorator 装饰的 dispatch 会被当作同步函数）
+        view = super().as_view(**initkwargs)
+        return sensitive_post_parameters()(csrf_protect(never_cache(view)))
+
+    def get_success_url(self):
+        redirect_to = self.request.POST.get(self.redirect_field_name, self.request.GET.get(self.redirect_field_name))
+        if redirect_to and url_has_allowed_host_and_scheme(
+            redirect_to, allowed_hosts={self.request.get_host()}, require_https=self.request.is_secure()
+        ):
+            return redirect_to
+        return resolve_url(settings.LOGIN_REDIRECT_URL)
+
+    def render_form(self, form):
+        return render(self.request, self.template_name, {
+            'form': form,
+            self.redirect_field_name: self.request.GET.get(self.redirect_field_name, ''),
+        })
+
+    async def get(self, request, *args, **kwargs):
+        if (await load_user(request)).is_authenticated:
+            return redirect(self.get_success_url())
+        return self.render_form(AuthenticationForm(request))
+
+    async def post(self, request, *args, **kwargs):
+        await load_user(request)
+        form = AuthenticationForm(request, data=request.POST)
+        # 哈希名额和排队都已占满时抛出 PoolSaturated，由 PasswordHashingBusyMiddleware 返回 503
+        if await arun(form.is_valid):
+            await alogin(request, form.get_user())
+            return redirect(self.get_success_url())
+        messages.error(request, _("Invalid username or password"))  # 登录错误提示
+        return self.render_form(form)
+
+
+async def register(request):
+    await load_user(request)
+    if request.method == 'POST':
+        form = RegisterForm(request.POST, request.FILES)
+        if await sync_to_async(form.is_valid)():
+            user = await arun(form.save, commit=False)  # 密码哈希较慢，取得哈希名额后在线程中执行
+            await user.asave()
+            await alogin(request, user)
+            messages.success(request, _("Registration successful!"))  # 注册成功提示
+            logger.info("User %s registered and logged in", user.username)
+            return redirect('profile')
+        else:
+            logger.info("Registration form errors: %s", form.errors.as_json())
+            messages.error(request, _("Please correct the errors below"))
+    else:
+        form = RegisterForm()
+    return render(request, 'accounts/register.html', {'form': form})
+
+@login_required
+async def profile(request):
+    user = await load_user(request)
+    if request.method == 'POST':
+        form = ProfileForm(request.POST, request.FILES, instance=user)
+        if await sync_to_async(form.is_valid)():
+            await form.asave()
+            messages.success(request, _("Profile updated successfully"))  # 资料更新提示
+            return redirect('profile')
+        else:
+            messages.warning(request, _("Failed to update profile"))
+    else:
+        form = ProfileForm(instance=user)
+
+    documents, next_cursor = await apaginate_documents(UserDocument.objects.filter(owner=user))
+    return render(request, 'accounts/profile.html', {
+        'user': user,
+        'documents': documents,
+        'next_cursor': next_cursor,
+        'form': form,
+    })
+
+@login_required
+@csrf_exempt
+async def upload_document(request):
+    # ASGI 下请求体在进入视图前已异步接收完毕，慢速上传不会占用线程
+    request.upload_handlers = [ContentAddressedUploadHandler(request)]
+    return await _upload_document(request)
+
+@csrf_protect
+async def _upload_document(request):
+    user = await load_user(request)
+    if request.method == 'POST':
+        form = DocumentUploadForm(request.POST, request.FILES)
+        if await sync_to_async(form.is_valid)() and await sync_to_async(form.save_document)(user):
+            messages.success(request, _("Document uploaded successfully"))  # 上传成功提示
+            return redirect('profile')
+        else:
+            messages.error(request, _("File upload failed. Please check the format"))
+    else:
+        form = DocumentUploadForm()
+    return render(request, 'accounts/upload.html', {'form': form})
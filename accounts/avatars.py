@@ -0,0 +1,44 @@
+import os
+
+from django.conf import settings
+
+# 头像在页面上显示为 100x100（窄屏 80x80），生成 1x/2x/3x 三种尺寸
+AVATAR_SIZES = (100, 200, 300)
+# (扩展名, Pillow格式, MIME类型)，WebP 优先，JPEG 作为兼容回退；最后一项同时是"已生成完毕"的标记
+AVATAR_FORMATS = (
+    ('webp', 'WEBP', 'image/webp'),
+    ('jpg', 'JPEG', 'image/jpeg'),
+)
+AVATAR_QUALITY = 82
+
+
+def derivative_name(name, size, extension):
+    """缩略图与原图放在同一目录，如 avatars/me.png -> avatars/me.200w.webp"""
+    root, ext = os.path.splitext(name)
+    return '%s.%dw.%s' % (root, size, extension)
+
+
+def derivatives_ready(name):
+    # 缩略图按固定顺序生成，最后一个存在说明全部生成完毕
+    marker = derivative_name(name, AVATAR_SIZES[-1], AVATAR_FORMATS[-1][0])
+    return os.path.exists(os.path.join(settings.MEDIA_ROOT, marker))
+
+
+def generate_derivatives(media_root, name):
+    """在后台任务或进程池中运行，只依赖 Pillow：把原图裁成正方形并生成各尺寸的 WebP/JPEG"""
+    from PIL import Image, ImageOps
+
+    with Image.open(os.path.join(media_root, name)) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+        for size in AVATAR_SIZES:
+            # 与 .avatar 的 object-fit: cover 效果一致
+            thumbnail = ImageOps.fit(image, (size, size), Image.LANCZOS)
+            for extension, image_format, content_type in AVATAR_FORMATS:
+                target = os.path.join(media_root, derivative_name(name, size, extension))
+                output = thumbnail.convert('RGB') if image_format == 'JPEG' else thumbnail
+                # 先写临时文件再替换，避免页面引用到写了一半的图片
+                output.save(target + '.tmp', image_format, quality=AVATAR_QUALITY)
+                os.replace(target + '.tmp', target)
+    return name
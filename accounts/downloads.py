@@ -0,0 +1,125 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+
+range_re = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# 文件转交方式由配置 SENDFILE_BACKEND 决定（nginx 用 X-Accel-Redirect，apache mod_xsendfile 用 X-Sendfile），
+# 不能由请求决定：客户端自己带上 X-Sendfile-Type 头就能在响应中看到文件的绝对路径
+X_ACCEL_REDIRECT = 'X-Accel-Redirect'
+X_SENDFILE = 'X-Sendfile'
+
+
+class RangeFile:
+    """只读出文件中 [start, start + length) 这一段，用于中间截断的 Range 请求"""
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.file.seek(start)
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """解析单个字节范围，返回 (start, end)（包含 end）；多段范围或格式错误时返回 None，越界时抛出 ValueError"""
+    match = range_re.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first == '':
+        # bytes=-N 表示最后 N 个字节
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError('Unsatisfiable range')
+    return start, end
+
+
+def _sendfile_response(path, content_type):
+    """配置了反向代理转交时只返回一个带转交头的空响应，由代理直接发送文件（代理自行处理 Range）"""
+    sendfile_type = settings.SENDFILE_BACKEND
+    if sendfile_type == X_ACCEL_REDIRECT:
+        relative = os.path.relpath(path, settings.MEDIA_ROOT)
+        response = HttpResponse(content_type=content_type)
+        response[X_ACCEL_REDIRECT] = quote(settings.SENDFILE_ACCEL_PREFIX + relative.replace(os.sep, '/'))
+        return response
+    if sendfile_type == X_SENDFILE:
+        response = HttpResponse(content_type=content_type)
+        response[X_SENDFILE] = path
+        return response
+    return None
+
+
+def serve_file(request, path, filename, etag=None):
+    """
+    发送 MEDIA_ROOT 下的文件：支持 ETag/Last-Modified 条件请求和单段 Range 请求
+    SENDFILE_BACKEND 为 X-Accel-Redirect/X-Sendfile 时交给代理发送，否则用 FileResponse
+    （gunicorn 下经 wsgi.file_wrapper 使用 sendfile，Python 不接触文件数据）
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        raise Http404("File not found")
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    last_modified = http_date(stat.st_mtime)
+    etag = etag or '"%x-%x"' % (int(stat.st_mtime), stat.st_size)
+
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        response = _sendfile_response(path, content_type)
+    if response is None:
+        response = _file_response(request, path, stat.st_size, content_type, etag, last_modified)
+
+    if response.status_code in (200, 206):
+        response['Content-Disposition'] = content_disposition_header(True, filename)
+    response['ETag'] = etag
+    response['Last-Modified'] = last_modified
+    response['Accept-Ranges'] = 'bytes'
+    patch_cache_control(response, private=True, max_age=24 * 60 * 60)
+    return response
+
+
+def _file_response(request, path, size, content_type, etag, last_modified):
+    range_header = request.META.get('HTTP_RANGE')
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range and if_range != etag and parse_http_date_safe(if_range) != parse_http_date_safe(last_modified):
+        range_header = None  # 客户端缓存的版本已过期，发送完整文件
+    try:
+        byte_range = parse_range(range_header, size) if range_header and size else None
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = 'bytes */%d' % size
+        return response
+
+    file = open(path, 'rb')
+    if byte_range is None:
+        return FileResponse(file, content_type=content_type)
+
+    start, end = byte_range
+    length = end - start + 1
+    if end == size - 1:
+        # 一直读到文件末尾（断点续传的常见情况），定位后仍可使用 sendfile
+        file.seek(start)
+        response = FileResponse(file, content_type=content_type, status=206)
+    else:
+        response = FileResponse(RangeFile(file, start, length), content_type=content_type, status=206)
+    response['Content-Length'] = str(length)
+    response['Content-Range'] = 'bytes %d-%d/%d' % (start, end, size)
+    return response
@@ -0,0 +1,105 @@
+"""
+表单静态部分的按语言缓存
+
+标签、帮助文本和空字段的控件 HTML 对同一语言的所有用户都一样，但每次 {{ form.as_p }}
+都要重新解析 gettext_lazy 并经过表单模板引擎渲染。这里把它们按
+(表单类, 字段, 语言, 翻译目录版本, auto_id, prefix) 缓存在进程内，
+每个请求只渲染有值或有错误的字段，翻译目录更新后版本号变化，旧缓存自然失效。
+
+表单的控件配置必须只取决于表单类（在 __init__ 中按请求修改 widget.attrs 的表单不能使用）。
+"""
+from django.core.signals import setting_changed
+from django.db.models.fields.files import FieldFile
+from django.dispatch import receiver
+from django.forms.boundfield import BoundField
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
+from django.utils.translation import get_language
+
+from yourapp.translation import catalog_version
+
+FORM_CACHE_SIZE = 2048
+
+_cache = {}
+
+
+@receiver(setting_changed)
+def clear_form_cache(*, setting, **kwargs):
+    if setting in ('LANGUAGES', 'LANGUAGE_CODE', 'LOCALE_PATHS', 'FORM_RENDERER'):
+        _cache.clear()
+
+
+def _is_empty(value):
+    """与未绑定表单渲染结果相同的字段值"""
+    if isinstance(value, FieldFile):
+        return not value
+    return value is None or value == '' or value == [] or value == ()
+
+
+def _cached(bound_field, part, render):
+    form = bound_field.form
+    key = (
+        type(form), bound_field.name, part, get_language(), catalog_version(),
+        form.auto_id, form.prefix, form.use_required_attribute,
+    )
+    html = _cache.get(key)
+    if html is None:
+        html = render()
+        if len(_cache) >= FORM_CACHE_SIZE:
+            _cache.clear()
+        _cache[key] = html
+    return html
+
+
+class CachedBoundField(BoundField):
+    """不带参数的 label_tag() 和空字段的控件 HTML 使用按语言缓存的结果"""
+
+    def label_tag(self, contents=None, attrs=None, label_suffix=None, tag=None):
+        if contents is None and attrs is None and label_suffix is None and tag is None:
+            return _cached(self, 'label', super().label_tag)
+        return super().label_tag(contents, attrs, label_suffix, tag)
+
+    def as_widget(self, widget=None, attrs=None, only_initial=False):
+        if widget is None and attrs is None and not only_initial and self.is_static():
+            return _cached(self, 'widget', super().as_widget)
+        return super().as_widget(widget, attrs, only_initial)
+
+    def help_text_html(self):
+        """与 django/forms/p.html 中的帮助文本相同"""
+        def render():
+            if not self.help_text:
+                return ''
+            if self.auto_id:
+                return format_html('<span class="helptext" id="{}_helptext">{}</span>',
+                                   self.auto_id, mark_safe(self.help_text))
+            return format_html('<span class="helptext">{}</span>', mark_safe(self.help_text))
+        return _cached(self, 'help_text', render)
+
+    def is_static(self):
+        """字段没有值也没有错误，渲染结果与未绑定表单完全相同"""
+        return not (self.form.is_bound and self.errors) and _is_empty(self.value())
+
+
+class CachedRenderingMixin:
+    """
+    用缓存的静态部分直接拼出 as_p() 的结果，不再经过 django/forms/p.html；
+    每个请求只合并字段的值和错误。有隐藏字段或表单级错误时仍使用原来的模板。
+    """
+    bound_field_class = CachedBoundField
+
+    def as_p(self):
+        if self.hidden_fields() or self.non_field_errors():
+            return super().as_p()
+        rows = []
+        for field in self.visible_fields():
+            errors = field.errors
+            classes = field.css_classes()
+            rows.append(format_html(
+                '{}<p{}>\n{}\n{}\n{}</p>',
+                errors.as_ul() if errors else '',
+                format_html(' class="{}"', classes) if classes else '',
+                field.label_tag() if field.label else '',
+                field,
+                field.help_text_html(),
+            ))
+        return mark_safe('\n'.join(rows))
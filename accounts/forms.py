@@ -1,13 +1,19 @@
 from django import forms
 
+from django.conf import settings
 from django.contrib.auth.forms import UserCreationForm
+from django.db import transaction
+from .form_cache import CachedRenderingMixin
 from .models import CustomUser
 
 from .models import UserDocument
+from .storage import reserve
+from .tasks import process_blob
+from .uploads import INVALID_TYPE, TOO_LARGE, HashedUploadedFile, hash_upload, store_blob
 
 from django.utils.translation import gettext_lazy as _
 
-class RegisterForm(UserCreationForm):
+class RegisterForm(CachedRenderingMixin, UserCreationForm):
     email = forms.EmailField(
         required=True,
         label=_("Email"),  # 字段标签
@@ -35,7 +41,7 @@ class RegisterForm(UserCreationForm):
             }
         }
 
-class ProfileForm(forms.ModelForm):
+class ProfileForm(CachedRenderingMixin, forms.ModelForm):
     class Meta:
         model = CustomUser
         fields = ('username', 'email', 'bio', 'avatar', 'website')
@@ -50,7 +56,22 @@ class ProfileForm(forms.ModelForm):
             'avatar': _("Upload a new profile picture"),
         }
 
-class DocumentUploadForm(forms.ModelForm):
+    def save(self, commit=True):
+        """
+        只写入表单中的列：instance 可能是进程内缓存的用户（accounts.middleware），
+        其他列（密码、语言偏好、is_active 等）可能已在别处修改，不能用旧值覆盖
+        """
+        user = super().save(commit=False)
+        if commit:
+            user.save(update_fields=self._meta.fields)
+        return user
+
+    async def asave(self):
+        user = self.save(commit=False)
+        await user.asave(update_fields=self._meta.fields)
+        return user
+
+class DocumentUploadForm(CachedRenderingMixin, forms.ModelForm):
     class Meta:
         model = UserDocument
         fields = ['document', 'title']
@@ -77,4 +98,38 @@ class DocumentUploadForm(forms.ModelForm):
                 'class': 'form-control',
                 'accept': '.pdf,.docx,.txt'
             })
-        }
\ No newline at end of file
+        }
+
+    def clean_document(self):
+        document = self.cleaned_data['document']
+        if not isinstance(document, HashedUploadedFile):
+            # 没有经过 ContentAddressedUploadHandler 的上传，在这里补做同样的检查和暂存，save_document 的处理相同
+            document = hash_upload(document)
+        error = document.error
+        if error == TOO_LARGE:
+            raise forms.ValidationError(_("File too large (Max 10MB)"), code='too_large')
+        if error == INVALID_TYPE:
+            raise forms.ValidationError(self.fields['document'].error_messages['invalid'], code='invalid')
+        return document
+
+    def save_document(self, owner):
+        """
+        保存上传的文档：数据已在上传时写入磁盘，这里只是 rename 到内容寻址路径并增加引用计数
+        新内容的后台处理（页数等）只放入任务队列，与文档在同一个事务中提交
+        超出 DOCUMENT_STORAGE_QUOTA 时不保存，在表单上添加错误并返回 None
+        """
+        upload = self.cleaned_data['document']
+        with transaction.atomic():
+            if not reserve(owner.pk, upload.size, settings.DOCUMENT_STORAGE_QUOTA):
+                self.add_error('document', forms.ValidationError(
+                    _("Not enough storage space for this file"), code='quota_exceeded'))
+                return None
+            doc = self.save(commit=False)
+            doc.owner = owner
+            doc.size = upload.size
+            doc.blob = store_blob(upload)
+            doc.document = doc.blob.file.name
+            doc.save()
+            if doc.blob.processed_at is None:
+                process_blob.enqueue(blob_id=doc.blob.pk)
+        return doc
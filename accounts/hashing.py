@@ -0,0 +1,193 @@
+"""
+有上限的密码哈希
+
+PBKDF2 每次哈希要几十到几百毫秒的 CPU，登录、注册集中到来时（撞库、批量注册）哈希会占满所有 CPU，
+其他页面的请求也跟着变慢。这里限制整台机器上同时进行的哈希数量，限制在所有 worker 进程之间共享
+（gunicorn 的同步 worker、gthread、uvicorn 都适用）：
+
+- PASSWORD_HASHING_LOCK_DIR 下有两组锁文件：running-N 共 PASSWORD_HASHING_WORKERS 个，持有一个才能计算哈希；
+  admitted-N 共 PASSWORD_HASHING_WORKERS + PASSWORD_HASHING_BACKLOG 个，持有一个才能开始等待 running。
+  锁是 flock，属于打开的文件，进程退出（包括 worker 被杀掉）时自动释放，不会留下占用的名额
+- admitted 全部被占用时直接抛出 PoolSaturated，由 accounts.middleware.PasswordHashingBusyMiddleware 返回 503，
+  请求不会排队等待，其他页面的延迟不受影响
+- 同步代码通过 PooledPBKDF2PasswordHasher 使用（make_password、check_password 都会经过它），
+  在当前线程中计算；异步视图用 await arun(...)，等待名额时不占用线程，计算时才交给线程执行
+- 已经持有 running 的代码再次哈希时直接计算，不再申请名额，避免等待自己
+
+同步 worker 每个进程同时只处理一个请求，排队等待的登录请求也占着一个 worker，
+所以同步部署时 BACKLOG 应为 0、WORKERS 小于 gunicorn 的 --workers，登录风暴时总有 worker 处理其他页面。
+没有 fcntl 的平台（Windows 开发环境）退回到进程内的信号量，只限制当前进程。
+"""
+import asyncio
+import contextvars
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.core.signals import setting_changed
+from django.db import close_old_connections
+from django.dispatch import receiver
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+POLL_INTERVAL = 0.005  # 等待 running 名额时的重试间隔（秒），与一次哈希的耗时相比可以忽略
+
+# 当前上下文是否已经持有 running 名额
+_holding = contextvars.ContextVar('password_hashing_holding', default=False)
+
+
+class PoolSaturated(Exception):
+    """正在计算和排队的哈希都已占满"""
+
+
+class LockFileSlots:
+    """directory 下的 count 个锁文件，每个同时只能被一个打开的文件持有（flock：进程之间、线程之间都互斥）"""
+
+    def __init__(self, directory, name, count):
+        self.paths = [os.path.join(directory, '%s-%d' % (name, n)) for n in range(count)]
+
+    def try_acquire(self):
+        """获取一个空闲的名额，返回之后传给 release() 的句柄；全部占用时返回 None"""
+        start = random.randrange(len(self.paths)) if self.paths else 0  # 从随机位置开始，减少互相争抢同一个文件
+        for n in range(len(self.paths)):
+            fd = os.open(self.paths[(start + n) % len(self.paths)], os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                continue
+            return fd
+        return None
+
+    def release(self, fd):
+        os.close(fd)  # 关闭文件即释放 flock
+
+
+class ThreadSlots:
+    """没有 fcntl 时的替代：只在当前进程内限制"""
+
+    def __init__(self, directory, name, count):
+        self.semaphore = threading.BoundedSemaphore(count) if count else None
+
+    def try_acquire(self):
+        return self.semaphore is not None and self.semaphore.acquire(blocking=False) or None
+
+    def release(self, token):
+        self.semaphore.release()
+
+
+class HashingLimiter:
+    def __init__(self, directory, workers, backlog):
+        self.workers = workers
+        self.backlog = backlog
+        slots = ThreadSlots if fcntl is None else LockFileSlots
+        if fcntl is not None:
+            os.makedirs(directory, exist_ok=True)
+        self.admitted = slots(directory, 'admitted', workers + backlog)
+        self.running = slots(directory, 'running', workers)
+
+    @contextmanager
+    def admission(self):
+        token = self.admitted.try_acquire()
+        if token is None:
+            raise PoolSaturated
+        try:
+            yield
+        finally:
+            self.admitted.release(token)
+
+    @contextmanager
+    def slot(self):
+        """等待并持有一个 running 名额（同步代码使用）"""
+        while (token := self.running.try_acquire()) is None:
+            time.sleep(POLL_INTERVAL)
+        try:
+            yield
+        finally:
+            self.running.release(token)
+
+    async def aacquire(self):
+        """slot() 的异步版本，返回的句柄交给 self.running.release()"""
+        while (token := self.running.try_acquire()) is None:
+            await asyncio.sleep(POLL_INTERVAL)
+        return token
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter():
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = HashingLimiter(settings.PASSWORD_HASHING_LOCK_DIR, settings.PASSWORD_HASHING_WORKERS,
+                                          settings.PASSWORD_HASHING_BACKLOG)
+    return _limiter
+
+
+@receiver(setting_changed)
+def reset_limiter(*, setting, **kwargs):
+    global _limiter
+    if setting in ('PASSWORD_HASHING_WORKERS', 'PASSWORD_HASHING_BACKLOG', 'PASSWORD_HASHING_LOCK_DIR'):
+        _limiter = None
+
+
+def in_pool():
+    """当前上下文是否已经持有计算哈希的名额"""
+    return _holding.get()
+
+
+def _call_holding(function, args, kwargs):
+    token = _holding.set(True)
+    try:
+        return function(*args, **kwargs)
+    finally:
+        _holding.reset(token)
+
+
+def _call_in_thread(function, args, kwargs):
+    # 函数中可能查询数据库（例如异步视图中的表单校验），与请求结束时一样按 CONN_MAX_AGE 关闭这个线程的连接
+    try:
+        return _call_holding(function, args, kwargs)
+    finally:
+        close_old_connections()
+
+
+def run(function, *args, **kwargs):
+    """持有名额后在当前线程执行并返回结果（同步代码使用），名额和排队都已占满时抛出 PoolSaturated"""
+    if in_pool():
+        return function(*args, **kwargs)
+    limiter = get_limiter()
+    with limiter.admission(), limiter.slot():
+        return _call_holding(function, args, kwargs)
+
+
+async def arun(function, *args, **kwargs):
+    """run() 的异步版本：等待名额时不占用线程和事件循环，拿到名额后在线程中执行"""
+    limiter = get_limiter()
+    with limiter.admission():
+        token = await limiter.aacquire()
+        try:
+            return await sync_to_async(_call_in_thread, thread_sensitive=False)(function, args, kwargs)
+        finally:
+            limiter.running.release(token)
+
+
+class PooledPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    与 PBKDF2PasswordHasher 算法和格式完全相同，只是哈希要先取得名额（见模块说明）
+    verify() 内部也是调用 encode()，因此校验密码同样受限制
+    """
+
+    def encode(self, password, salt, iterations=None):
+        return run(super().encode, password, salt, iterations)
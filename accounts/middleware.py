@@ -0,0 +1,118 @@
+from functools import partial
+
+from django.contrib import auth
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.conf import settings
+from django.core.cache import caches
+from django.shortcuts import render
+from django.utils.crypto import constant_time_compare
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.functional import SimpleLazyObject
+
+from .hashing import PoolSaturated
+from .models import CustomUser
+
+RETRY_AFTER = 5  # 哈希线程池已满时建议客户端等待的秒数
+# 缓存的用户与数据库中这几列相同时才使用（按主键只查这几列）：其他 worker 中修改密码、停用用户或重新登录后，
+# 所有 worker 的缓存都立即失效，而不是等到 CACHES['users'] 的 TIMEOUT
+VERSION_FIELDS = ('password', 'is_active', 'last_login')
+
+
+def user_cache_key(pk):
+    return 'user:%s' % pk
+
+
+def cache_user(user):
+    # LocMemCache 存取时都会 pickle，每个请求拿到的是独立的副本，修改 request.user 不会影响其他请求
+    caches['users'].set(user_cache_key(user.pk), user)
+
+
+def forget_user(pk):
+    caches['users'].delete(user_cache_key(pk))
+
+
+def user_version(user):
+    return tuple(getattr(user, name) for name in VERSION_FIELDS)
+
+
+def _version_query(user):
+    return CustomUser.objects.filter(pk=user.pk).values_list(*VERSION_FIELDS)
+
+
+def cached_user_for_session(user_id, backend_path, session_hash):
+    """
+    session 对应的缓存用户，没有缓存或 session hash 与缓存的用户不一致时返回 None
+    返回的用户还要用 is_current()/ais_current() 与数据库核对；返回 None 或核对失败时
+    应当走 Django 原来的流程，从数据库读取并校验
+    """
+    if user_id is None or backend_path not in settings.AUTHENTICATION_BACKENDS or not session_hash:
+        return None
+    user = caches['users'].get(user_cache_key(user_id))
+    if user is None or not constant_time_compare(session_hash, user.get_session_auth_hash()):
+        return None
+    return user
+
+
+def is_current(user):
+    return _version_query(user).first() == user_version(user)
+
+
+async def ais_current(user):
+    return await _version_query(user).afirst() == user_version(user)
+
+
+def get_user(request):
+    if not hasattr(request, '_cached_user'):
+        session = request.session
+        user = cached_user_for_session(
+            session.get(SESSION_KEY), session.get(BACKEND_SESSION_KEY), session.get(HASH_SESSION_KEY)
+        )
+        if user is not None and not is_current(user):
+            user = None
+        if user is None:
+            user = auth.get_user(request)
+            if user.is_authenticated:
+                cache_user(user)
+        request._cached_user = user
+    return request._cached_user
+
+
+async def aget_user(request):
+    if not hasattr(request, '_acached_user'):
+        session = request.session
+        user = cached_user_for_session(
+            await session.aget(SESSION_KEY), await session.aget(BACKEND_SESSION_KEY), await session.aget(HASH_SESSION_KEY)
+        )
+        if user is not None and not await ais_current(user):
+            user = None
+        if user is None:
+            user = await auth.aget_user(request)
+            if user.is_authenticated:
+                cache_user(user)
+        request._acached_user = user
+    return request._acached_user
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """
+    与 AuthenticationMiddleware 相同，但 request.user 优先从进程内缓存（CACHES['users']）中取
+    缓存的用户仍按 session hash 校验，并按主键查询 VERSION_FIELDS 与数据库核对（不读取整行、不构造模型）；
+    用户保存或删除时由 accounts.signals 使本进程的缓存失效
+    """
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: get_user(request))
+        request.auser = partial(aget_user, request)
+
+
+class PasswordHashingBusyMiddleware(MiddlewareMixin):
+    """密码哈希的名额和排队都已占满（PoolSaturated）时立即返回 503 和 Retry-After，不让请求排队等待"""
+
+    def process_exception(self, request, exception):
+        if not isinstance(exception, PoolSaturated):
+            return None
+        response = render(request, 'accounts/busy.html', {'retry_after': RETRY_AFTER}, status=503)
+        response['Retry-After'] = str(RETRY_AFTER)
+        return response
@@ -0,0 +1,17 @@
+# Generated by Django 5.2 on 2026-10-18 12:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_customuser_uuid_alter_customuser_avatar_userdocument'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userdocument',
+            index=models.Index(fields=['owner', '-uploaded_at', '-id'], name='accounts_doc_owner_recent_idx'),
+        ),
+    ]
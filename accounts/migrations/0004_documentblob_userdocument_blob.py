@@ -0,0 +1,35 @@
+# Generated by Django 5.2 on 2026-10-18 13:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_userdocument_accounts_doc_owner_recent_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True, verbose_name='SHA-256')),
+                ('file', models.FileField(upload_to='blobs/', verbose_name='Stored File')),
+                ('size', models.PositiveBigIntegerField(verbose_name='Size')),
+                ('content_type', models.CharField(max_length=100, verbose_name='Content Type')),
+                ('refcount', models.PositiveIntegerField(default=0, verbose_name='Reference Count')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created At')),
+            ],
+            options={
+                'verbose_name': 'Document Blob',
+                'verbose_name_plural': 'Document Blobs',
+            },
+        ),
+        migrations.AddField(
+            model_name='userdocument',
+            name='blob',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='documents', to='accounts.documentblob', verbose_name='Stored Blob'),
+        ),
+    ]
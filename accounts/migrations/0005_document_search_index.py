@@ -0,0 +1,25 @@
+from django.db import migrations
+
+from accounts import search
+
+
+def create_index(apps, schema_editor):
+    # 索引表和触发器在 migrate 结束时由 post_migrate 创建（accounts.signals.install_search_index），
+    # 在这里创建的话，同一次 migrate 中后面重建 accounts 表的迁移会因为触发器而失败
+    pass
+
+
+def drop_index(apps, schema_editor):
+    if search.is_supported(schema_editor.connection):
+        search.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_documentblob_userdocument_blob'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_document_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentblob',
+            name='page_count',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Page Count'),
+        ),
+        migrations.AddField(
+            model_name='documentblob',
+            name='processed_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Processed At'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+import os
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+
+BATCH_SIZE = 1000
+
+
+def fill_sizes(apps, schema_editor):
+    """已有文档的大小：内容寻址的取 blob 的大小，旧的按日期目录保存的文件读取文件大小（文件不存在计 0）"""
+    UserDocument = apps.get_model('accounts', 'UserDocument')
+    DocumentBlob = apps.get_model('accounts', 'DocumentBlob')
+    StorageUsage = apps.get_model('accounts', 'StorageUsage')
+    UserDocument.objects.filter(blob__isnull=False).update(
+        size=Subquery(DocumentBlob.objects.filter(pk=OuterRef('blob_id')).values('size')[:1])
+    )
+    last = 0
+    while True:
+        batch = list(UserDocument.objects.filter(blob__isnull=True, pk__gt=last).order_by('pk')[:BATCH_SIZE])
+        if not batch:
+            break
+        for doc in batch:
+            path = os.path.join(settings.MEDIA_ROOT, doc.document.name)
+            doc.size = os.path.getsize(path) if os.path.isfile(path) else 0
+        UserDocument.objects.bulk_update(batch, ['size'])
+        last = batch[-1].pk
+    StorageUsage.objects.bulk_create(
+        [StorageUsage(user_id=owner_id, used_bytes=used or 0) for owner_id, used in
+         UserDocument.objects.values('owner_id').annotate(used=Sum('size')).values_list('owner_id', 'used')],
+        batch_size=BATCH_SIZE,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_documentblob_page_count_processed_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StorageUsage',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='storage_usage', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='User')),
+                ('used_bytes', models.PositiveBigIntegerField(default=0, verbose_name='Used Bytes')),
+            ],
+            options={
+                'verbose_name': 'Storage Usage',
+                'verbose_name_plural': 'Storage Usage',
+            },
+        ),
+        migrations.AddField(
+            model_name='userdocument',
+            name='size',
+            field=models.PositiveBigIntegerField(default=0, editable=False, verbose_name='Size'),
+        ),
+        migrations.RunPython(fill_sizes, migrations.RunPython.noop),
+    ]
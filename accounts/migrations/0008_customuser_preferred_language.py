@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_storage_usage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='preferred_language',
+            field=models.CharField(blank=True, help_text='Language used after logging in', max_length=15, verbose_name='Preferred Language'),
+        ),
+    ]
@@ -14,6 +14,9 @@ class CustomUser(AbstractUser):
                              help_text=_('Profile picture image'))
     website = models.URLField(_('Personal Website'), blank=True,
                             help_text=_('Your personal or professional website'))
+    # 切换语言时保存，登录时写入语言 cookie（见 accounts.signals），换设备后不需要重新选择
+    preferred_language = models.CharField(_('Preferred Language'), max_length=15, blank=True,
+                                          help_text=_('Language used after logging in'))
 
     # 重定义多对多关系（补充翻译）
     groups = models.ManyToManyField(
@@ -38,6 +41,31 @@ class CustomUser(AbstractUser):
     def __str__(self):
         return self.username
 
+    def set_preferred_language(self, language):
+        """保存语言偏好，只更新这一列（保存后由 accounts.signals 使缓存的用户失效）"""
+        if self.preferred_language != language:
+            self.preferred_language = language
+            self.save(update_fields=['preferred_language'])
+
+class DocumentBlob(models.Model):
+    """内容寻址存储的文档数据，相同内容的上传只保存一份，由 refcount 记录被多少个文档引用"""
+    sha256 = models.CharField(max_length=64, unique=True, verbose_name=_('SHA-256'))
+    file = models.FileField(upload_to='blobs/', verbose_name=_('Stored File'))
+    size = models.PositiveBigIntegerField(verbose_name=_('Size'))
+    content_type = models.CharField(max_length=100, verbose_name=_('Content Type'))
+    refcount = models.PositiveIntegerField(default=0, verbose_name=_('Reference Count'))
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('Created At'))
+    # 上传后由后台任务（accounts/tasks.py）填写，相同内容只处理一次
+    page_count = models.PositiveIntegerField(null=True, blank=True, verbose_name=_('Page Count'))
+    processed_at = models.DateTimeField(null=True, blank=True, verbose_name=_('Processed At'))
+
+    class Meta:
+        verbose_name = _('Document Blob')
+        verbose_name_plural = _('Document Blobs')
+
+    def __str__(self):
+        return self.sha256
+
 class UserDocument(models.Model):
     owner = models.ForeignKey(
         CustomUser, 
@@ -64,11 +92,47 @@ class UserDocument(models.Model):
         auto_now_add=True, 
         verbose_name=_('Upload Time')
     )
+    blob = models.ForeignKey(
+        DocumentBlob,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='documents',
+        verbose_name=_('Stored Blob')  # 为空表示旧的、按日期目录保存的文件
+    )
+    # 计入所有者存储用量的字节数（见 accounts/storage.py），共享的 blob 对每个引用它的文档都计一次
+    size = models.PositiveBigIntegerField(default=0, editable=False, verbose_name=_('Size'))
 
     class Meta:
         verbose_name = _('User Document')  # 国际化单数名
         verbose_name_plural = _('User Documents')  # 国际化复数名
+        indexes = [
+            # 个人主页按上传时间倒序做游标分页
+            models.Index(fields=['owner', '-uploaded_at', '-id'], name='accounts_doc_owner_recent_idx'),
+        ]
 
     def __str__(self):
         # 保持英文日志输出（系统内部使用）
-        return f"{self.title} ({self.owner.username})"
\ No newline at end of file
+        return f"{self.title} ({self.owner.username})"
+
+class StorageUsage(models.Model):
+    """
+    用户文档占用的字节数，上传、替换、删除文档时增量更新，检查配额时不需要汇总文件大小
+    没有放在 CustomUser 上：request.user 来自进程内缓存，保存资料时会写回所有字段，计数会被旧值覆盖
+    """
+    user = models.OneToOneField(
+        CustomUser,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='storage_usage',
+        verbose_name=_('User')
+    )
+    used_bytes = models.PositiveBigIntegerField(default=0, verbose_name=_('Used Bytes'))
+
+    class Meta:
+        verbose_name = _('Storage Usage')
+        verbose_name_plural = _('Storage Usage')
+
+    def __str__(self):
+        return f"{self.user_id}: {self.used_bytes}"
@@ -0,0 +1,53 @@
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+# 个人主页每次加载的文档数量
+DOCUMENTS_PER_PAGE = 20
+
+
+def encode_cursor(document):
+    """把一页最后一个文档的 (uploaded_at, id) 编码成不透明的游标字符串"""
+    raw = '%s|%d' % (document.uploaded_at.isoformat(), document.pk)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """解析游标，格式不正确时抛出 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        uploaded_at, pk = raw.rsplit('|', 1)
+        return datetime.fromisoformat(uploaded_at), int(pk)
+    except (UnicodeError, TypeError, ValueError) as exc:
+        raise ValueError('Invalid cursor') from exc
+
+
+def _page_queryset(queryset, cursor, limit):
+    queryset = queryset.order_by('-uploaded_at', '-id')
+    if cursor:
+        uploaded_at, pk = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(uploaded_at__lt=uploaded_at) | Q(uploaded_at=uploaded_at, id__lt=pk)
+        )
+    return queryset[:limit + 1]  # 多取一条用来判断是否还有下一页
+
+
+def _split_page(documents, limit):
+    next_cursor = encode_cursor(documents[limit - 1]) if len(documents) > limit else None
+    return documents[:limit], next_cursor
+
+
+def paginate_documents(queryset, cursor=None, limit=DOCUMENTS_PER_PAGE):
+    """
+    基于 (uploaded_at, id) 的游标分页，按 (-uploaded_at, -id) 排序
+    走 (owner, -uploaded_at, -id) 组合索引，无论用户有多少文档，每页的开销都一样
+    返回 (本页文档列表, 下一页游标或None)
+    """
+    return _split_page(list(_page_queryset(queryset, cursor, limit)), limit)
+
+
+async def apaginate_documents(queryset, cursor=None, limit=DOCUMENTS_PER_PAGE):
+    """paginate_documents 的异步版本"""
+    documents = [doc async for doc in _page_queryset(queryset, cursor, limit)]
+    return _split_page(documents, limit)
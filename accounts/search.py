@@ -0,0 +1,150 @@
+"""
+文档标题和所有者用户名的 SQLite FTS5 全文索引
+
+accounts_document_fts 的 rowid 就是 UserDocument 的 id，由触发器在插入、修改、删除文档
+以及修改用户名时增量维护（bulk_create 和直接执行的 SQL 也会触发）。
+使用 trigram 分词器：与后台原来的 LIKE '%...%' 一样按子串匹配，中文标题也能搜索；
+少于 3 个字符的词无法建立三元组，这时退回原来的 LIKE 查询；trigram 分词器需要 SQLite 3.34，
+更早的版本不建立索引，搜索全部使用 LIKE。
+
+Django 在 SQLite 上修改表结构时会重建整张表（新建表、复制数据、删除旧表、改名），触发器还引用着旧表时
+这一步会失败。因此 migrate 开始前删除触发器（pre_migrate），全部迁移执行完后重新安装并重建索引（post_migrate），
+见 accounts/signals.py；迁移中不需要为此做任何处理。迁移期间的数据修改由最后的重建补上。
+"""
+from django.db import connections
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'accounts_document_fts'
+MIN_TERM_LENGTH = 3  # trigram 分词器能匹配的最短子串
+MIN_SQLITE_VERSION = (3, 34)  # 开始支持 trigram 分词器的版本
+
+CREATE_TABLE = """
+CREATE VIRTUAL TABLE IF NOT EXISTS accounts_document_fts
+USING fts5(title, username, tokenize = 'trigram')
+"""
+
+TRIGGERS = {
+    'accounts_document_fts_insert': """
+CREATE TRIGGER IF NOT EXISTS accounts_document_fts_insert
+AFTER INSERT ON accounts_userdocument BEGIN
+    INSERT INTO accounts_document_fts (rowid, title, username)
+    SELECT new.id, new.title, username FROM accounts_customuser WHERE id = new.owner_id;
+END
+""",
+    'accounts_document_fts_update': """
+CREATE TRIGGER IF NOT EXISTS accounts_document_fts_update
+AFTER UPDATE OF title, owner_id ON accounts_userdocument
+WHEN old.title IS NOT new.title OR old.owner_id IS NOT new.owner_id BEGIN
+    UPDATE accounts_document_fts
+    SET title = new.title,
+        username = (SELECT username FROM accounts_customuser WHERE id = new.owner_id)
+    WHERE rowid = new.id;
+END
+""",
+    'accounts_document_fts_delete': """
+CREATE TRIGGER IF NOT EXISTS accounts_document_fts_delete
+AFTER DELETE ON accounts_userdocument BEGIN
+    DELETE FROM accounts_document_fts WHERE rowid = old.id;
+END
+""",
+    'accounts_document_fts_username': """
+CREATE TRIGGER IF NOT EXISTS accounts_document_fts_username
+AFTER UPDATE OF username ON accounts_customuser
+WHEN old.username IS NOT new.username BEGIN
+    UPDATE accounts_document_fts SET username = new.username
+    WHERE rowid IN (SELECT id FROM accounts_userdocument WHERE owner_id = new.id);
+END
+""",
+}
+
+REBUILD = [
+    "DELETE FROM accounts_document_fts",
+    """
+INSERT INTO accounts_document_fts (rowid, title, username)
+SELECT d.id, d.title, u.username
+FROM accounts_userdocument d JOIN accounts_customuser u ON u.id = d.owner_id
+""",
+    "INSERT INTO accounts_document_fts (accounts_document_fts) VALUES ('optimize')",
+]
+
+
+def is_supported(connection):
+    return connection.vendor == 'sqlite' and connection.Database.sqlite_version_info >= MIN_SQLITE_VERSION
+
+
+def install(connection):
+    """创建索引表和触发器（已存在的不会重复创建）"""
+    with connection.cursor() as cursor:
+        cursor.execute(CREATE_TABLE)
+        for sql in TRIGGERS.values():
+            cursor.execute(sql)
+
+
+def drop_triggers(connection):
+    """只删除触发器，索引表保留（内容不再更新，之后需要 rebuild）"""
+    with connection.cursor() as cursor:
+        for name in TRIGGERS:
+            cursor.execute('DROP TRIGGER IF EXISTS %s' % name)
+
+
+def uninstall(connection):
+    drop_triggers(connection)
+    with connection.cursor() as cursor:
+        cursor.execute('DROP TABLE IF EXISTS %s' % FTS_TABLE)
+
+
+def rebuild(connection):
+    """重新安装触发器并根据现有数据重建整个索引，返回索引中的文档数"""
+    install(connection)
+    with connection.cursor() as cursor:
+        for sql in REBUILD:
+            cursor.execute(sql)
+        cursor.execute('SELECT count(*) FROM %s' % FTS_TABLE)
+        return cursor.fetchone()[0]
+
+
+def match_expression(search_term, column=None):
+    """
+    把搜索词转换成 FTS5 查询：每个词作为短语（引号转义），多个词之间是 AND，
+    与 ModelAdmin 的 search_fields 语义相同；column 限定只搜索某一列。
+    有词短于 MIN_TERM_LENGTH 时返回 None
+    """
+    terms = search_term.split()
+    if not terms or any(len(term) < MIN_TERM_LENGTH for term in terms):
+        return None
+    match = ' AND '.join('"%s"' % term.replace('"', '""') for term in terms)
+    return '%s : (%s)' % (column, match) if column else match
+
+
+def matching_ids(match):
+    """可用于 filter(pk__in=...) 的子查询"""
+    return RawSQL('SELECT rowid FROM %s WHERE %s MATCH %%s' % (FTS_TABLE, FTS_TABLE), [match])
+
+
+def ranked_ids(using, match, owner_id, limit, offset=0):
+    """某个用户的匹配文档 id，按 bm25 相关度排序"""
+    sql = (
+        'SELECT d.id FROM %s JOIN accounts_userdocument d ON d.id = %s.rowid '
+        'WHERE %s MATCH %%s AND d.owner_id = %%s '
+        'ORDER BY rank, d.uploaded_at DESC, d.id DESC LIMIT %%s OFFSET %%s'
+    ) % (FTS_TABLE, FTS_TABLE, FTS_TABLE)
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, [match, owner_id, limit, offset])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search_user_documents(queryset, owner, search_term, limit, offset=0):
+    """
+    在 owner 的文档标题中搜索，返回 (本页文档列表, 是否还有下一页)
+    能用索引时按相关度排序，否则退回 LIKE 并按上传时间倒序
+    """
+    queryset = queryset.filter(owner=owner)
+    match = match_expression(search_term, column='title')
+    if match is not None and is_supported(connections[queryset.db]):
+        ids = ranked_ids(queryset.db, match, owner.pk, limit + 1, offset)
+        documents = queryset.in_bulk(ids[:limit])
+        return [documents[pk] for pk in ids[:limit] if pk in documents], len(ids) > limit
+    for term in search_term.split():
+        queryset = queryset.filter(title__icontains=term)
+    documents = list(queryset.order_by('-uploaded_at', '-id')[offset:offset + limit + 1])
+    return documents[:limit], len(documents) > limit
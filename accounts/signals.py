@@ -0,0 +1,79 @@
+from django.contrib.auth.signals import user_logged_in
+from django.db import connections, transaction
+from django.db.migrations.recorder import MigrationRecorder
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import translation
+
+from yourapp.middleware import language_from_cookie
+
+from . import search
+from .middleware import forget_user
+from .models import CustomUser, UserDocument
+from .storage import add_usage
+from .tasks import schedule_avatar_derivatives
+from .uploads import release_blob
+
+
+@receiver(post_delete, sender=UserDocument)
+def release_document_blob(sender, instance, **kwargs):
+    # 文档删除（包括删除用户时的级联删除）后释放对共享数据的引用
+    if instance.blob_id:
+        release_blob(instance.blob_id)
+
+
+@receiver(post_delete, sender=UserDocument)
+def release_document_usage(sender, instance, **kwargs):
+    # 删除用户时 StorageUsage 会一起被删除，这时没有记录需要更新
+    add_usage(instance.owner_id, -instance.size)
+
+
+@receiver(post_save, sender=CustomUser)
+def generate_avatar_derivatives(sender, instance, update_fields=None, **kwargs):
+    # 登录时只更新 last_login，不涉及头像
+    if update_fields is not None and 'avatar' not in update_fields:
+        return
+    # 任务与保存在同一个事务中提交，由 runjobs 生成
+    if instance.avatar:
+        schedule_avatar_derivatives(instance.avatar.name)
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def invalidate_cached_user(sender, instance, **kwargs):
+    # 提交后再清除一次，避免事务提交前其他请求把旧数据重新放进缓存
+    pk = instance.pk
+    forget_user(pk)
+    transaction.on_commit(lambda: forget_user(pk))
+
+
+@receiver(user_logged_in)
+def apply_preferred_language(sender, request, user, **kwargs):
+    # 登录时已经读出了用户，不需要额外查询；语言 cookie 由 yourapp.middleware.LocaleMiddleware 写入响应
+    language = language_from_cookie(user.preferred_language) if user.preferred_language else None
+    if language is None or request is None:
+        return
+    translation.activate(language)
+    request.LANGUAGE_CODE = language
+    request.language_cookie = language
+
+
+# 全文索引的触发器引用 accounts 的表，SQLite 重建这些表（修改字段）时会失败，
+# 所以每次有迁移要执行时先删除触发器，全部执行完后再安装并重建索引。在 AccountsConfig.ready() 中连接
+SEARCH_INDEX_MIGRATION = ('accounts', '0005_document_search_index')
+
+
+def drop_search_triggers(sender, using, plan=None, **kwargs):
+    connection = connections[using]
+    if plan and search.is_supported(connection):
+        search.drop_triggers(connection)
+
+
+def install_search_index(sender, using, plan=None, **kwargs):
+    connection = connections[using]
+    if not plan or not search.is_supported(connection):
+        return
+    if SEARCH_INDEX_MIGRATION in MigrationRecorder(connection).applied_migrations():
+        search.rebuild(connection)
+    else:
+        search.uninstall(connection)  # 回退到了创建索引的迁移之前
@@ -0,0 +1,251 @@
+"""
+文档存储用量的增量统计和媒体目录的垃圾回收
+
+用量：每个用户一行 StorageUsage，文档上传、替换、删除时用一条 UPDATE 增减，
+上传时的配额检查也是同一条带条件的 UPDATE（O(1)，并发上传不会一起超出配额）。
+bulk_create 等不经过信号的写入需要自己调用 add_usage；计数出现偏差时用 recount() 重新统计。
+
+回收：删除用户或文档后，MEDIA_ROOT 下没有被任何记录引用的文件不会自动删除（旧的按日期目录保存的文档、
+替换掉的头像及其缩略图等）。collect_garbage() 按路径顺序遍历媒体目录（os.scandir，每次只读入一层目录），
+同时按同样的顺序分批读取数据库中引用的路径（values_list，每批 GC_BATCH_SIZE 个），两边做归并比较，
+内存占用与文件和记录的总数无关。
+"""
+import heapq
+import os
+import re
+import shutil
+import time
+from collections import deque
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum, Value
+from django.db.models.functions import Greatest
+
+from .avatars import AVATAR_FORMATS
+from .models import CustomUser, DocumentBlob, StorageUsage, UserDocument
+from .uploads import BLOB_DIR, blob_lock
+
+GC_BATCH_SIZE = 1000
+GC_MIN_AGE = 3600  # 修改时间在这之内的文件不处理：上传中的临时文件、已写入磁盘但事务还没提交的文件
+
+# 头像缩略图，如 avatars/me.200w.webp（accounts.avatars.derivative_name），原图被引用时保留
+DERIVATIVE_RE = re.compile(r'^(?P<root>.+)\.\d+w\.(?:%s)$' % '|'.join(
+    re.escape(extension) for extension, image_format, content_type in AVATAR_FORMATS))
+
+
+# ---- 用量 ----
+
+def add_usage(user_id, delta):
+    """增减用户的用量；没有记录时（如导入的用户）创建"""
+    if not delta:
+        return
+    updated = StorageUsage.objects.filter(user_id=user_id).update(
+        used_bytes=Greatest(F('used_bytes') + delta, Value(0)))
+    if not updated and delta > 0:
+        usage, created = StorageUsage.objects.get_or_create(user_id=user_id, defaults={'used_bytes': delta})
+        if not created:
+            StorageUsage.objects.filter(user_id=user_id).update(used_bytes=F('used_bytes') + delta)
+
+
+def reserve(user_id, size, quota):
+    """在配额内增加用量，返回是否成功；超出配额时不做修改。quota 为 None 表示不限制"""
+    if quota is None:
+        add_usage(user_id, size)
+        return True
+    if size > quota:
+        return False
+    StorageUsage.objects.get_or_create(user_id=user_id)
+    return bool(StorageUsage.objects.filter(user_id=user_id, used_bytes__lte=quota - size).update(
+        used_bytes=F('used_bytes') + size))
+
+
+def get_usage(user_id):
+    return StorageUsage.objects.filter(user_id=user_id).values_list('used_bytes', flat=True).first() or 0
+
+
+def recount():
+    """按文档的 size 重新统计所有用户的用量，返回更新的用户数"""
+    with transaction.atomic():
+        StorageUsage.objects.all().delete()
+        usage = [
+            StorageUsage(user_id=owner_id, used_bytes=used or 0)
+            for owner_id, used in UserDocument.objects.values('owner_id').annotate(
+                used=Sum('size')).values_list('owner_id', 'used')
+        ]
+        StorageUsage.objects.bulk_create(usage, batch_size=GC_BATCH_SIZE)
+    return len(usage)
+
+
+# ---- 回收 ----
+
+def managed_directories():
+    """需要回收的媒体目录（相对 MEDIA_ROOT）：各文件字段 upload_to 的第一级目录"""
+    fields = [CustomUser._meta.get_field('avatar'), UserDocument._meta.get_field('document')]
+    return sorted({field.upload_to.split('/')[0] for field in fields} | {BLOB_DIR})
+
+
+def _sort_key(entry):
+    # 子目录按 "名称/" 排序，遍历顺序就与完整路径的字符串顺序一致
+    return entry.name + '/' if entry.is_dir(follow_symlinks=False) else entry.name
+
+
+def scan(root, directory):
+    """
+    按路径的字符串顺序生成 directory 下的所有文件 (相对路径, os.DirEntry)
+    目录遍历完后生成 (相对路径 + '/', None)，调用方可以在这时删除空目录
+    """
+    with os.scandir(os.path.join(root, directory)) as it:
+        entries = sorted(it, key=_sort_key)
+    for entry in entries:
+        name = directory + '/' + entry.name
+        if entry.is_dir(follow_symlinks=False):
+            yield from scan(root, name)
+        elif entry.is_file(follow_symlinks=False):
+            yield name, entry
+    yield directory + '/', None
+
+
+def referenced_names(queryset, field, batch_size=GC_BATCH_SIZE):
+    """按路径顺序分批读取 field 中的文件路径（以上一批最后一个路径为游标，不用 OFFSET）"""
+    queryset = queryset.exclude(**{field: ''}).order_by(field).values_list(field, flat=True).distinct()
+    last = None
+    while True:
+        batch = list((queryset if last is None else queryset.filter(**{field + '__gt': last}))[:batch_size])
+        yield from batch
+        if len(batch) < batch_size:
+            return
+        last = batch[-1]
+
+
+def merge_sorted(*iterables):
+    """合并多个有序的路径流；数据库的排序规则与 Python 不一致时报错，而不是把被引用的文件当成孤儿"""
+    last = None
+    for name in heapq.merge(*iterables):
+        if last is not None and name < last:
+            raise RuntimeError("Database does not order file names by code point (%r after %r)" % (name, last))
+        if name != last:
+            yield name
+        last = name
+
+
+class References:
+    """有序的引用路径流，支持向前查看一小段"""
+
+    def __init__(self, names):
+        self.names = iter(names)
+        self.buffer = deque()
+
+    def _read(self):
+        name = next(self.names, None)
+        if name is not None:
+            self.buffer.append(name)
+        return name is not None
+
+    def advance(self, name):
+        """丢弃小于 name 的引用"""
+        while (self.buffer or self._read()) and self.buffer[0] < name:
+            self.buffer.popleft()
+
+    def window(self, upper):
+        """当前位置到 upper（不含）之间的引用"""
+        while (not self.buffer or self.buffer[-1] < upper) and self._read():
+            pass
+        return [name for name in self.buffer if name < upper]
+
+    def contains(self, name):
+        self.advance(name)
+        return bool(self.buffer) and self.buffer[0] == name
+
+    def contains_source_of(self, root):
+        """
+        是否引用了缩略图的原图 root.<扩展名>
+        原图的扩展名都以字母开头，排在缩略图 root.<数字>w.* 之后，因此先回到 root. 再向前查看
+        """
+        self.advance(root + '.')
+        return any(os.path.splitext(name)[0] == root for name in self.window(root + '/'))
+
+
+def references():
+    default_avatar = CustomUser._meta.get_field('avatar').default
+    return References(merge_sorted(
+        referenced_names(UserDocument.objects.all(), 'document'),
+        referenced_names(DocumentBlob.objects.all(), 'file'),
+        referenced_names(CustomUser.objects.all(), 'avatar'),
+        [default_avatar],
+    ))
+
+
+class GarbageReport:
+    def __init__(self):
+        self.files = 0
+        self.orphan_count = 0
+        self.orphan_bytes = 0
+        self.skipped_recent = 0
+        self.removed_dirs = 0
+
+
+def collect_garbage(media_root=None, quarantine=None, dry_run=False, min_age=GC_MIN_AGE, on_orphan=None):
+    """
+    删除（或移动到 quarantine 目录，保留相对路径）没有被引用的媒体文件，返回 GarbageReport
+    dry_run 时只统计；每个孤儿文件处理前调用 on_orphan(相对路径, 字节数)
+    """
+    media_root = str(media_root or settings.MEDIA_ROOT)
+    report = GarbageReport()
+    refs = references()
+    cutoff = time.time() - min_age
+    for directory in managed_directories():
+        if not os.path.isdir(os.path.join(media_root, directory)):
+            continue
+        for name, entry in scan(media_root, directory):
+            path = os.path.join(media_root, name)
+            if entry is None:
+                if name != directory + '/' and not dry_run and _remove_empty_dir(path):
+                    report.removed_dirs += 1
+                continue
+            report.files += 1
+            # 文件本身被引用时总是保留（如上传的头像恰好叫 me.200w.jpg）；没被引用的缩略图在原图被引用时保留。
+            # contains() 已经前进到 name，原图排在缩略图之后，contains_source_of() 仍能看到它
+            match = DERIVATIVE_RE.match(name)
+            if refs.contains(name) or (match and refs.contains_source_of(match.group('root'))):
+                continue
+            stat = entry.stat(follow_symlinks=False)
+            if stat.st_mtime > cutoff:
+                report.skipped_recent += 1
+                continue
+            blob = name.startswith(BLOB_DIR + '/')
+            # 与 store_blob 放入同一内容的文件互斥，检查之后不会再有新上传复用这个文件
+            with blob_lock(_blob_sha256(name)) if blob and not dry_run else nullcontext():
+                if blob and _blob_recreated(name):
+                    continue
+                report.orphan_count += 1
+                report.orphan_bytes += stat.st_size
+                if on_orphan is not None:
+                    on_orphan(name, stat.st_size)
+                if dry_run:
+                    continue
+                if quarantine:
+                    target = os.path.join(quarantine, name)
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    shutil.move(path, target)
+                else:
+                    os.remove(path)
+    return report
+
+
+def _blob_sha256(name):
+    return os.path.splitext(os.path.basename(name))[0]
+
+
+def _blob_recreated(name):
+    # 读取引用之后，同样内容的新上传可能重新创建了 DocumentBlob，直接复用磁盘上已有的文件（store_blob）
+    return DocumentBlob.objects.filter(sha256=_blob_sha256(name)).exists()
+
+
+def _remove_empty_dir(path):
+    try:
+        os.rmdir(path)
+    except OSError:
+        return False
+    return True
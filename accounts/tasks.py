@@ -0,0 +1,68 @@
+"""
+文档上传和头像更换后的后台处理（由 yourapp/jobs.py 的 worker 执行，不占用上传请求）
+
+文档的处理对象是 DocumentBlob：相同内容的文档只处理一次。任务可以重复执行，结果相同。
+"""
+import re
+import zipfile
+
+from django.conf import settings
+from django.utils import timezone
+
+from yourapp.jobs import task
+from yourapp.models import Job
+
+from .avatars import derivatives_ready, generate_derivatives
+from .models import DocumentBlob
+
+PDF_PAGE_RE = re.compile(rb'/Type\s*/Page(?![A-Za-z])')
+PDF_COUNT_RE = re.compile(rb'/Count\s+(\d+)')
+DOCX_PAGES_RE = re.compile(rb'<Pages>(\d+)</Pages>')
+
+
+def count_pages(path, content_type):
+    """PDF 统计页面对象（页面在压缩的对象流中时使用页树根节点的 /Count），DOCX 读取 docProps/app.xml；纯文本返回 None"""
+    if content_type == 'application/pdf':
+        with open(path, 'rb') as fp:
+            data = fp.read()
+        pages = len(PDF_PAGE_RE.findall(data))
+        if not pages:
+            counts = [int(count) for count in PDF_COUNT_RE.findall(data)]
+            pages = max(counts) if counts else None
+        return pages
+    if content_type.endswith('wordprocessingml.document'):
+        try:
+            with zipfile.ZipFile(path) as archive:
+                match = DOCX_PAGES_RE.search(archive.read('docProps/app.xml'))
+        except (KeyError, zipfile.BadZipFile):
+            return None
+        return int(match.group(1)) if match else None
+    return None
+
+
+@task
+def process_blob(blob_id):
+    blob = DocumentBlob.objects.filter(pk=blob_id).first()
+    if blob is None:
+        return  # 文档已被删除
+    page_count = count_pages(blob.file.path, blob.content_type)
+    DocumentBlob.objects.filter(pk=blob_id).update(page_count=page_count, processed_at=timezone.now())
+
+
+@task
+def generate_avatar_derivatives(avatar):
+    generate_derivatives(str(settings.MEDIA_ROOT), avatar)
+
+
+def schedule_avatar_derivatives(name):
+    """
+    把生成头像缩略图放入任务队列；已生成或已在队列中时直接返回
+    图片损坏等错误按队列的规则重试，最终标记为 failed，之后页面一直显示原图，不会再次提交
+    """
+    if derivatives_ready(name):
+        return
+    pending = Job.objects.filter(
+        name=generate_avatar_derivatives.job_name, kwargs__avatar=name, status__in=(Job.QUEUED, Job.RUNNING),
+    )
+    if not pending.exists():
+        generate_avatar_derivatives.enqueue(avatar=name)
@@ -0,0 +1,44 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from ..avatars import AVATAR_FORMATS, AVATAR_SIZES, derivative_name, derivatives_ready
+
+register = template.Library()
+
+# 与 style.css 中 .avatar 的显示尺寸一致
+AVATAR_DISPLAY_SIZES = '(max-width: 768px) 80px, 100px'
+
+
+def _srcset(avatar, extension):
+    return ', '.join(
+        '%s %dw' % (avatar.storage.url(derivative_name(avatar.name, size, extension)), size)
+        for size in AVATAR_SIZES
+    )
+
+
+@register.simple_tag
+def avatar_picture(avatar, alt='', css_class='avatar'):
+    """
+    输出带 srcset 的 <picture>，浏览器按屏幕密度选择合适尺寸的 WebP/JPEG
+    缩略图还没生成（保存头像时放入后台任务队列）或生成失败时输出原图；
+    这里不访问数据库，异步视图中也可以渲染
+    用法：{% avatar_picture user.avatar avatar_alt %}
+    """
+    if not avatar:
+        return ''
+    if not derivatives_ready(avatar.name):
+        return format_html('<img src="{}" alt="{}" class="{}" loading="lazy">', avatar.url, alt, css_class)
+
+    *sources, (fallback_extension, fallback_format, fallback_type) = AVATAR_FORMATS
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}" alt="{}" class="{}" loading="lazy"></picture>',
+        format_html_join('', '<source type="{}" srcset="{}" sizes="{}">', (
+            (content_type, _srcset(avatar, extension), AVATAR_DISPLAY_SIZES)
+            for extension, image_format, content_type in sources
+        )),
+        avatar.storage.url(derivative_name(avatar.name, AVATAR_SIZES[0], fallback_extension)),
+        _srcset(avatar, fallback_extension),
+        AVATAR_DISPLAY_SIZES,
+        alt,
+        css_class,
+    )
@@ -1,3 +1,504 @@
-from django.test import TestCase
+import csv
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+
+from yourapp import jobs
+from yourapp.models import Job
+
+from . import avatars, search, tasks, transfer
+from .hashing import HashingLimiter, PoolSaturated, run
+from .downloads import serve_file
+from .forms import DocumentUploadForm, ProfileForm
+from .models import CustomUser, DocumentBlob, UserDocument
+from .storage import collect_garbage, get_usage
+from .uploads import BLOB_TMP_DIR, HashedUploadedFile, release_blob, sniff_document_type, store_blob
+
+
+def touch(root, name, content=b'x', age=7200):
+    """在 root 下创建文件 name，修改时间设为 age 秒之前"""
+    path = os.path.join(root, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
+    mtime = time.time() - age
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def isolate_pages(testcase):
+    """
+    渲染页面的测试使用临时的 MEDIA_ROOT（头像缩略图、on_commit 生成的默认头像缩略图写在这里），
+    静态文件不经过 collectstatic 的 manifest（生产配置使用 CompressedManifestStaticFilesStorage）
+    """
+    media = tempfile.mkdtemp()
+    testcase.addCleanup(shutil.rmtree, media, ignore_errors=True)
+    os.makedirs(os.path.join(media, 'avatars'))
+    shutil.copy(os.path.join(settings.MEDIA_ROOT, 'avatars/default_avatar.png'), os.path.join(media, 'avatars'))
+    testcase.enterContext(override_settings(MEDIA_ROOT=media, STORAGES=dict(settings.STORAGES, staticfiles={
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    })))
+    return media
+
+
+def listdir(root):
+    return sorted(
+        os.path.relpath(os.path.join(directory, name), root).replace(os.sep, '/')
+        for directory, dirnames, filenames in os.walk(root) for name in filenames
+    )
+
+
+class CollectGarbageTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        touch(self.media, 'avatars/default_avatar.png')
+        self.user = CustomUser.objects.create_user('alice', 'alice@example.com', 'pw-12345678x')
+
+    def collect(self, **kwargs):
+        with override_settings(MEDIA_ROOT=self.media):
+            return collect_garbage(**kwargs)
+
+    def test_orphans_removed_and_referenced_files_kept(self):
+        CustomUser.objects.filter(pk=self.user.pk).update(avatar='avatars/me.png')
+        for name in ('avatars/me.png', 'avatars/me.200w.webp', 'avatars/gone.png', 'avatars/gone.200w.webp',
+                     'user_docs/2020/01/01/old.txt'):
+            touch(self.media, name)
+        report = self.collect()
+        self.assertEqual(report.orphan_count, 3)
+        self.assertEqual(listdir(self.media), ['avatars/default_avatar.png', 'avatars/me.200w.webp', 'avatars/me.png'])
+        self.assertFalse(os.path.exists(os.path.join(self.media, 'user_docs/2020')))  # 空目录一并删除
+
+    def test_referenced_file_named_like_derivative_kept(self):
+        CustomUser.objects.filter(pk=self.user.pk).update(avatar='avatars/me.200w.jpg')
+        touch(self.media, 'avatars/me.200w.jpg')
+        touch(self.media, 'avatars/me.200w.200w.webp')  # 这个头像自己的缩略图
+        report = self.collect()
+        self.assertEqual(report.orphan_count, 0)
+        self.assertIn('avatars/me.200w.jpg', listdir(self.media))
+        self.assertIn('avatars/me.200w.200w.webp', listdir(self.media))
+
+    def test_recent_files_and_dry_run_untouched(self):
+        touch(self.media, 'avatars/new.png', age=0)
+        touch(self.media, 'avatars/old.png')
+        report = self.collect(dry_run=True)
+        self.assertEqual((report.orphan_count, report.skipped_recent), (1, 1))
+        self.assertIn('avatars/old.png', listdir(self.media))
+
+
+class CachedUserTests(TestCase):
+    def setUp(self):
+        isolate_pages(self)
+        self.user = CustomUser.objects.create_user('alice', 'alice@example.com', 'pw-12345678x')
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get('/accounts/profile/').status_code, 200)  # 放入进程内缓存
+
+    def test_changes_made_by_other_workers_end_session(self):
+        # queryset.update() 不发送信号，相当于在另一个 worker 中修改，本进程的缓存没有被清除
+        CustomUser.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.client.get('/accounts/profile/').status_code, 302)
+
+    def test_profile_form_does_not_overwrite_other_columns(self):
+        stale = CustomUser.objects.get(pk=self.user.pk)
+        CustomUser.objects.filter(pk=self.user.pk).update(preferred_language='en')
+        form = ProfileForm({'username': 'alice', 'email': 'new@example.com', 'bio': '', 'website': ''},
+                           instance=stale)
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.email, self.user.preferred_language), ('new@example.com', 'en'))
+
+
+@override_settings(SENDFILE_BACKEND=None)  # 生产配置使用 X-Accel-Redirect，这里测试由 Django 发送文件
+class ServeFileTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        self.path = touch(self.media, 'user_docs/a.txt', b'0123456789')
+
+    def serve(self, **headers):
+        with override_settings(MEDIA_ROOT=self.media):
+            return serve_file(RequestFactory().get('/', **headers), self.path, 'a.txt')
+
+    def test_sendfile_header_from_client_ignored(self):
+        response = self.serve(HTTP_X_SENDFILE_TYPE='X-Sendfile')
+        self.assertNotIn('X-Sendfile', response)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+
+    @override_settings(SENDFILE_BACKEND='X-Accel-Redirect')
+    def test_accel_redirect_backend(self):
+        response = self.serve()
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/user_docs/a.txt')
+        self.assertEqual(response.content, b'')
+
+    def test_range(self):
+        response = self.serve(HTTP_RANGE='bytes=2-4')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), b'234')
+
+
+class SearchIndexTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('alice', 'alice@example.com', 'pw-12345678x')
+
+    def add(self, title, owner=None):
+        return UserDocument.objects.create(owner=owner or self.user, title=title, document='user_docs/x.txt')
+
+    def search(self, term):
+        documents, has_next = search.search_user_documents(UserDocument.objects.all(), self.user, term, 10)
+        return [doc.title for doc in documents]
+
+    def test_index_follows_inserts_updates_and_deletes(self):
+        report = self.add('季度财务报告')
+        self.add('会议纪要')
+        self.assertEqual(self.search('财务报'), ['季度财务报告'])
+        report.title = '年度审计报告'
+        report.save()
+        self.assertEqual(self.search('财务报'), [])
+        self.assertEqual(self.search('审计报'), ['年度审计报告'])
+        report.delete()
+        self.assertEqual(self.search('审计报'), [])
+
+    def test_username_change_updates_index(self):
+        doc = self.add('notes')
+        match = search.match_expression('carol', column='username')
+        self.assertFalse(UserDocument.objects.filter(pk__in=search.matching_ids(match)).exists())
+        CustomUser.objects.filter(pk=self.user.pk).update(username='carol')
+        self.assertEqual(list(UserDocument.objects.filter(pk__in=search.matching_ids(match))), [doc])
+
+    def test_short_terms_fall_back_to_like(self):
+        self.assertIsNone(search.match_expression('报告'))
+        self.add('季度财务报告')
+        self.add('其他用户的报告', owner=CustomUser.objects.create_user('bob', 'bob@example.com', 'pw-12345678x'))
+        self.assertEqual(self.search('报告'), ['季度财务报告'])
+
+    def test_old_sqlite_falls_back_to_like(self):
+        self.add('季度财务报告')
+        with mock.patch.object(connection.Database, 'sqlite_version_info', (3, 31, 1)):
+            self.assertFalse(search.is_supported(connection))
+            with mock.patch.object(search, 'ranked_ids') as ranked_ids:
+                self.assertEqual(self.search('财务报'), ['季度财务报告'])
+            ranked_ids.assert_not_called()
+
+
+class SearchIndexMigrationTests(TransactionTestCase):
+    # 生产配置的 ReadWriteRouter 把事务外的读取发到 read 连接（测试时是 default 的镜像），开发配置没有这个连接
+    databases = '__all__'
+
+    def test_table_rebuilding_migrations_with_index_installed(self):
+        # 回退并重新执行添加字段的迁移（SQLite 会重建 accounts 的两张表），触发器不能让它们失败
+        user = CustomUser.objects.create_user('alice', 'alice@example.com', 'pw-12345678x')
+        UserDocument.objects.create(owner=user, title='季度财务报告', document='user_docs/x.txt')
+        call_command('migrate', 'accounts', '0006', verbosity=0)
+        call_command('migrate', 'accounts', verbosity=0)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+            self.assertEqual({row[0] for row in cursor.fetchall()}, set(search.TRIGGERS))
+        documents, has_next = search.search_user_documents(UserDocument.objects.all(), user, '财务报', 10)
+        self.assertEqual([doc.title for doc in documents], ['季度财务报告'])
+
+
+class HashingLimiterTests(TestCase):
+    def setUp(self):
+        self.lock_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.lock_dir, ignore_errors=True)
+
+    def test_slots_shared_through_lock_files(self):
+        # 两个 HashingLimiter 各自打开锁文件，与两个 worker 进程的情况相同
+        first = HashingLimiter(self.lock_dir, workers=1, backlog=1)
+        second = HashingLimiter(self.lock_dir, workers=1, backlog=1)
+        with first.admission(), first.slot():
+            with second.admission():
+                self.assertIsNone(second.running.try_acquire())
+                with self.assertRaises(PoolSaturated):
+                    with first.admission():
+                        pass
+        with second.admission(), second.slot():
+            pass
+
+    def test_nested_hashing_does_not_wait_for_itself(self):
+        with override_settings(PASSWORD_HASHING_LOCK_DIR=self.lock_dir, PASSWORD_HASHING_WORKERS=1,
+                               PASSWORD_HASHING_BACKLOG=0):
+            self.assertEqual(run(run, lambda: 42), 42)
+
+
+class BlobStorageTests(TestCase):
+    content = b'hello blob\n'
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=self.media, BLOB_LOCK_DIR=os.path.join(self.media, 'locks')))
+
+    def upload(self):
+        tmp_dir = os.path.join(self.media, BLOB_TMP_DIR)
+        os.makedirs(tmp_dir, exist_ok=True)
+        file = tempfile.NamedTemporaryFile(suffix='.upload', dir=tmp_dir)
+        file.write(self.content)
+        file.flush()
+        return HashedUploadedFile(file, 'a.txt', 'text/plain', len(self.content), None,
+                                  sha256=hashlib.sha256(self.content).hexdigest(), document_type='txt')
+
+    def blob_path(self, upload):
+        return os.path.join(self.media, upload.blob_name)
+
+    def test_file_moved_on_commit(self):
+        upload = self.upload()
+        with self.captureOnCommitCallbacks(execute=True):
+            blob = store_blob(upload)
+            self.assertFalse(os.path.exists(self.blob_path(upload)))
+        with open(self.blob_path(upload), 'rb') as f:
+            self.assertEqual(f.read(), self.content)
+        self.assertEqual(DocumentBlob.objects.get(pk=blob.pk).refcount, 1)
+
+    def test_rollback_leaves_no_file(self):
+        upload = self.upload()
+        with self.captureOnCommitCallbacks() as callbacks:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                store_blob(upload)
+                raise RuntimeError
+        self.assertEqual(callbacks, [])
+        upload.close()
+        self.assertEqual(listdir(self.media), [])
+
+    def test_release_keeps_file_reused_by_concurrent_upload(self):
+        first = self.upload()
+        with self.captureOnCommitCallbacks(execute=True):
+            blob = store_blob(first)
+        with self.captureOnCommitCallbacks() as release_callbacks:
+            release_blob(blob.pk)
+        # 删除文件的回调执行之前，同样内容的新上传已经提交并丢弃了自己的临时文件
+        second = self.upload()
+        with self.captureOnCommitCallbacks(execute=True):
+            store_blob(second)
+        for callback in release_callbacks:
+            callback()
+        self.assertTrue(os.path.exists(self.blob_path(second)))
+
+    def test_release_deletes_unused_file(self):
+        upload = self.upload()
+        with self.captureOnCommitCallbacks(execute=True):
+            blob = store_blob(upload)
+        with self.captureOnCommitCallbacks(execute=True):
+            release_blob(blob.pk)
+        self.assertFalse(os.path.exists(self.blob_path(upload)))
+        self.assertFalse(DocumentBlob.objects.exists())
+
+
+class PlainUploadTests(TestCase):
+    """没有经过 ContentAddressedUploadHandler 的上传（Django 默认的上传处理器）"""
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=self.media, BLOB_LOCK_DIR=tempfile.mkdtemp()))
+        self.addCleanup(shutil.rmtree, settings.BLOB_LOCK_DIR, ignore_errors=True)
+        self.user = CustomUser.objects.create_user('alice', 'alice@example.com', 'pw-12345678x')
+
+    def form(self, name, content):
+        upload = io.BytesIO(content)
+        upload.name = name
+        request = RequestFactory().post('/', {'title': 'doc', 'document': upload})
+        return DocumentUploadForm(request.POST, request.FILES)
+
+    def test_plain_upload_stored(self):
+        form = self.form('a.txt', b'plain upload\n')
+        self.assertTrue(form.is_valid(), form.errors)
+        with self.captureOnCommitCallbacks(execute=True):
+            doc = form.save_document(self.user)
+        self.assertEqual(doc.blob.sha256, hashlib.sha256(b'plain upload\n').hexdigest())
+        self.assertEqual(listdir(self.media), [doc.blob.file.name])
+        with open(os.path.join(self.media, doc.blob.file.name), 'rb') as f:
+            self.assertEqual(f.read(), b'plain upload\n')
+
+    def test_plain_upload_rejected(self):
+        form = self.form('a.txt', b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR')
+        self.assertFalse(form.is_valid())
+        self.assertIn('document', form.errors)
+        self.assertEqual(listdir(self.media), [])
+
+
+class SniffDocumentTypeTests(TestCase):
+    def test_text_encodings(self):
+        text = '季度财务报告，第一部分。' * 10
+        for encoding in ('utf-8', 'gbk', 'gb18030'):
+            with self.subTest(encoding=encoding):
+                self.assertEqual(sniff_document_type(text.encode(encoding)), 'txt')
+                self.assertEqual(sniff_document_type(text.encode(encoding)[:-1]), 'txt')  # 截断在字符中间
+
+    def test_binary_rejected(self):
+        self.assertIsNone(sniff_document_type(b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR'))
+        self.assertIsNone(sniff_document_type(b'\xff' * 64))
+        self.assertEqual(sniff_document_type(b'%PDF-1.7\n'), 'pdf')
+
+
+class TransferTests(TestCase):
+    users = [
+        {'uuid': str(uuid.uuid4()), 'username': name, 'email': '%s@example.com' % name,
+         'password': 'pbkdf2_sha256$1000000$salt$hash', 'first_name': '', 'last_name': '', 'is_active': True,
+         'is_staff': False, 'is_superuser': False, 'date_joined': '2024-05-01T08:30:15.123456+00:00',
+         'last_login': None, 'bio': '简介', 'avatar': 'avatars/default_avatar.png', 'website': ''}
+        for name in ('alice', 'bob', 'carol')
+    ]
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.source = tempfile.mkdtemp()
+        self.work = tempfile.mkdtemp()
+        for directory in (self.media, self.source, self.work):
+            self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=self.media, BLOB_LOCK_DIR=os.path.join(self.work, 'locks')))
+
+    def write_jsonl(self, name, records):
+        path = os.path.join(self.work, name)
+        with open(path, 'w', encoding='utf-8') as fp:
+            fp.writelines(json.dumps(record, ensure_ascii=False) + '\n' for record in records)
+        return path
+
+    def read_jsonl(self, path):
+        with open(path, encoding='utf-8') as fp:
+            return [json.loads(line) for line in fp]
+
+    def call(self, name, *args, **options):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command(name, *args, stdout=io.StringIO(), stderr=io.StringIO(), **options)
+
+    def import_users(self):
+        self.call('importdata', 'users', self.write_jsonl('users.jsonl', self.users), workers=1,
+                  source_media=self.source)
+
+    def test_users_round_trip(self):
+        self.import_users()
+        exported = os.path.join(self.work, 'export.jsonl')
+        self.call('exportdata', 'users', exported, batch_size=2)
+        self.assertEqual(self.read_jsonl(exported), self.users)
+        self.import_users()  # 再次导入时全部跳过
+        self.assertEqual(CustomUser.objects.count(), 3)
+
+    def test_documents_import_and_export_csv(self):
+        self.import_users()
+        alice = self.users[0]['uuid']
+        touch(self.source, 'user_docs/a.txt', b'same content')
+        touch(self.source, 'user_docs/b.txt', b'same content')
+        duplicate = str(uuid.uuid4())
+        uploaded_at = '2024-06-01T10:00:00.000001+00:00'
+        documents = os.path.join(self.work, 'documents.csv')
+        with open(documents, 'w', newline='', encoding='utf-8') as fp:
+            writer = csv.writer(fp)
+            writer.writerow(['uuid', 'owner', 'title', 'document', 'uploaded_at'])
+            writer.writerow([duplicate, alice, '报告', 'user_docs/a.txt', uploaded_at])
+            writer.writerow([duplicate, alice, '重复', 'user_docs/a.txt', uploaded_at])  # 同一批中重复的 uuid
+            writer.writerow([str(uuid.uuid4()), alice, '副本', 'user_docs/b.txt', uploaded_at])
+            writer.writerow([str(uuid.uuid4()), str(uuid.uuid4()), '无主', 'user_docs/a.txt', uploaded_at])
+            writer.writerow([str(uuid.uuid4()), alice, '缺失', 'user_docs/missing.txt', uploaded_at])
+        self.call('importdata', 'documents', documents, workers=1, source_media=self.source)
+
+        self.assertEqual(sorted(UserDocument.objects.values_list('title', flat=True)), ['副本', '报告'])
+        blob = DocumentBlob.objects.get()
+        self.assertEqual(blob.refcount, 2)
+        self.assertEqual(listdir(self.media), [blob.file.name])  # 临时文件都已移动或删除
+        self.assertEqual(get_usage(CustomUser.objects.get(uuid=alice).pk), 2 * len(b'same content'))
+
+        exported = os.path.join(self.work, 'export.csv')
+        self.call('exportdata', 'documents', exported)
+        with open(exported, newline='', encoding='utf-8') as fp:
+            rows = list(csv.DictReader(fp))
+        self.assertEqual(rows[0], {'uuid': duplicate, 'owner': alice, 'title': '报告', 'document': blob.file.name,
+                                   'uploaded_at': uploaded_at})
+        self.assertTrue(UserDocument._meta.get_field('uploaded_at').auto_now_add)  # 导入不修改字段定义
+
+    def test_failed_batch_removes_staged_files(self):
+        self.import_users()
+        touch(self.source, 'user_docs/a.txt', b'content')
+        records = [{'uuid': str(uuid.uuid4()), 'owner': self.users[0]['uuid'], 'title': 'a',
+                    'document': 'user_docs/a.txt'}]
+        with mock.patch('accounts.transfer.add_usage', side_effect=RuntimeError), self.assertRaises(RuntimeError):
+            self.call('importdata', 'documents', self.write_jsonl('documents.jsonl', records), workers=1,
+                      source_media=self.source)
+        self.assertEqual(listdir(self.media), [])
+        self.assertFalse(UserDocument.objects.exists())
+
+    def test_import_resumes_from_checkpoint(self):
+        path = self.write_jsonl('users.jsonl', self.users)
+        calls = []
+
+        def interrupted(records, *args):
+            calls.append([record['username'] for record in records])
+            if len(calls) == 2:
+                raise KeyboardInterrupt
+            return transfer.import_users(records, *args)
+
+        with mock.patch.dict('yourapp.management.commands.importdata.IMPORTERS', users=interrupted):
+            with self.assertRaises(KeyboardInterrupt):
+                self.call('importdata', 'users', path, workers=1, batch_size=1)
+        self.assertTrue(os.path.exists(path + '.checkpoint'))
+        self.call('importdata', 'users', path, workers=1, batch_size=1, resume=True)
+        self.assertEqual(calls, [['alice'], ['bob']])
+        self.assertEqual(sorted(CustomUser.objects.values_list('username', flat=True)), ['alice', 'bob', 'carol'])
+        self.assertFalse(os.path.exists(path + '.checkpoint'))
+
+    def test_export_resumes_from_checkpoint(self):
+        self.import_users()
+        path = os.path.join(self.work, 'export.jsonl')
+
+        def interrupted(*args):
+            yield next(transfer.export_batches(*args))
+            raise KeyboardInterrupt
+
+        with mock.patch('yourapp.management.commands.exportdata.export_batches', interrupted), self.assertRaises(KeyboardInterrupt):
+            self.call('exportdata', 'users', path, batch_size=2)
+        with open(path, 'a', encoding='utf-8') as fp:
+            fp.write('{"uuid": "half a line')  # 中断时写了一半的记录
+        self.call('exportdata', 'users', path, batch_size=2, resume=True)
+        self.assertEqual(self.read_jsonl(path), self.users)
+        self.assertFalse(os.path.exists(path + '.checkpoint'))
+
+
+class AvatarDerivativeTests(TestCase):
+    def setUp(self):
+        isolate_pages(self)
+
+    def jobs(self):
+        return Job.objects.filter(name=tasks.generate_avatar_derivatives.job_name)
+
+    def run_jobs(self):
+        for job in jobs.claim('test', 10):
+            jobs.finish(job, *jobs.execute(job.name, job.kwargs))
+
+    def render(self, user):
+        return Template('{% load avatars %}{% avatar_picture user.avatar %}').render(Context({'user': user}))
+
+    def test_generated_by_job_queue(self):
+        user = CustomUser.objects.create_user('alice', 'alice@example.com', 'pw-12345678x')
+        user.save()  # 已在队列中
+        self.assertEqual(self.jobs().count(), 1)
+        self.assertIn('<img src=', self.render(user))
+        self.run_jobs()
+        self.assertTrue(avatars.derivatives_ready(user.avatar.name))
+        self.assertIn('<picture>', self.render(user))
+        CustomUser.objects.create_user('bob', 'bob@example.com', 'pw-12345678x')
+        self.assertEqual(self.jobs().count(), 1)  # 已生成
+
+    def test_failed_image_not_resubmitted(self):
+        name = 'avatars/broken.png'
+        os.makedirs(os.path.join(settings.MEDIA_ROOT, 'avatars'), exist_ok=True)
+        with open(os.path.join(settings.MEDIA_ROOT, name), 'wb') as fp:
+            fp.write(b'not an image')
+        user = CustomUser.objects.create_user('alice', 'alice@example.com', 'pw-12345678x', avatar=name)
+        self.jobs().update(max_attempts=1)
+        self.run_jobs()
+        self.assertEqual(self.jobs().get().status, Job.FAILED)
+        self.assertIn('<img src=', self.render(user))  # 显示头像不会重新提交
+        self.assertEqual(self.jobs().count(), 1)
@@ -0,0 +1,397 @@
+"""
+用户和文档的批量导入/导出（yourapp/management/commands/importdata.py、exportdata.py）
+
+- 记录格式为 JSONL 或 CSV，逐行读写，内存占用与文件大小无关
+- 导出按主键做键集分页，导入按批 bulk_create，每批一个事务，保留 uuid 和时间字段
+- 每批提交后把读取位置（导出时是最后一个主键）写入检查点文件，中断后可以从检查点继续
+- 头像和文档文件在进程池中复制、处理，进程池中的函数只操作文件，不访问数据库
+- 已存在的 uuid 直接跳过，同一批重复导入不会产生重复数据；同一批中重复的 uuid 只导入第一条
+- 文档文件先复制到临时文件，事务提交后才移动到内容寻址路径（与上传相同），回滚时删除临时文件
+"""
+import csv
+import datetime
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from collections import Counter
+from functools import partial
+
+from django.contrib.auth.hashers import make_password
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+
+from .avatars import derivatives_ready, generate_derivatives
+from .models import CustomUser, DocumentBlob, UserDocument
+from .storage import add_usage
+from .tasks import process_blob
+from .uploads import ALLOWED_DOCUMENT_TYPES, BLOB_TMP_DIR, UploadInspector, blob_name, place_blob_file
+
+FORMATS = ('jsonl', 'csv')
+BATCH_SIZE = 1000
+
+# 导入导出的字段；文档的 owner 是用户的 uuid，文件字段是相对 MEDIA_ROOT 的路径
+USER_FIELDS = (
+    'uuid', 'username', 'email', 'password', 'first_name', 'last_name', 'is_active', 'is_staff',
+    'is_superuser', 'date_joined', 'last_login', 'bio', 'avatar', 'website',
+)
+DOCUMENT_FIELDS = ('uuid', 'owner', 'title', 'document', 'uploaded_at')
+
+# 导入时跳过记录的原因
+EXISTS = 'exists'
+USERNAME_TAKEN = 'username_taken'
+MISSING_OWNER = 'missing_owner'
+MISSING_FILE = 'missing_file'
+
+
+def detect_format(path, format=None):
+    if format:
+        return format
+    return 'csv' if path.lower().endswith('.csv') else 'jsonl'
+
+
+class RecordReader:
+    """逐条读取 JSONL/CSV 记录；tell() 返回下一条记录的位置，可保存到检查点后 seek 回来"""
+
+    def __init__(self, fp, format, offset=None, fieldnames=None):
+        self.fp = fp
+        self.format = format
+        # 用 readline 而不是迭代文件对象，否则无法 tell()；csv.reader 每次只取一条记录需要的行
+        lines = iter(fp.readline, '')
+        if format == 'csv':
+            self.reader = csv.reader(lines)
+            self.fieldnames = fieldnames or next(self.reader)
+        else:
+            self.reader = (json.loads(line) for line in lines if line.strip())
+            self.fieldnames = fieldnames
+        if offset is not None:
+            fp.seek(offset)
+
+    def __iter__(self):
+        if self.format == 'csv':
+            for row in self.reader:
+                yield dict(zip(self.fieldnames, row))
+        else:
+            yield from self.reader
+
+    def tell(self):
+        return self.fp.tell()
+
+
+class RecordWriter:
+    def __init__(self, fp, format, fieldnames, header=True):
+        self.fp = fp
+        self.format = format
+        self.fieldnames = fieldnames
+        if format == 'csv':
+            self.writer = csv.writer(fp)
+            if header:
+                self.writer.writerow(fieldnames)
+
+    def write(self, record):
+        if self.format == 'csv':
+            self.writer.writerow(['' if record[name] is None else _text(record[name]) for name in self.fieldnames])
+        else:
+            self.fp.write(json.dumps(record, cls=RecordEncoder, ensure_ascii=False) + '\n')
+
+
+class RecordEncoder(DjangoJSONEncoder):
+    """与 DjangoJSONEncoder 相同，但时间保留微秒，导入后与原数据完全一致"""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def _text(value):
+    if isinstance(value, (datetime.datetime, uuid.UUID)):
+        return RecordEncoder().default(value)
+    return value
+
+
+def load_checkpoint(path):
+    try:
+        with open(path) as fp:
+            return json.load(fp)
+    except FileNotFoundError:
+        return None
+
+
+def save_checkpoint(path, state):
+    with open(path + '.tmp', 'w') as fp:
+        json.dump(state, fp)
+    os.replace(path + '.tmp', path)
+
+
+class Throughput:
+    """导入导出的进度和吞吐量统计"""
+
+    def __init__(self, rows=0):
+        self.start = time.perf_counter()
+        self.initial = rows
+        self.rows = rows
+        self.files = 0
+        self.bytes = 0
+        self.skipped = Counter()
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def report(self):
+        elapsed = self.elapsed
+        rate = (self.rows - self.initial) / elapsed if elapsed else 0
+        parts = ['%d rows in %.1fs (%.0f rows/s)' % (self.rows, elapsed, rate)]
+        if self.files:
+            parts.append('%d files, %.1f MB/s' % (self.files, self.bytes / elapsed / 1024 / 1024 if elapsed else 0))
+        if self.skipped:
+            parts.append('skipped: %s' % ', '.join('%s=%d' % item for item in sorted(self.skipped.items())))
+        return '; '.join(parts)
+
+
+# ---- 导出 ----
+
+def export_batches(kind, after=0, batch_size=BATCH_SIZE):
+    """按主键顺序分批生成 (最后一个主键, [记录])，每批一次查询"""
+    if kind == 'users':
+        queryset = CustomUser.objects.values_list('pk', *USER_FIELDS)
+        fields = USER_FIELDS
+    else:
+        queryset = UserDocument.objects.values_list('pk', *[
+            'owner__uuid' if name == 'owner' else name for name in DOCUMENT_FIELDS
+        ])
+        fields = DOCUMENT_FIELDS
+    while True:
+        rows = list(queryset.filter(pk__gt=after).order_by('pk')[:batch_size])
+        if not rows:
+            return
+        after = rows[-1][0]
+        yield after, [dict(zip(fields, row[1:])) for row in rows]
+
+
+# ---- 进程池中处理文件 ----
+
+def _copy(source, target):
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    shutil.copyfile(source, target + '.tmp')
+    os.replace(target + '.tmp', target)
+
+
+def copy_avatar(source_root, media_root, name):
+    """把头像复制到 MEDIA_ROOT 并生成缩略图，返回 (复制的字节数, 错误)"""
+    source = os.path.join(source_root, name)
+    target = os.path.join(media_root, name)
+    copied = 0
+    if not os.path.exists(target):
+        if not os.path.exists(source):
+            return 0, MISSING_FILE
+        _copy(source, target)
+        copied = os.path.getsize(target)
+    try:
+        generate_derivatives(media_root, name)
+    except Exception as exc:
+        return copied, str(exc)
+    return copied, None
+
+
+def stage_document(source_root, media_root, name):
+    """
+    复制文档到 BLOB_TMP_DIR 下的临时文件，同时计算 sha256 并检查类型和大小（与上传相同的规则）
+    返回 dict(sha256, size, content_type, blob_name, tmp) 或 dict(error)
+    """
+    source = os.path.join(source_root, name)
+    if not os.path.exists(source):
+        return {'error': MISSING_FILE}
+    inspector = UploadInspector(os.path.basename(name))
+    tmp_dir = os.path.join(media_root, BLOB_TMP_DIR)
+    os.makedirs(tmp_dir, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(suffix='.import', dir=tmp_dir)
+    with open(source, 'rb') as src, os.fdopen(fd, 'wb') as dst:
+        while chunk := src.read(64 * 1024):
+            if not inspector.feed(chunk):
+                break
+            dst.write(chunk)
+    error = inspector.error()
+    if error:
+        os.remove(tmp)
+        return {'error': error}
+    document_type = inspector.document_type()
+    sha256 = inspector.sha256.hexdigest()
+    return {
+        'sha256': sha256,
+        'size': inspector.size,
+        'content_type': ALLOWED_DOCUMENT_TYPES[document_type],
+        'blob_name': blob_name(sha256, document_type),
+        'tmp': tmp,
+    }
+
+
+def _place_staged(tmp, media_root, name, sha256):
+    # 事务提交后执行：已经有相同内容的文件时丢弃临时文件
+    if not place_blob_file(tmp, name, sha256, media_root):
+        os.remove(tmp)
+
+
+def _starmap(executor, function, arguments):
+    if executor is None:
+        return [function(*args) for args in arguments]
+    arguments = list(arguments)
+    return list(executor.map(function, *zip(*arguments), chunksize=16)) if arguments else []
+
+
+# ---- 导入 ----
+
+def _convert(model, record, fields):
+    values = {}
+    for name in fields:
+        if name not in record:
+            continue
+        value = record[name]
+        field = model._meta.get_field(name)
+        if value == '' and field.null:
+            value = None
+        values[name] = field.to_python(value)
+    return values
+
+
+def import_users(records, source_root, media_root, executor, stats):
+    """导入一批用户，返回实际插入的数量"""
+    records = [_convert(CustomUser, record, USER_FIELDS) for record in records]
+    uuids = [record['uuid'] for record in records if record.get('uuid')]
+    usernames = [record['username'] for record in records]
+    taken_uuids, taken_usernames = set(), set()
+    for user_uuid, username in CustomUser.objects.filter(
+        Q(uuid__in=uuids) | Q(username__in=usernames)
+    ).values_list('uuid', 'username'):
+        taken_uuids.add(user_uuid)
+        taken_usernames.add(username)
+
+    default_avatar = CustomUser._meta.get_field('avatar').get_default()
+    users = []
+    for record in records:
+        if record.get('uuid') in taken_uuids:
+            stats.skipped[EXISTS] += 1
+            continue
+        if record['username'] in taken_usernames:
+            stats.skipped[USERNAME_TAKEN] += 1
+            continue
+        taken_uuids.add(record.get('uuid'))
+        taken_usernames.add(record['username'])
+        if not record.get('password'):
+            record['password'] = make_password(None)
+        record.setdefault('avatar', default_avatar)
+        users.append(CustomUser(**record))
+
+    avatars = [user for user in users if user.avatar.name and user.avatar.name != default_avatar]
+    names = sorted({user.avatar.name for user in avatars if not derivatives_ready(user.avatar.name)})
+    results = _starmap(executor, copy_avatar, [(source_root, media_root, name) for name in names])
+    missing = set()
+    for name, (copied, error) in zip(names, results):
+        stats.files += error != MISSING_FILE
+        stats.bytes += copied
+        if error == MISSING_FILE:
+            missing.add(name)  # 源文件不存在时使用默认头像
+        elif error:
+            stats.skipped['avatar_error'] += 1
+    for user in avatars:
+        if user.avatar.name in missing:
+            user.avatar = default_avatar
+
+    with transaction.atomic():
+        CustomUser.objects.bulk_create(users)
+    return len(users)
+
+
+def import_documents(records, source_root, media_root, executor, stats):
+    """导入一批文档：文件放入内容寻址存储（相同内容只保存一份），返回实际插入的数量"""
+    now = timezone.now()
+    records = [
+        dict(_convert(UserDocument, record, ('uuid', 'title', 'document', 'uploaded_at')), owner=str(record['owner']))
+        for record in records
+    ]
+    owners = {str(owner_uuid): pk for owner_uuid, pk in CustomUser.objects.filter(
+        uuid__in={record['owner'] for record in records}).values_list('uuid', 'pk')}
+    existing = set(UserDocument.objects.filter(
+        uuid__in=[record['uuid'] for record in records if record.get('uuid')]).values_list('uuid', flat=True))
+
+    pending = []
+    for record in records:
+        if record.get('uuid') in existing:
+            stats.skipped[EXISTS] += 1
+        elif record['owner'] not in owners:
+            stats.skipped[MISSING_OWNER] += 1
+        else:
+            existing.add(record.get('uuid'))
+            pending.append(record)
+    staged = _starmap(executor, stage_document, [(source_root, media_root, record['document']) for record in pending])
+
+    documents = []
+    for record, result in zip(pending, staged):
+        if 'error' in result:
+            stats.skipped[result['error']] += 1
+            continue
+        stats.files += 1
+        stats.bytes += result['size']
+        documents.append((record, result))
+    if not documents:
+        return 0
+
+    try:
+        with transaction.atomic():
+            return _insert_documents(documents, owners, media_root, now)
+    except BaseException:
+        for record, result in documents:
+            if os.path.exists(result['tmp']):
+                os.remove(result['tmp'])
+        raise
+
+
+def _insert_documents(documents, owners, media_root, now):
+    """在事务中插入 DocumentBlob 和 UserDocument，文件在事务提交后移动，返回插入的文档数"""
+    shas = {result['sha256'] for record, result in documents}
+    blobs = {blob.sha256: blob for blob in DocumentBlob.objects.filter(sha256__in=shas)}
+    new_blobs = {}
+    for record, result in documents:
+        if result['sha256'] not in blobs and result['sha256'] not in new_blobs:
+            new_blobs[result['sha256']] = DocumentBlob(
+                sha256=result['sha256'], file=result['blob_name'],
+                size=result['size'], content_type=result['content_type'],
+            )
+    DocumentBlob.objects.bulk_create(new_blobs.values())
+    blobs.update((blob.sha256, blob) for blob in DocumentBlob.objects.filter(sha256__in=new_blobs))
+    process_blob.enqueue_many([{'blob_id': blobs[sha256].pk} for sha256 in new_blobs])
+
+    refs = Counter()
+    objects = []
+    for record, result in documents:
+        blob = blobs[result['sha256']]
+        transaction.on_commit(partial(_place_staged, result['tmp'], media_root, blob.file.name, blob.sha256))
+        refs[blob.pk] += 1
+        values = {name: value for name, value in record.items() if name not in ('owner', 'document')}
+        values.setdefault('uploaded_at', now)
+        objects.append(UserDocument(**values, owner_id=owners[record['owner']], blob=blob,
+                                    document=blob.file.name, size=result['size']))
+
+    # uploaded_at 是 auto_now_add，bulk_create 总是写入当前时间，插入后再用一条 UPDATE 改回记录中的时间
+    uploaded_at = {doc.uuid: doc.uploaded_at for doc in objects}
+    UserDocument.objects.bulk_create(objects)
+    UserDocument.objects.filter(uuid__in=uploaded_at).update(uploaded_at=Case(
+        *[When(uuid=doc_uuid, then=Value(value)) for doc_uuid, value in uploaded_at.items()]
+    ))
+    for doc in objects:
+        doc.uploaded_at = uploaded_at[doc.uuid]
+    DocumentBlob.objects.filter(pk__in=refs).update(refcount=F('refcount') + Case(
+        *[When(pk=pk, then=Value(count)) for pk, count in refs.items()]
+    ))
+    # bulk_create 不发送信号，存储用量在这里按所有者累加（导入不检查配额）
+    usage = Counter()
+    for doc in objects:
+        usage[doc.owner_id] += doc.size
+    for owner_id, size in usage.items():
+        add_usage(owner_id, size)
+    return len(objects)
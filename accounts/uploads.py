@@ -0,0 +1,282 @@
+import hashlib
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from django.db import transaction
+from django.db.models import F
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# 文档上传限制，与 DocumentUploadForm 的帮助文本一致
+MAX_DOCUMENT_SIZE = 10 * 1024 * 1024
+ALLOWED_DOCUMENT_TYPES = {
+    'pdf': 'application/pdf',
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'txt': 'text/plain',
+}
+SNIFF_BYTES = 8192  # 判断文件类型只需要看文件开头
+# 文本文件可以使用的编码，GB18030 兼容 GBK 和 GB2312（Windows 中文版记事本的 ANSI 编码）
+TEXT_ENCODINGS = ('utf-8', 'gb18030')
+
+# 内容寻址存储目录（相对 MEDIA_ROOT），上传中的临时文件也放在这里，保证最后只是同一文件系统内的 rename
+BLOB_DIR = 'blobs'
+BLOB_TMP_DIR = os.path.join(BLOB_DIR, 'tmp')
+
+# 上传被拒绝的原因
+TOO_LARGE = 'too_large'
+INVALID_TYPE = 'invalid_type'
+
+
+def sniff_document_type(head):
+    """根据文件开头的内容判断类型，返回 ALLOWED_DOCUMENT_TYPES 的键，不在白名单内返回 None"""
+    if head.startswith(b'%PDF-'):
+        return 'pdf'
+    if head.startswith(b'PK\x03\x04') and (b'[Content_Types].xml' in head or b'word/' in head):
+        return 'docx'
+    if b'\x00' not in head and any(_decodes(head, encoding) for encoding in TEXT_ENCODINGS):
+        return 'txt'
+    return None
+
+
+def _decodes(head, encoding):
+    try:
+        head.decode(encoding)
+    except UnicodeDecodeError as exc:
+        # 开头截断在多字节字符中间也算合法文本（UTF-8 和 GB18030 的字符最长都是 4 个字节）
+        return exc.start >= len(head) - 3
+    return True
+
+
+def blob_name(sha256, document_type):
+    """内容寻址的存储路径，如 blobs/ab/cd/abcd....pdf"""
+    return '/'.join([BLOB_DIR, sha256[:2], sha256[2:4], '%s.%s' % (sha256, document_type)])
+
+
+class UploadInspector:
+    """一次遍历上传数据，同时计算 sha256、统计大小并嗅探类型"""
+
+    def __init__(self, file_name, max_size=MAX_DOCUMENT_SIZE):
+        self.file_name = file_name
+        self.max_size = max_size
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.head = b''
+
+    def feed(self, data):
+        self.size += len(data)
+        if self.size > self.max_size:
+            return False
+        self.sha256.update(data)
+        if len(self.head) < SNIFF_BYTES:
+            self.head += data[:SNIFF_BYTES - len(self.head)]
+        return True
+
+    @property
+    def too_large(self):
+        return self.size > self.max_size
+
+    def document_type(self):
+        """嗅探到的类型，且必须与文件扩展名一致"""
+        document_type = sniff_document_type(self.head)
+        extension = os.path.splitext(self.file_name)[1].lower().lstrip('.')
+        if document_type is None or document_type != extension:
+            return None
+        return document_type
+
+    def error(self):
+        if self.too_large:
+            return TOO_LARGE
+        if self.document_type() is None:
+            return INVALID_TYPE
+        return None
+
+
+class HashedUploadedFile(UploadedFile):
+    """
+    已经校验过并计算好 sha256 的上传文件，数据在 BLOB_TMP_DIR 的临时文件里
+    error 不为 None 时表示上传被拒绝（过大或类型不符），此时没有保存任何数据
+    """
+
+    def __init__(self, file, name, content_type, size, charset, content_type_extra=None,
+                 sha256=None, document_type=None, error=None):
+        super().__init__(file, name, content_type, size, charset, content_type_extra)
+        self.sha256 = sha256
+        self.document_type = document_type
+        self.error = error
+
+    @property
+    def blob_name(self):
+        return blob_name(self.sha256, self.document_type)
+
+    def temporary_file_path(self):
+        return self.file.name
+
+    def close(self):
+        try:
+            return self.file.close()
+        except FileNotFoundError:
+            # 临时文件已被移动到内容寻址路径
+            pass
+
+
+class ContentAddressedUploadHandler(FileUploadHandler):
+    """
+    流式上传处理器：边接收边计算 sha256、嗅探类型并检查 10MB 限制，
+    数据直接写入 MEDIA_ROOT 下的临时文件，保存时只需 rename 到内容寻址路径，不再复制
+    超过限制或类型不符时停止写盘，由 DocumentUploadForm 报告错误
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.inspector = UploadInspector(self.file_name)
+        self.file = _new_tmp_file()
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.inspector.feed(raw_data):
+            self.file.write(raw_data)
+        elif not self.file.closed:
+            self.file.close()  # 超出大小限制，丢弃已写入的数据
+        return None  # 不再交给后续的 handler
+
+    def file_complete(self, file_size):
+        return _hashed_file(self.file, self.inspector, self.content_type, self.charset, self.content_type_extra)
+
+
+def _new_tmp_file():
+    tmp_dir = os.path.join(settings.MEDIA_ROOT, BLOB_TMP_DIR)
+    os.makedirs(tmp_dir, exist_ok=True)
+    return tempfile.NamedTemporaryFile(suffix='.upload', dir=tmp_dir)
+
+
+def _hashed_file(file, inspector, content_type, charset, content_type_extra=None):
+    """用写完的临时文件和检查结果构造 HashedUploadedFile；被拒绝时丢弃已写入的数据"""
+    error = inspector.error()
+    if error:
+        if not file.closed:
+            file.close()
+        file = tempfile.TemporaryFile()
+    else:
+        file.flush()
+        file.seek(0)
+    return HashedUploadedFile(
+        file=file,
+        name=inspector.file_name,
+        content_type=ALLOWED_DOCUMENT_TYPES.get(inspector.document_type(), content_type),
+        size=inspector.size,
+        charset=charset,
+        content_type_extra=content_type_extra,
+        sha256=None if error else inspector.sha256.hexdigest(),
+        document_type=inspector.document_type(),
+        error=error,
+    )
+
+
+def hash_upload(upload):
+    """
+    没有经过 ContentAddressedUploadHandler 的上传（Django 默认的上传处理器、测试等）：
+    复制到 BLOB_TMP_DIR 的临时文件，同时做同样的检查，返回与上传处理器相同的 HashedUploadedFile
+    """
+    inspector = UploadInspector(upload.name)
+    file = _new_tmp_file()
+    for chunk in upload.chunks():
+        if not inspector.feed(chunk):
+            break
+        file.write(chunk)
+    return _hashed_file(file, inspector, upload.content_type, upload.charset, upload.content_type_extra)
+
+
+_thread_lock = threading.Lock()
+
+
+@contextmanager
+def blob_lock(sha256):
+    """
+    放入和删除同一内容的文件时互斥（进程之间用 BLOB_LOCK_DIR 下的 flock 锁文件，按 sha256 前两位分成 256 个）
+    没有 fcntl 的平台只在当前进程内互斥
+    """
+    if fcntl is None:
+        with _thread_lock:
+            yield
+        return
+    os.makedirs(settings.BLOB_LOCK_DIR, exist_ok=True)
+    fd = os.open(os.path.join(settings.BLOB_LOCK_DIR, '%s.lock' % sha256[:2]), os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)  # 关闭文件即释放 flock
+
+
+def place_blob_file(source, name, sha256, media_root=None):
+    """
+    把 source 移动到内容寻址路径 name，返回是否移动；已经有这个文件（相同内容）时不移动，由调用方删除 source
+    在事务提交后调用：事务回滚时不会留下没有 DocumentBlob 的文件
+    """
+    path = os.path.join(media_root or settings.MEDIA_ROOT, name)
+    with blob_lock(sha256):
+        if os.path.exists(path):
+            return False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(source, path)
+        os.chmod(path, settings.FILE_UPLOAD_PERMISSIONS or 0o644)
+        return True
+
+
+def store_blob(upload):
+    """
+    把校验过的上传文件放入内容寻址存储并增加引用计数，返回 DocumentBlob
+    相同内容只保存一份：目标文件已存在时直接丢弃临时文件
+    需要在事务中调用，文件在事务提交后才移动（临时文件在请求结束前一直存在）
+    """
+    from .models import DocumentBlob
+
+    blob, created = DocumentBlob.objects.get_or_create(
+        sha256=upload.sha256,
+        defaults={
+            'file': upload.blob_name,
+            'size': upload.size,
+            'content_type': upload.content_type,
+        },
+    )
+    DocumentBlob.objects.filter(pk=blob.pk).update(refcount=F('refcount') + 1)
+    source, name, sha256 = upload.temporary_file_path(), blob.file.name, blob.sha256
+
+    def place():
+        place_blob_file(source, name, sha256)
+        upload.close()  # 没有移动时删除临时文件
+
+    transaction.on_commit(place)
+    return blob
+
+
+def release_blob(blob_id):
+    """减少引用计数，最后一个引用被删除时删除数据和文件"""
+    from .models import DocumentBlob
+
+    with transaction.atomic():
+        DocumentBlob.objects.filter(pk=blob_id).update(refcount=F('refcount') - 1)
+        blob = DocumentBlob.objects.filter(pk=blob_id, refcount__lte=0).first()
+        if blob is None:
+            return
+        blob.delete()
+        transaction.on_commit(lambda: delete_blob_file(blob.sha256, blob.file.name))
+
+
+def delete_blob_file(sha256, name):
+    """
+    删除不再有 DocumentBlob 的文件。提交之后，同样内容的新上传可能已经重新创建了 DocumentBlob
+    并准备复用这个文件（place_blob_file），所以持有同一个锁再检查一次
+    """
+    from .models import DocumentBlob
+
+    with blob_lock(sha256):
+        if not DocumentBlob.objects.filter(sha256=sha256).exists():
+            DocumentBlob.file.field.storage.delete(name)
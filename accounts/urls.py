@@ -1,14 +1,25 @@
+from django.conf import settings
 from django.urls import path
-from . import views
 from django.contrib.auth.views import LogoutView
-from .views import CustomLoginView
 
-from .views import upload_document
+from yourapp.middleware import cache_anonymous_page
+
+if settings.ASYNC_VIEWS:
+    from . import async_views as views  # ASGI部署使用异步视图，见 myproject/settings/asgi.py
+else:
+    from . import views
+
+# 匿名用户可以访问的页面，LOCALE_URLS 开启时由 myproject/urls.py 放到语言前缀下（/zh-hans/accounts/login/）
+public_urlpatterns = [
+    path('register/', cache_anonymous_page(views.register), name='register'),
+    path('login/', cache_anonymous_page(views.CustomLoginView.as_view()), name='login'),
+]
 
 urlpatterns = [
-    path('register/', views.register, name='register'),
     path('profile/', views.profile, name='profile'),
-    path('login/', CustomLoginView.as_view(), name='login'),
     path('logout/', LogoutView.as_view(template_name='registration/logged_out.html', next_page='home'), name='logout'),
-    path('upload/', upload_document, name='upload_document'),
+    path('upload/', views.upload_document, name='upload_document'),
+    path('documents/', views.document_list, name='document_list'),
+    path('documents/search/', views.search_documents, name='search_documents'),
+    path('documents/<uuid:uuid>/download/', views.download_document, name='download_document'),
 ]
\ No newline at end of file
@@ -1,13 +1,30 @@
-from django.shortcuts import render, redirect
+import logging
+import os
+
+from django.shortcuts import get_object_or_404, render, redirect
 from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.utils.translation import gettext_lazy as _  #翻译相关
 from .forms import RegisterForm, ProfileForm
 from django.contrib.auth.views import LoginView
+from django.http import JsonResponse
+from django.template.defaultfilters import date as date_filter
+from django.urls import reverse
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+
+from yourapp.middleware import switchable
 
 from .models import UserDocument
 from .forms import DocumentUploadForm
+from .downloads import serve_file
+from .pagination import DOCUMENTS_PER_PAGE, paginate_documents
+from .search import search_user_documents
+from .uploads import ContentAddressedUploadHandler
+
+logger = logging.getLogger(__name__)
+
+MAX_SEARCH_LENGTH = 100
 
 
 class CustomLoginView(LoginView):
@@ -21,21 +38,21 @@ class CustomLoginView(LoginView):
 def register(request):
     if request.method == 'POST':
         form = RegisterForm(request.POST, request.FILES)
-        print(_("Form data:"), request.POST)  # 日志标记
         if form.is_valid():
-            print(_("Form validation passed"))
             user = form.save()
             login(request, user)
             messages.success(request, _("Registration successful!"))  # 注册成功提示
-            print(_("User created and logged in"))
+            logger.info("User %s registered and logged in", user.username)
             return redirect('profile')
         else:
-            print(_("Form errors:"), form.errors)
+            # 不记录 request.POST，其中有明文密码
+            logger.info("Registration form errors: %s", form.errors.as_json())
             messages.error(request, _("Please correct the errors below")) 
     else:
         form = RegisterForm()
     return render(request, 'accounts/register.html', {'form': form})
 
+@switchable
 @login_required
 def profile(request):
     if request.method == 'POST':
@@ -49,21 +66,70 @@ def profile(request):
     else:
         form = ProfileForm(instance=request.user)
     
-    documents = UserDocument.objects.filter(owner=request.user).order_by('-uploaded_at')
+    # 只渲染第一页，后续页面由模板通过 document_list 接口按游标加载
+    documents, next_cursor = paginate_documents(UserDocument.objects.filter(owner=request.user))
     return render(request, 'accounts/profile.html', {
         'user': request.user,
         'documents': documents,
+        'next_cursor': next_cursor,
         'form': form,
     })
 
 @login_required
+def document_list(request):
+    """个人主页文档列表的JSON接口，?cursor= 为上一页返回的 next"""
+    try:
+        documents, next_cursor = paginate_documents(
+            UserDocument.objects.filter(owner=request.user),
+            cursor=request.GET.get('cursor'),
+        )
+    except ValueError:
+        return JsonResponse({'error': _("Invalid cursor")}, status=400)
+    return JsonResponse({
+        'documents': [document_json(doc) for doc in documents],
+        'next': next_cursor,
+    })
+
+def document_json(doc):
+    return {
+        'uuid': str(doc.uuid),
+        'title': doc.title,
+        'url': reverse('download_document', args=[doc.uuid]),
+        'uploaded_at': date_filter(doc.uploaded_at, 'Y-m-d'),  # 与模板中的日期格式一致
+    }
+
+@login_required
+def search_documents(request):
+    """个人主页文档搜索的JSON接口，?q= 为搜索词，?page= 为页码（从1开始），结果按相关度排序"""
+    query = request.GET.get('q', '').strip()[:MAX_SEARCH_LENGTH]
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+    if not query:
+        return JsonResponse({'documents': [], 'next': None})
+    documents, has_next = search_user_documents(
+        UserDocument.objects.all(), request.user, query,
+        limit=DOCUMENTS_PER_PAGE, offset=(page - 1) * DOCUMENTS_PER_PAGE,
+    )
+    return JsonResponse({
+        'documents': [document_json(doc) for doc in documents],
+        'next': page + 1 if has_next else None,
+    })
+
+@login_required
+@csrf_exempt
 def upload_document(request):
+    # 必须在读取 request.POST/FILES 之前替换上传处理器，因此先 csrf_exempt 再在内部做 CSRF 校验
+    request.upload_handlers = [ContentAddressedUploadHandler(request)]
+    return _upload_document(request)
+
+@csrf_protect
+def _upload_document(request):
     if request.method == 'POST':
         form = DocumentUploadForm(request.POST, request.FILES)
-        if form.is_valid():
-            doc = form.save(commit=False)
-            doc.owner = request.user
-            doc.save()
+        # 超出存储配额时 save_document 返回 None，错误显示在表单上
+        if form.is_valid() and form.save_document(request.user):
             messages.success(request, _("Document uploaded successfully"))  # 上传成功提示
             return redirect('profile')
         else:
@@ -72,6 +138,15 @@ def upload_document(request):
         form = DocumentUploadForm()
     return render(request, 'accounts/upload.html', {'form': form})
 
+@login_required
+def download_document(request, uuid):
+    """按文档UUID下载，只有上传者本人可以访问"""
+    doc = get_object_or_404(UserDocument, uuid=uuid, owner=request.user)
+    extension = os.path.splitext(doc.document.name)[1]
+    # 内容寻址存储的文件内容不会变化，直接用 sha256 作为 ETag
+    etag = '"%s"' % doc.blob.sha256 if doc.blob_id else None
+    return serve_file(request, doc.document.path, doc.title + extension, etag=etag)
+
 def test_controls(request):
     messages.info(request, _("This is a test page for UI controls"))  # 测试页说明
     return render(request, 'accounts/test_controls.html')
@@ -0,0 +1,13 @@
+# myproject/settings/asgi.py
+from .prod import *  # 导入生产环境配置
+
+# ASGI（uvicorn）部署专用配置
+# 启动：uvicorn myproject.asgi:application --uds /path/to/your/project/myproject.sock --workers 4 --proxy-headers
+ASYNC_VIEWS = True
+
+# 异步视图等待哈希名额时不占用线程（accounts.hashing.arun），可以让一部分登录请求排队
+PASSWORD_HASHING_BACKLOG = 16
+
+# 异步模式下不应使用持久连接，每个请求结束时关闭（SQLite建立连接的开销很小）
+for database in DATABASES.values():
+    database['CONN_MAX_AGE'] = 0
@@ -28,6 +28,7 @@ BASE_DIR = Path(__file__).resolve().parent.parent.parent
 # SECURITY WARNING: keep the secret key used in production secret!
 # 替换原有的SECRET_KEY
 SECRET_KEY = os.getenv('SECRET_KEY')  # 从.env读取
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')  # Prometheus 抓取 /metrics/ 用的令牌，从.env读取
 
 # SECURITY WARNING: don't run with debug turned on in production!
 
@@ -49,13 +50,17 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'yourapp.middleware.MetricsMiddleware', #请求指标（/metrics/），放在最前面以统计整个请求
     'django.middleware.security.SecurityMiddleware',
+    'yourapp.middleware.PublicCacheMiddleware', #LOCALE_URLS开启时匿名访问的公开页面带Cache-Control: public，必须在SessionMiddleware之前
     'django.contrib.sessions.middleware.SessionMiddleware',
-    'django.middleware.locale.LocaleMiddleware', #新增翻译相关，位置很重要，必须在SessionMiddleware之后
+    'yourapp.middleware.LocaleMiddleware', #新增翻译相关，位置很重要，必须在SessionMiddleware之后（缓存语言协商结果，行为与django.middleware.locale.LocaleMiddleware相同）
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'accounts.middleware.CachedAuthenticationMiddleware', #代替AuthenticationMiddleware，已登录用户从进程内缓存中取，每个请求只按主键核对密码、状态和登录时间三列
+    'yourapp.middleware.PageCacheMiddleware', #匿名用户整页缓存，必须在LocaleMiddleware和AuthenticationMiddleware之后
     'django.contrib.messages.middleware.MessageMiddleware',
+    'accounts.middleware.PasswordHashingBusyMiddleware', #密码哈希线程池已满时登录/注册返回503
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -63,7 +68,7 @@ ROOT_URLCONF = 'myproject.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'yourapp.template_backend.TimedDjangoTemplates',  # 与DjangoTemplates相同，额外统计渲染时间
         'DIRS': [
             os.path.join(BASE_DIR, 'templates'),
         ],
@@ -73,12 +78,20 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'yourapp.context_processors.public_page', #可被代理缓存的页面不输出CSRF token
             ],
         },
     },
 ]
 
 WSGI_APPLICATION = 'myproject.wsgi.application'
+ASGI_APPLICATION = 'myproject.asgi.application'
+
+# 加载 wsgi/asgi 应用时预热模板、翻译目录、URL 解析器和表单（yourapp/warmup.py），生产环境开启
+WARMUP = False
+
+# 是否使用异步视图（accounts/async_views.py、yourapp/async_views.py），ASGI部署时在 settings/asgi.py 中开启
+ASYNC_VIEWS = False
 
 
 # Database
@@ -86,6 +99,46 @@ WSGI_APPLICATION = 'myproject.wsgi.application'
 
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # 整页缓存：进程内的有界LRU
+    'pages_local': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'pages',
+        'TIMEOUT': 600,
+        'OPTIONS': {'MAX_ENTRIES': 500},
+    },
+    # 整页缓存：所有worker共享的磁盘层
+    'pages': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'pages'),
+        'TIMEOUT': 600,
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+    # 已登录用户的 CustomUser 对象：进程内的有界LRU，保存/删除时失效
+    # 每次使用前与数据库核对密码、is_active 和 last_login（accounts.middleware.VERSION_FIELDS），
+    # 其他worker中改密码、停用立即生效；资料等其他列的修改最多在 TIMEOUT 秒后显示
+    'users': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'users',
+        'TIMEOUT': 60,
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    },
+    # 模板片段缓存（{% cachefragment %}）：进程内的有界LRU，翻译版本变化后自动换用新的键
+    'fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'fragments',
+        'TIMEOUT': 600,
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -104,6 +157,19 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# 同时进行的密码哈希数量有上限（accounts/hashing.py），与 Django 默认的 PBKDF2 格式相同，已有密码不受影响
+PASSWORD_HASHERS = [
+    'accounts.hashing.PooledPBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+# 以下限制由本机所有 worker 进程共享（PASSWORD_HASHING_LOCK_DIR 中的锁文件）
+PASSWORD_HASHING_WORKERS = max(1, (os.cpu_count() or 1) // 2)   # 同时计算的哈希数，默认为CPU核数的一半，其余留给其他请求
+PASSWORD_HASHING_BACKLOG = 0   # 排队等待的哈希数上限，超出时登录/注册立即返回503；同步worker排队时也占着worker，所以为0
+PASSWORD_HASHING_LOCK_DIR = os.path.join(BASE_DIR, 'cache', 'hashing')
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
@@ -115,6 +181,20 @@ LANGUAGES = [
     ('zh-hans', _('Simplified Chinese')),
 ]
 LOCALE_PATHS = [os.path.join(BASE_DIR, 'locale')]   #翻译文件存放路径
+# 公开页面（首页、关于、登录、注册）放到语言前缀下（/zh-hans/、/en/），语言由URL决定而不是cookie，
+# 匿名访问的响应带 Cache-Control: public，可以由 nginx 按URL缓存（见README中的Nginx配置）；默认关闭
+LOCALE_URLS = False
+LOGIN_URL = 'login'   # 按URL名称解析，LOCALE_URLS开启时跳转到当前语言前缀下的登录页
+PUBLIC_CACHE_SECONDS = 300   # 公开页面在代理中的缓存时间
+# 预编译的翻译索引（python manage.py compiletranslationindex 生成），存在时各worker通过mmap共享，不存在则按Django默认方式加载.mo
+TRANSLATION_INDEX = os.path.join(BASE_DIR, 'locale', 'catalogs.idx')
+# 预编译的前端翻译目录（python manage.py compilejscatalogs 生成），文件名带内容哈希，作为静态文件长期缓存
+JS_CATALOG_DIR = os.path.join(BASE_DIR, 'static', 'jsi18n')
+
+# 各worker的请求指标文件（yourapp/metrics.py），/metrics/ 汇总后输出
+METRICS_DIR = os.path.join(BASE_DIR, 'cache', 'metrics')
+# extractmessages/buildmessages 的内容哈希缓存（yourapp/i18n.py），只处理变化的源文件和 .po
+I18N_CACHE_DIR = os.path.join(BASE_DIR, 'cache', 'i18n')
 
 TIME_ZONE = 'UTC'
 
@@ -140,9 +220,29 @@ AUTH_USER_MODEL = 'accounts.CustomUser'
 #媒体文件配置
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# 文档下载交给反向代理发送：'X-Accel-Redirect'（nginx）、'X-Sendfile'（apache mod_xsendfile），None 表示由 Django 发送
+SENDFILE_BACKEND = None
+# 同一内容的文档文件放入和删除时互斥用的锁文件目录（accounts.uploads.blob_lock），所有 worker 共享
+BLOB_LOCK_DIR = os.path.join(BASE_DIR, 'cache', 'blobs')
+# 交给nginx发送时使用的internal location前缀（对应MEDIA_ROOT），见README中的Nginx配置
+SENDFILE_ACCEL_PREFIX = '/protected-media/'
+# 每个用户的文档总大小上限（字节），None 表示不限制（默认）；需要时在 prod.py 中设置，如 100 * 1024 * 1024。用量见 accounts.storage
+DOCUMENT_STORAGE_QUOTA = None
 
 # 添加会话支持（如果尚未配置）
 SESSION_ENGINE = "django.contrib.sessions.backends.signed_cookies"
 SESSION_COOKIE_AGE = 365 * 24 * 60 * 60
 
-TARGET_URL = '' #django项目的挂载点
\ No newline at end of file
+TARGET_URL = '' #django项目的挂载点
+# 项目自己的日志（注册、预热报告等）输出到标准错误，由 gunicorn/systemd 收集
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'accounts': {'handlers': ['console'], 'level': 'INFO'},
+        'yourapp': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
@@ -6,17 +6,44 @@ DEBUG = False
 ALLOWED_HOSTS = ['47.93.249.56','localhost','127.0.0.1']  # 你的VPS IP或域名
 
 #生产环境的数据库
+#使用开启WAL和调优PRAGMA的SQLite后端（yourapp/db/sqlite3），每个worker保持持久连接，读写分离
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'yourapp.db.sqlite3',
         'NAME': os.path.join(BASE_DIR / 'db.sqlite3'),
-	'OPTIONS':{
-	    'timeout':30,  #默认五秒延长避免锁冲突
-	}
-    }
+        'CONN_MAX_AGE': None,  # 持久连接，不再每个请求重新连接
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': 30,  #等待写锁的最长时间
+            'transaction_mode': 'IMMEDIATE',  # 事务开始时就获取写锁，避免读锁升级为写锁时的死锁
+        },
+    },
+    # 只读连接，指向同一个数据库文件
+    'read': {
+        'ENGINE': 'yourapp.db.sqlite3',
+        'NAME': os.path.join(BASE_DIR / 'db.sqlite3'),
+        'CONN_MAX_AGE': None,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': 30,
+            'read_only': True,
+        },
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+DATABASE_ROUTERS = ['yourapp.db.routers.ReadWriteRouter']
+
+# static/ 是静态文件源目录，collectstatic 输出到单独的 staticfiles/（文件名带内容哈希并预压缩，见 yourapp/storage.py）
+STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')  # 生产环境收集静态文件用 
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'yourapp.storage.CompressedManifestStaticFilesStorage'},
 }
 
-STATIC_ROOT = os.path.join(BASE_DIR, 'static')  # 生产环境收集静态文件用 
+SENDFILE_BACKEND = 'X-Accel-Redirect'  # 文档下载由 nginx 发送，需要 README 中的 /protected-media/ location
+
+WARMUP = True  # worker 接收请求之前预热，启动日志中有各阶段预热前后的耗时
 
 USE_X_FORWARDED_HOST = True  # 如果使用代理
 
@@ -14,22 +14,56 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
+
 from django.contrib import admin
-from django.urls import path, include
-from yourapp import views
+from django.conf.urls.i18n import i18n_patterns
+from django.urls import path, include, re_path
+from django.views.i18n import JavaScriptCatalog
 
 from django.conf import settings
+
+if settings.ASYNC_VIEWS:
+    from yourapp import async_views as views  # ASGI部署使用异步视图，见 myproject/settings/asgi.py
+else:
+    from yourapp import views
 from django.conf.urls.static import static
+from yourapp.static import serve_static
+from yourapp.views import csrf_cookie_view, metrics_view, set_language, switch_language
+from accounts.urls import public_urlpatterns as account_pages
 
-urlpatterns = [
-    path('admin/', admin.site.urls),
+# 匿名用户可以访问的公开页面
+public_urlpatterns = [
     path('', views.home_view, name='home'),
     path('about/', views.about_view, name='about'),
+    path('accounts/', include(account_pages)),
+]
+
+urlpatterns = [
+    path('admin/', admin.site.urls),
+    path('metrics/', metrics_view, name='metrics'),  # Prometheus 指标，仅管理员或持有 METRICS_TOKEN
     path('accounts/', include('accounts.urls')),
-    path(settings.TARGET_URL + '/i18n/',include('django.conf.urls.i18n'))
+    path(settings.TARGET_URL + '/i18n/', include([
+        path('setlang/', set_language, name='set_language'),
+        path('switch/', switch_language, name='switch_language'),  # 不跳转的语言切换，返回新语言下的页面片段
+    ])),
+    path('csrf/', csrf_cookie_view, name='csrf_cookie'),  # 可被代理缓存的页面中没有 CSRF token，由 static/js/csrf.js 获取
+    # 前端翻译目录的动态版本，只在没有运行 compilejscatalogs 时使用
+    path('jsi18n/', JavaScriptCatalog.as_view(domain='django'), name='javascript-catalog'),
 ]
 
+if settings.LOCALE_URLS:
+    # 语言由 URL 前缀决定（/zh-hans/、/en/），匿名访问的响应可以由 nginx 按 URL 缓存，见 PublicCacheMiddleware
+    urlpatterns += i18n_patterns(*public_urlpatterns)
+else:
+    urlpatterns += public_urlpatterns
+
 # 仅开发环境添加媒体文件服务
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
\ No newline at end of file
+    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
+else:
+    # 静态文件通常由 nginx 直接发送，这里只是没有配置 nginx 时的兜底（发送预压缩文件并设置缓存头）
+    urlpatterns += [
+        re_path(r'^%s(?P<path>.*)$' % re.escape(settings.STATIC_URL.lstrip('/')), serve_static),
+    ]
\ No newline at end of file
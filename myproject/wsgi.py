@@ -14,3 +14,11 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myproject.settings.prod')
 
 application = get_wsgi_application()
+
+# 在接收请求之前预热（gunicorn --preload 时在父进程中执行，worker 共享结果）
+from django.conf import settings  # noqa: E402
+
+if settings.WARMUP:
+    from yourapp.warmup import warm_up
+
+    warm_up()
@@ -0,0 +1,45 @@
+// 可被代理缓存的公开页面中没有 CSRF token（见 yourapp.middleware.PublicCacheMiddleware）：
+// 页面加载后从 CSRF cookie 读取，没有 cookie 时先请求一次 data-url 设置 cookie，再填入页面中所有的 POST 表单
+(function () {
+    var script = document.currentScript;
+    var url = script.dataset.url;
+    var name = script.dataset.cookie;
+
+    function readCookie() {
+        var match = document.cookie.match(new RegExp('(?:^|; )' + name + '=([^;]*)'));
+        return match ? decodeURIComponent(match[1]) : null;
+    }
+
+    function fill(token) {
+        document.querySelectorAll('form').forEach(function (form) {
+            if (form.method.toLowerCase() !== 'post' || form.querySelector('input[name="csrfmiddlewaretoken"]')) {
+                return;
+            }
+            var input = document.createElement('input');
+            input.type = 'hidden';
+            input.name = 'csrfmiddlewaretoken';
+            input.value = token;
+            form.appendChild(input);
+        });
+    }
+
+    function run() {
+        var token = readCookie();
+        if (token) {
+            fill(token);
+            return;
+        }
+        fetch(url, {credentials: 'same-origin'}).then(function () {
+            token = readCookie();
+            if (token) {
+                fill(token);
+            }
+        });
+    }
+
+    if (document.readyState === 'loading') {
+        document.addEventListener('DOMContentLoaded', run);
+    } else {
+        run();
+    }
+})();
@@ -0,0 +1,78 @@
+// 不跳转的语言切换：语言下拉框变化时不提交表单（set_language 的 302 + 整页渲染），
+// 而是把表单 POST 到 data-switch-url（yourapp.views.switch_language），用返回的新语言片段替换页面中对应的 data-fragment
+// （页眉和页面主体），同时换成新语言的标题和前端翻译目录；地址带语言前缀时同时改为新前缀下的地址。
+// 页面主体不能单独渲染时（返回 reload）重新打开页面，请求失败时退回普通的表单提交
+(function () {
+    function loadCatalog(src) {
+        // 翻译目录是合并进 django.catalog 的，先清空，新语言中没有的条目才不会留下旧语言的译文
+        return new Promise(function (resolve, reject) {
+            var script = document.createElement('script');
+            script.src = src;
+            script.onload = resolve;
+            script.onerror = reject;
+            window.django = window.django || {};
+            window.django.catalog = {};
+            document.head.appendChild(script);
+        });
+    }
+
+    function runScripts(container) {
+        // innerHTML 插入的 <script> 不会执行，换成新建的 script 元素
+        container.querySelectorAll('script').forEach(function (old) {
+            var script = document.createElement('script');
+            Array.prototype.forEach.call(old.attributes, function (attribute) {
+                script.setAttribute(attribute.name, attribute.value);
+            });
+            script.text = old.text;
+            old.parentNode.replaceChild(script, old);
+        });
+    }
+
+    function swap(data) {
+        if (data.reload) {
+            location.assign(data.url);
+            return;
+        }
+        return loadCatalog(data.catalog).then(function () {
+            Object.keys(data.fragments).forEach(function (name) {
+                var container = document.querySelector('[data-fragment="' + name + '"]');
+                if (container) {
+                    container.innerHTML = data.fragments[name];
+                    runScripts(container);
+                }
+            });
+            document.documentElement.lang = data.language;
+            if (data.title) {
+                document.title = data.title;
+            }
+            if (data.url !== location.pathname + location.search) {
+                history.replaceState(history.state, '', data.url);
+            }
+        });
+    }
+
+    // 在捕获阶段处理，阻止事件到达下拉框上的 onchange（form.submit()）
+    document.addEventListener('change', function (event) {
+        var select = event.target;
+        var form = select.form;
+        if (select.name !== 'language' || !form || !form.dataset.switchUrl || !window.fetch) {
+            return;
+        }
+        event.stopPropagation();
+        var body = new FormData(form);
+        select.disabled = true;  // 禁用的控件不会出现在 FormData 中，所以先取表单数据
+        fetch(form.dataset.switchUrl, {
+            method: 'POST',
+            body: body,
+            credentials: 'same-origin',
+        }).then(function (response) {
+            if (!response.ok) {
+                throw new Error(response.status);
+            }
+            return response.json();
+        }).then(swap).catch(function () {
+            select.disabled = false;
+            form.submit();
+        });
+    }, true);
+})();
@@ -0,0 +1,11 @@
+from django.contrib import admin
+
+from .models import Job
+
+
+#后台任务队列（只读查看状态、耗时和错误）
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'status', 'attempts', 'run_after', 'duration', 'finished_at')
+    list_filter = ('status', 'name')
+    readonly_fields = [field.name for field in Job._meta.fields]
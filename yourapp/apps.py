@@ -0,0 +1,14 @@
+from django.apps import AppConfig
+
+
+class YourappConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'yourapp'
+
+    def ready(self):
+        # 使用部署时预编译的翻译索引（若存在），各worker共享同一份mmap
+        from .translation import install
+        install()
+        # 请求指标的 DB 查询和翻译查找钩子
+        from . import metrics
+        metrics.install()
@@ -0,0 +1,15 @@
+from django.shortcuts import render
+
+from accounts.async_views import load_user
+
+from .middleware import cache_anonymous_page
+
+@cache_anonymous_page
+async def about_view(request):
+    await load_user(request)
+    return render(request, 'pages/about.html')
+
+@cache_anonymous_page
+async def home_view(request):
+    await load_user(request)
+    return render(request, 'pages/home.html')
\ No newline at end of file
@@ -0,0 +1,11 @@
+from django.conf import settings
+
+
+def public_page(request):
+    """
+    可被代理缓存的页面（PublicCacheMiddleware 标记的请求）中不输出 CSRF token：
+    {% csrf_token %} 不渲染任何内容，base.html 引入 static/js/csrf.js 在页面加载后从 cookie 填入
+    """
+    if getattr(request, 'public_cacheable', False):
+        return {'csrf_token': 'NOTPROVIDED', 'public_page': True, 'csrf_cookie_name': settings.CSRF_COOKIE_NAME}
+    return {}
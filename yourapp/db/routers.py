@@ -0,0 +1,25 @@
+from django.db import DEFAULT_DB_ALIAS, connections
+
+READ_DB_ALIAS = 'read'
+
+
+class ReadWriteRouter:
+    """
+    读写分离：只读查询走 'read' 连接（同一个 SQLite 文件，query_only），写入走 'default'
+    'default' 处于事务中时读也走 'default'，保证事务内能读到自己尚未提交的修改
+    """
+
+    def db_for_read(self, model, **hints):
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return READ_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # 两个别名指向同一个数据库
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
@@ -0,0 +1,47 @@
+"""
+生产环境使用的 SQLite 数据库后端
+
+在 Django 自带 sqlite3 后端的基础上，每个新连接都会：
+* 开启 WAL 日志模式，读操作不再阻塞写操作，写操作也不阻塞读操作
+* 应用调优过的 PRAGMA（synchronous/mmap_size/cache_size/temp_store）
+* OPTIONS 中 read_only=True 时设置 query_only，作为读写分离中的只读连接
+
+OPTIONS 中可以用 pragmas 覆盖默认值，例如 {'pragmas': {'cache_size': -64000}}
+"""
+from django.db.backends.sqlite3 import base
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',  # WAL 模式下 NORMAL 不会损坏数据库，只可能在断电时丢失最后的事务
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -20000,  # 负数单位为 KiB，约 20MB
+    'temp_store': 'MEMORY',
+}
+
+
+def apply_pragmas(conn, pragmas, read_only=False):
+    """对一个 sqlite3 连接应用 PRAGMA，benchmark 命令也使用这个函数"""
+    for name, value in pragmas.items():
+        if read_only and name == 'journal_mode':
+            continue  # 只读连接不能修改日志模式，WAL 是数据库文件级别的设置，写连接设置一次即可
+        conn.execute('PRAGMA %s = %s' % (name, value))
+    if read_only:
+        conn.execute('PRAGMA query_only = ON')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_connection_params(self):
+        options = self.settings_dict['OPTIONS']
+        # 这两个选项不是 sqlite3.connect() 的参数，先取出来
+        self.pragmas = {**DEFAULT_PRAGMAS, **options.get('pragmas', {})}
+        self.read_only = options.get('read_only', False)
+        kwargs = super().get_connection_params()
+        kwargs.pop('pragmas', None)
+        kwargs.pop('read_only', None)
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        apply_pragmas(conn, self.pragmas, read_only=self.read_only)
+        return conn
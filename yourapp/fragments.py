@@ -0,0 +1,56 @@
+"""
+模板片段缓存（{% cachefragment %}，见 yourapp/templatetags/fragments.py）
+
+已登录用户的页面不能整页缓存，但页眉导航、退出按钮、语言选择这些每个页面都相同的部分可以缓存：
+缓存键是翻译版本 + 片段名 + 当前语言 + 登录状态 + 请求路径，片段渲染时把 CSRF token 和
+request.get_full_path 换成占位符，命中缓存后再换成当前请求的值，缓存的内容不包含任何用户或请求特有的数据。
+片段中不能使用其他随用户变化的变量（用户名、头像等）。
+"""
+import hashlib
+
+from django.core.cache import caches
+from django.utils.html import escape
+from django.utils.translation import get_language
+
+from .translation import catalog_version
+
+CSRF_PLACEHOLDER = '__FRAGMENT_CSRF_TOKEN__'
+FULL_PATH_PLACEHOLDER = '__FRAGMENT_FULL_PATH__'
+
+
+class FragmentRequest:
+    """渲染缓存片段时代替 request：get_full_path() 返回占位符，其余属性与原来的 request 相同"""
+
+    def __init__(self, request):
+        self._request = request
+
+    def __getattr__(self, name):
+        return getattr(self._request, name)
+
+    def get_full_path(self, force_append_slash=False):
+        return FULL_PATH_PLACEHOLDER
+
+
+def fragment_cache_key(name, request, csrf_token):
+    auth = 'auth' if request.user.is_authenticated else 'anon'
+    # 可被代理缓存的公开页面不输出 CSRF token（yourapp.context_processors.public_page），渲染结果不同
+    csrf = 'csrf' if csrf_token and csrf_token != 'NOTPROVIDED' else 'nocsrf'
+    path = hashlib.md5(request.path.encode('utf-8')).hexdigest()
+    return 'fragment:%s:%s:%s:%s:%s:%s' % (catalog_version(), name, get_language(), auth, csrf, path)
+
+
+def get_fragment(key):
+    return caches['fragments'].get(key)
+
+
+def set_fragment(key, content):
+    caches['fragments'].set(key, content)
+
+
+def fill_fragment(content, request, csrf_token):
+    """把缓存片段中的占位符换成当前请求的 CSRF token 和完整路径（与模板自动转义的结果一致）"""
+    if CSRF_PLACEHOLDER in content:
+        content = content.replace(CSRF_PLACEHOLDER, escape(str(csrf_token)))
+    if FULL_PATH_PLACEHOLDER in content:
+        content = content.replace(FULL_PATH_PLACEHOLDER, escape(request.get_full_path()))
+    return content
@@ -0,0 +1,600 @@
+"""
+增量提取和编译翻译文件（python manage.py extractmessages / buildmessages）
+
+makemessages 每次都用 xgettext 重新扫描整个项目，compilemessages 每次都重写所有 .mo。
+这里在 Python 中完成同样的工作：
+
+- 提取：按 xgettext（Django makemessages 的关键字和 --add-comments=Translators）的规则，
+  用 tokenize 从 .py 和模板（先经 templatize 转换）中找出翻译字符串。每个文件的结果按内容的
+  sha256 缓存，只有内容变化的文件才重新提取（文件多时在进程池中并行），再与已有的 .po 合并：
+  保留译文、译者注释和 fuzzy 标记，更新位置注释，删除代码中不再使用的条目（与 --no-obsolete 相同）
+- 编译：只有 .po 的内容变化时才重新生成 .mo，生成的内容与原来相同时也不写入，
+  .mo 的修改时间不变，依赖它的 compiletranslationindex、compilejscatalogs 可以据此跳过
+
+.po 的格式（换行、79 列折行、位置注释）与 GNU gettext 工具的输出相同，两种方式可以混用。
+"""
+import ast
+import fnmatch
+import hashlib
+import io
+import json
+import os
+import re
+import struct
+import time
+import tokenize
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.utils.translation.template import templatize
+
+CACHE_VERSION = 1
+DOMAIN = 'django'
+EXTENSIONS = ('.py', '.html', '.txt')
+# 测试代码中的字符串不需要翻译
+IGNORE_PATTERNS = ('.*', '*~', '__pycache__', 'venv', 'node_modules', 'CVS', 'tests', 'tests.py', 'test_*.py')
+WRAP_WIDTH = 79
+
+# 与 makemessages 传给 xgettext 的关键字相同：名称 -> (msgid 位置, 复数位置, 上下文位置)，从 1 开始
+KEYWORDS = {
+    '_': (1, None, None),
+    'gettext': (1, None, None),
+    'gettext_lazy': (1, None, None),
+    'gettext_noop': (1, None, None),
+    'ngettext': (1, 2, None),
+    'ngettext_lazy': (1, 2, None),
+    'pgettext': (2, None, 1),
+    'pgettext_lazy': (2, None, 1),
+    'npgettext': (2, 3, 1),
+    'npgettext_lazy': (2, 3, 1),
+}
+COMMENT_TAG = 'Translators'
+
+python_format_re = re.compile(
+    r'%(?:\([^)]*\))?[#0 +-]*(?:\*|\d+)?(?:\.(?:\*|\d+))?[hlL]?([diouxXeEfFgGcrsa%])')
+
+
+def is_python_format(*strings):
+    """与 xgettext 一样，字符串中有 % 格式化占位符（%% 之外）时加上 python-format 标记"""
+    found = False
+    for string in strings:
+        if string is None:
+            continue
+        end = 0
+        for match in python_format_re.finditer(string):
+            if '%' in string[end:match.start()]:
+                return False  # 不能解析的 %
+            end = match.end()
+            found = found or match.group(1) != '%'
+        if '%' in string[end:]:
+            return False
+    return found
+
+
+# 提取
+
+def _literal(tokens):
+    """参数只由字符串字面量（可以是相邻的多个）组成时返回 (值, 行号)，否则返回 None"""
+    if not tokens or any(token.type != tokenize.STRING for token in tokens):
+        return None
+    try:
+        values = [ast.literal_eval(token.string) for token in tokens]
+    except (ValueError, SyntaxError):
+        return None  # f-string 等
+    if not all(isinstance(value, str) for value in values):
+        return None
+    return ''.join(values), tokens[0].start[0]
+
+
+def _translator_comments(comments, line):
+    """紧挨在 line 之前、以 Translators 开头的注释块"""
+    block = []
+    while line - 1 in comments:
+        line -= 1
+        block.insert(0, comments[line])
+    for i, text in enumerate(block):
+        if text.startswith(COMMENT_TAG):
+            return block[i:]
+    return []
+
+
+def extract_tokens(readline):
+    """
+    从 Python 源码（或 templatize 的输出）中提取翻译字符串
+    返回 [(上下文, msgid, 复数 msgid, 行号, 注释列表, 标记列表)]
+    """
+    tokens = []
+    comments = {}  # 行号 -> 注释内容
+    for token in tokenize.generate_tokens(readline):
+        if token.type == tokenize.COMMENT:
+            comments[token.start[0]] = token.string[1:].strip()
+        elif token.type not in (tokenize.NL, tokenize.NEWLINE, tokenize.INDENT, tokenize.DEDENT):
+            tokens.append(token)
+
+    messages = []
+    for i, token in enumerate(tokens[:-1]):
+        spec = KEYWORDS.get(token.string) if token.type == tokenize.NAME else None
+        if spec is None or tokens[i + 1].string != '(' or (i and tokens[i - 1].string == 'def'):
+            continue
+        # 收集括号内的各个参数；嵌套的调用在继续遍历时还会单独处理
+        args, current, depth = [], [], 0
+        for arg_token in tokens[i + 2:]:
+            if arg_token.type == tokenize.OP and arg_token.string in '([{':
+                depth += 1
+            elif arg_token.type == tokenize.OP and arg_token.string in ')]}':
+                if depth == 0:
+                    break
+                depth -= 1
+            elif arg_token.type == tokenize.OP and arg_token.string == ',' and depth == 0:
+                args.append(current)
+                current = []
+                continue
+            current.append(arg_token)
+        args.append(current)
+
+        values = []
+        for position in spec:
+            if position is None:
+                values.append(None)
+                continue
+            literal = _literal(args[position - 1]) if position <= len(args) else None
+            if literal is None:
+                break
+            values.append(literal)
+        else:
+            (msgid, line), plural, context = values
+            plural = plural and plural[0]
+            context = context and context[0]
+            flags = ['python-format'] if is_python_format(msgid, plural) else []
+            messages.append((context, msgid, plural, line, _translator_comments(comments, token.start[0]), flags))
+    return messages
+
+
+def extract_source(source, path):
+    """path 为 .py 时按 Python 源码提取，否则先用 templatize 把模板转换成 Python 形式"""
+    if path.endswith('.py'):
+        return extract_tokens(io.StringIO(source).readline)
+    # templatize 的输出保留原来的行号，每个字符串字面量都在一行内；
+    # 去掉行首缩进，避免模板的缩进被 tokenize 当成不一致的 Python 缩进
+    code = templatize(source, origin=path)
+    lines = ''.join(line.lstrip(' \t') for line in code.splitlines(keepends=True))
+    return extract_tokens(io.StringIO(lines).readline)
+
+
+def extract_file(root, path):
+    """进程池中执行：读取并提取一个文件，返回 (path, sha256, 提取结果)"""
+    with open(os.path.join(root, path), 'rb') as fp:
+        content = fp.read()
+    digest = hashlib.sha256(content).hexdigest()
+    try:
+        messages = extract_source(content.decode('utf-8'), path)
+    except (UnicodeDecodeError, SyntaxError, tokenize.TokenError) as exc:
+        raise ValueError('%s: %s' % (path, exc))
+    return path, digest, messages
+
+
+def source_files(root, ignore_patterns=(), skip_dirs=()):
+    """root 下需要提取的文件（相对路径，按路径排序，与 makemessages 的处理顺序相同）"""
+    patterns = IGNORE_PATTERNS + tuple(ignore_patterns)
+    skip_dirs = {os.path.abspath(path) for path in skip_dirs}
+    found = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [
+            name for name in dirnames
+            if os.path.abspath(os.path.join(dirpath, name)) not in skip_dirs
+            and not _ignored(os.path.relpath(os.path.join(dirpath, name), root), patterns)
+        ]
+        for name in filenames:
+            path = os.path.relpath(os.path.join(dirpath, name), root).replace(os.sep, '/')
+            if name.endswith(EXTENSIONS) and not _ignored(path, patterns):
+                found.append(path)
+    return sorted(found)
+
+
+def _ignored(path, patterns):
+    path = path.replace(os.sep, '/')
+    name = os.path.basename(path)
+    return any(fnmatch.fnmatchcase(name, pattern) or fnmatch.fnmatchcase(path, pattern)
+               or fnmatch.fnmatchcase(path + '/', pattern) for pattern in patterns)
+
+
+def default_skip_dirs():
+    """不含翻译字符串的目录：静态文件（包括 static/admin）、上传文件、缓存和翻译目录本身"""
+    dirs = [settings.MEDIA_ROOT, os.path.join(settings.BASE_DIR, 'cache')]
+    dirs += list(settings.LOCALE_PATHS)
+    dirs += [d if isinstance(d, (str, os.PathLike)) else d[1] for d in getattr(settings, 'STATICFILES_DIRS', [])]
+    dirs.append(os.path.join(settings.BASE_DIR, 'static'))
+    if getattr(settings, 'STATIC_ROOT', None):
+        dirs.append(settings.STATIC_ROOT)
+    return [str(d) for d in dirs]
+
+
+# 缓存
+
+def load_cache(path):
+    try:
+        with open(path, encoding='utf-8') as fp:
+            cache = json.load(fp)
+    except (FileNotFoundError, ValueError):
+        return {}
+    return cache if cache.get('version') == CACHE_VERSION else {}
+
+
+def save_cache(path, cache):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    cache['version'] = CACHE_VERSION
+    with open(path + '.tmp', 'w', encoding='utf-8') as fp:
+        json.dump(cache, fp, ensure_ascii=False, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fp:
+        for chunk in iter(lambda: fp.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# .po 文件
+
+class Entry:
+    def __init__(self, msgid, context=None, plural=None, msgstr=None):
+        self.msgid = msgid
+        self.context = context
+        self.plural = plural
+        self.msgstr = msgstr if msgstr is not None else ([] if plural is not None else '')
+        self.comments = []  # 译者注释 "# "
+        self.extracted = []  # 提取的注释 "#. "
+        self.references = []  # 位置 "#: "
+        self.flags = []  # 标记 "#, "
+        self.previous = []  # "#| " 原样保留
+        self.obsolete = False
+
+    @property
+    def key(self):
+        return self.context, self.msgid
+
+    @property
+    def fuzzy(self):
+        return 'fuzzy' in self.flags
+
+    def translated(self):
+        if self.plural is None:
+            return bool(self.msgstr)
+        return any(self.msgstr)
+
+
+_escapes = {'\\': '\\\\', '"': '\\"', '\n': '\\n', '\t': '\\t', '\r': '\\r',
+            '\a': '\\a', '\b': '\\b', '\f': '\\f', '\v': '\\v'}
+_unescapes = {value[1]: key for key, value in _escapes.items()}
+_escape_re = re.compile(r'[\\"\n\t\r\a\b\f\v]')
+_unescape_re = re.compile(r'\\(.)')
+
+
+def _escape(string):
+    return _escape_re.sub(lambda match: _escapes[match.group(0)], string)
+
+
+def _unescape(string):
+    return _unescape_re.sub(lambda match: _unescapes.get(match.group(1), match.group(1)), string)
+
+
+def parse_po(text):
+    """解析 .po 文件，返回 Entry 列表（第一项通常是 msgid 为空的头信息）"""
+    entries = []
+    entry = Entry('')  # 注释在 msgid 之前，先放进一个空条目
+    field = None  # 续行属于的字段：('msgid',)、('msgstr', 序号) 等
+
+    for line in text.splitlines():
+        line = line.strip()
+        obsolete = line.startswith('#~')
+        if obsolete:
+            line = line[2:].strip()
+        if not line:
+            continue
+        if field is not None and field[0] == 'msgstr' and line.startswith(('#', 'msgctxt', 'msgid')):
+            entries.append(entry)
+            entry, field = Entry(''), None
+        if line.startswith('#'):
+            if line.startswith('#,'):
+                entry.flags += [flag.strip() for flag in line[2:].split(',') if flag.strip()]
+            elif line.startswith('#:'):
+                entry.references += line[2:].split()
+            elif line.startswith('#.'):
+                entry.extracted.append(line[2:].strip())
+            elif line.startswith('#|'):
+                entry.previous.append(line[2:].strip())
+            else:
+                entry.comments.append(line[2:] if line.startswith('# ') else line[1:])
+            continue
+
+        entry.obsolete = entry.obsolete or obsolete
+        if line.startswith('"'):
+            value = _unescape(line[1:-1])
+            if field is None:
+                continue
+            if field[0] == 'msgstr' and len(field) > 1:
+                entry.msgstr[field[1]] += value
+            else:
+                setattr(entry, field[0], getattr(entry, field[0]) + value)
+            continue
+        keyword, sep, rest = line.partition(' ')
+        value = _unescape(rest.strip()[1:-1])
+        if keyword == 'msgctxt':
+            entry.context, field = value, ('context',)
+        elif keyword == 'msgid':
+            entry.msgid, field = value, ('msgid',)
+        elif keyword == 'msgid_plural':
+            entry.plural, field = value, ('plural',)
+            entry.msgstr = []
+        elif keyword == 'msgstr':
+            entry.msgstr, field = value, ('msgstr',)
+        elif keyword.startswith('msgstr['):
+            index = int(keyword[7:-1])
+            entry.msgstr.extend([''] * (index + 1 - len(entry.msgstr)))
+            entry.msgstr[index], field = value, ('msgstr', index)
+    if field is not None:
+        entries.append(entry)
+    return entries
+
+
+def _wrap(keyword, string, width=WRAP_WIDTH):
+    """按 GNU gettext 的规则输出一个字段：在 \\n 之后换行，超过 width 列时在空格后折行"""
+    escaped = _escape(string)
+    line = '%s "%s"' % (keyword, escaped)
+    if len(line) <= width and '\\n' not in escaped[:-2]:
+        return [line]
+    chunks = []
+    for part in re.split(r'(?<=\\n)', escaped):
+        if not part:
+            continue
+        while len(part) + 2 > width:
+            # 最后一个能放下的空格之后折行，没有空格时不折
+            cut = part.rfind(' ', 0, width - 2)
+            if cut <= 0:
+                break
+            chunks.append(part[:cut + 1])
+            part = part[cut + 1:]
+        chunks.append(part)
+    return ['%s ""' % keyword] + ['"%s"' % chunk for chunk in chunks]
+
+
+def _wrap_references(references, width=WRAP_WIDTH):
+    lines, current = [], '#:'
+    for reference in references:
+        if len(current) + 1 + len(reference) > width and current != '#:':
+            lines.append(current)
+            current = '#:'
+        current += ' ' + reference
+    if current != '#:':
+        lines.append(current)
+    return lines
+
+
+def format_po(entries, nplurals=2):
+    blocks = []
+    for entry in entries:
+        prefix = '#~ ' if entry.obsolete else ''
+        lines = ['#' if not comment else '# ' + comment for comment in entry.comments]
+        lines += ['#. ' + comment for comment in entry.extracted]
+        lines += _wrap_references(entry.references)
+        if entry.flags:
+            lines.append('#, ' + ', '.join(entry.flags))
+        lines += ['#| ' + previous for previous in entry.previous]
+        fields = []
+        if entry.context is not None:
+            fields += _wrap('msgctxt', entry.context)
+        fields += _wrap('msgid', entry.msgid)
+        if entry.plural is None:
+            fields += _wrap('msgstr', entry.msgstr)
+        else:
+            fields += _wrap('msgid_plural', entry.plural)
+            msgstr = entry.msgstr or [''] * nplurals
+            for index, value in enumerate(msgstr):
+                fields += _wrap('msgstr[%d]' % index, value)
+        lines += [prefix + field for field in fields]
+        blocks.append('\n'.join(lines))
+    return '\n\n'.join(blocks) + '\n'
+
+
+def _nplurals(header):
+    match = re.search(r'nplurals\s*=\s*(\d+)', header.msgstr if header else '')
+    return int(match.group(1)) if match else 2
+
+
+def merge(entries, extracted):
+    """
+    与 msgmerge --no-obsolete 相同：extracted 是按文件路径排序的 {路径: 提取结果}，
+    结果中的条目按第一次出现的位置排序，已有条目的译文、译者注释和 fuzzy 标记保留
+    """
+    header = entries[0] if entries and entries[0].msgid == '' and entries[0].context is None else None
+    existing = {entry.key: entry for entry in entries if entry is not header and not entry.obsolete}
+    merged = {}
+    for path, messages in extracted.items():
+        for context, msgid, plural, line, comments, flags in messages:
+            key = (context, msgid)
+            entry = merged.get(key)
+            if entry is None:
+                old = existing.get(key)
+                entry = merged[key] = Entry(msgid, context, plural)
+                if old is not None:
+                    entry.comments = old.comments
+                    entry.msgstr = old.msgstr
+                    entry.previous = old.previous
+                    entry.flags = ['fuzzy'] if old.fuzzy else []
+                    if (old.plural is None) != (plural is None):
+                        # 单复数形式改变，原来的译文只能作为参考
+                        entry.msgstr = Entry(msgid, plural=plural).msgstr
+                        entry.flags = ['fuzzy']
+            reference = '%s:%d' % (path, line)
+            if reference not in entry.references:
+                entry.references.append(reference)
+            for comment in comments:
+                if comment not in entry.extracted:
+                    entry.extracted.append(comment)
+            for flag in flags:
+                if flag not in entry.flags:
+                    entry.flags.append(flag)
+    return ([header] if header else []) + list(merged.values())
+
+
+def update_po(path, extracted):
+    """合并后的内容与原文件不同时写入（并更新 POT-Creation-Date），返回是否写入"""
+    with open(path, encoding='utf-8') as fp:
+        old_text = fp.read()
+    entries = merge(parse_po(old_text), extracted)
+    header = entries[0] if entries and entries[0].msgid == '' else None
+    nplurals = _nplurals(header)
+    if format_po(entries, nplurals) == old_text:
+        return False
+    if header is not None:
+        header.msgstr = re.sub(r'POT-Creation-Date: [^\n]*', 'POT-Creation-Date: %s' % time.strftime('%Y-%m-%d %H:%M%z'),
+                               header.msgstr)
+    with open(path + '.tmp', 'w', encoding='utf-8') as fp:
+        fp.write(format_po(entries, nplurals))
+    os.replace(path + '.tmp', path)
+    return True
+
+
+# .mo 文件
+
+def compile_mo(entries):
+    """与 msgfmt 相同：跳过未翻译和 fuzzy 的条目（头信息除外），返回 .mo 文件内容"""
+    messages = {}
+    for entry in entries:
+        if entry.obsolete or not entry.translated() or (entry.fuzzy and entry.msgid):
+            continue
+        msgid = entry.msgid if entry.plural is None else entry.msgid + '\x00' + entry.plural
+        if entry.context is not None:
+            msgid = entry.context + '\x04' + msgid
+        msgstr = entry.msgstr if entry.plural is None else '\x00'.join(entry.msgstr)
+        messages[msgid.encode('utf-8')] = msgstr.encode('utf-8')
+    keys = sorted(messages)
+    offsets = []
+    ids = strs = b''
+    for key in keys:
+        offsets.append((len(ids), len(key), len(strs), len(messages[key])))
+        ids += key + b'\x00'
+        strs += messages[key] + b'\x00'
+    # 头部 7 个 u32，之后是 msgid 和译文的 (长度, 偏移) 表，没有哈希表
+    keystart = 7 * 4 + 16 * len(keys)
+    valuestart = keystart + len(ids)
+    koffsets, voffsets = [], []
+    for id_offset, id_length, str_offset, str_length in offsets:
+        koffsets += [id_length, id_offset + keystart]
+        voffsets += [str_length, str_offset + valuestart]
+    return (
+        struct.pack('Iiiiiii', 0x950412de, 0, len(keys), 7 * 4, 7 * 4 + len(keys) * 8, 0, 0)
+        + struct.pack('%di' % len(koffsets), *koffsets)
+        + struct.pack('%di' % len(voffsets), *voffsets)
+        + ids + strs
+    )
+
+
+def compile_po(path):
+    """进程池中执行：编译 path（.po），内容与现有的 .mo 不同时才写入，返回 (path, 是否写入)"""
+    with open(path, encoding='utf-8') as fp:
+        content = compile_mo(parse_po(fp.read()))
+    mo_path = path[:-3] + '.mo'
+    try:
+        with open(mo_path, 'rb') as fp:
+            if fp.read() == content:
+                return path, False
+    except FileNotFoundError:
+        pass
+    with open(mo_path + '.tmp', 'wb') as fp:
+        fp.write(content)
+    os.replace(mo_path + '.tmp', mo_path)
+    return path, True
+
+
+# 增量提取和编译
+
+def po_files(locales=None):
+    """LOCALE_PATHS 下各语言的 django.po，locales 为语言目录名（如 zh_Hans）列表"""
+    found = []
+    for localedir in settings.LOCALE_PATHS:
+        if not os.path.isdir(localedir):
+            continue
+        for locale in sorted(os.listdir(localedir)):
+            path = os.path.join(localedir, locale, 'LC_MESSAGES', DOMAIN + '.po')
+            if os.path.exists(path) and (not locales or locale in locales):
+                found.append(str(path))
+    return found
+
+
+def _executor(workers, count):
+    # 进程启动有固定开销，只改了几个文件时直接在当前进程处理
+    return ProcessPoolExecutor(workers) if workers > 1 and count > workers else None
+
+
+def extract_messages(po_paths, ignore_patterns=(), workers=1, use_cache=True):
+    """
+    重新提取内容变化的源文件并合并到 po_paths，返回统计信息：
+    files 扫描的文件数、extracted 重新提取的文件数、removed 删除的文件数、updated 写入的 .po
+    """
+    root = str(settings.BASE_DIR)
+    cache_path = os.path.join(settings.I18N_CACHE_DIR, 'extract.json')
+    cache = load_cache(cache_path) if use_cache else {}
+    cached = cache.get('files', {})
+    files = {}
+    changed = []
+    for path in source_files(root, ignore_patterns, default_skip_dirs()):
+        stat = os.stat(os.path.join(root, path))
+        entry = cached.get(path)
+        # 修改时间和大小都没变时不再计算哈希，哈希没变（只是 touch 或重新 checkout）时不再提取
+        if entry is None or entry['mtime'] != stat.st_mtime_ns or entry['size'] != stat.st_size:
+            if entry is None or entry['sha256'] != file_digest(os.path.join(root, path)):
+                changed.append(path)
+                entry = {}
+            entry = dict(entry, mtime=stat.st_mtime_ns, size=stat.st_size)
+        files[path] = entry
+
+    executor = _executor(workers, len(changed))
+    try:
+        results = (executor.map(extract_file, [root] * len(changed), changed, chunksize=8) if executor
+                   else map(extract_file, [root] * len(changed), changed))
+        for path, digest, messages in results:
+            files[path].update(sha256=digest, messages=messages)
+    finally:
+        if executor:
+            executor.shutdown()
+
+    removed = set(cached) - set(files)
+    sources_changed = bool(changed or removed)
+    po_hashes = cache.get('po', {})
+    merged = {path: [tuple(message) for message in entry['messages']]
+              for path, entry in files.items() if entry['messages']}
+    updated = []
+    for po_path in po_paths:
+        # 源文件没有变化、.po 也没有被修改时不需要合并
+        if not sources_changed and po_hashes.get(po_path) == file_digest(po_path):
+            continue
+        if update_po(po_path, merged):
+            updated.append(po_path)
+        po_hashes[po_path] = file_digest(po_path)
+    save_cache(cache_path, {'files': files, 'po': po_hashes})
+    return {'files': len(files), 'extracted': len(changed), 'removed': len(removed), 'updated': updated}
+
+
+def build_messages(po_paths, workers=1, use_cache=True):
+    """编译内容变化的 .po，返回 (写入的 .mo 列表, 跳过的 .po 数)"""
+    cache_path = os.path.join(settings.I18N_CACHE_DIR, 'compile.json')
+    cache = load_cache(cache_path) if use_cache else {}
+    compiled = cache.get('po', {})
+    digests = {path: file_digest(path) for path in po_paths}
+    changed = [path for path in po_paths
+               if compiled.get(path) != digests[path] or not os.path.exists(path[:-3] + '.mo')]
+    written = []
+    executor = _executor(workers, len(changed))
+    try:
+        for path, wrote in (executor.map(compile_po, changed) if executor else map(compile_po, changed)):
+            compiled[path] = digests[path]
+            if wrote:
+                written.append(path[:-3] + '.mo')
+    finally:
+        if executor:
+            executor.shutdown()
+    save_cache(cache_path, {'po': compiled})
+    return written, len(po_paths) - len(changed)
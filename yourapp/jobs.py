@@ -0,0 +1,162 @@
+"""
+基于数据库的后台任务队列，不需要额外的消息服务
+
+- 用 @task 注册任务函数，fn.enqueue(**kwargs) 在 Job 表中插入一行；在事务中调用时随事务一起提交
+- worker（manage.py runjobs）用一条 UPDATE 领取一批到期任务并写入租约（locked_by/locked_until），
+  租约到期仍未完成（worker 被杀死等）的任务会被重新领取，因此任务函数必须可以重复执行
+- 失败的任务按指数退避重试，超过 max_attempts 后标记为 failed，记录最后一次的错误和耗时
+- 每个任务最多执行 TIMEOUT_SECONDS 秒（不超过租约），超时按失败处理
+- 任务函数在进程池中执行，只接收 JSON 可序列化的关键字参数
+- 完成或失败超过 KEEP_DAYS 天的任务由 worker 定期删除
+"""
+import random
+import signal
+import socket
+import threading
+import time
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+LEASE_SECONDS = 300
+TIMEOUT_SECONDS = 240  # 单个任务的执行时间上限，不能超过租约，否则任务还在执行时就会被其他 worker 重新领取
+KEEP_DAYS = 30
+BACKOFF_BASE = 10  # 第 n 次失败后等待 BACKOFF_BASE * 2**(n-1) 秒（加随机抖动）
+BACKOFF_MAX = 3600
+MAX_ERROR_LENGTH = 4000
+
+
+class TaskTimeout(Exception):
+    pass
+
+
+def task(function):
+    """注册任务函数，之后可以用 function.enqueue(**kwargs) 或 function.enqueue_many([kwargs, ...]) 放入队列"""
+    function.job_name = '%s.%s' % (function.__module__, function.__qualname__)
+    function.enqueue = lambda **kwargs: enqueue(function.job_name, **kwargs)
+    function.enqueue_many = lambda kwargs_list: enqueue_many(function.job_name, kwargs_list)
+    return function
+
+
+def enqueue(name, *, run_after=None, max_attempts=None, **kwargs):
+    job = Job(name=name, kwargs=kwargs, run_after=run_after or timezone.now())
+    if max_attempts is not None:
+        job.max_attempts = max_attempts
+    job.save()
+    return job
+
+
+def enqueue_many(name, kwargs_list):
+    """批量放入多个同名任务（一条 INSERT）"""
+    now = timezone.now()
+    return Job.objects.bulk_create([Job(name=name, kwargs=kwargs, run_after=now) for kwargs in kwargs_list])
+
+
+def worker_id():
+    return '%s:%s' % (socket.gethostname(), uuid.uuid4().hex[:12])
+
+
+def _ready(now):
+    # 到期的排队任务，以及租约已过期、还可以重试的运行中任务
+    return (
+        Q(status=Job.QUEUED, run_after__lte=now)
+        | Q(status=Job.RUNNING, locked_until__lt=now, attempts__lt=F('max_attempts'))
+    )
+
+
+def claim(worker, limit, lease=LEASE_SECONDS):
+    """
+    领取最多 limit 个任务，返回 Job 列表
+    领取是一条 UPDATE ... WHERE id IN (SELECT ... LIMIT n)，多个 worker 同时领取也不会拿到同一个任务；
+    每次领取使用新的租约标识，再按标识取回本次领到的任务
+    """
+    now = timezone.now()
+    token = '%s/%s' % (worker, uuid.uuid4().hex[:8])
+    ids = Job.objects.filter(_ready(now)).order_by('run_after', 'id').values('id')[:limit]
+    with transaction.atomic():
+        claimed = Job.objects.filter(_ready(now), id__in=ids).update(
+            status=Job.RUNNING,
+            locked_by=token,
+            locked_until=now + timedelta(seconds=lease),
+            attempts=F('attempts') + 1,
+            started_at=now,
+        )
+        if not claimed:
+            return []
+        return list(Job.objects.filter(locked_by=token, status=Job.RUNNING))
+
+
+def release(job):
+    """把领取后没有执行完的任务放回队列，不计入重试次数（worker 停止、进程池被结束时）"""
+    return Job.objects.filter(pk=job.pk, locked_by=job.locked_by, status=Job.RUNNING).update(
+        status=Job.QUEUED, locked_until=None, attempts=F('attempts') - 1,
+    )
+
+
+def prune(days=KEEP_DAYS):
+    """删除完成或失败超过 days 天的任务，返回数量"""
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted, _ = Job.objects.filter(status__in=(Job.DONE, Job.FAILED), finished_at__lt=cutoff).delete()
+    return deleted
+
+
+def expire_abandoned():
+    """租约过期且已用完重试次数的任务标记为失败，返回数量"""
+    return Job.objects.filter(
+        status=Job.RUNNING, locked_until__lt=timezone.now(), attempts__gte=F('max_attempts'),
+    ).update(status=Job.FAILED, finished_at=timezone.now(), last_error='Lease expired')
+
+
+def backoff(attempts):
+    delay = min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def _raise_timeout(signum, frame):
+    raise TaskTimeout('Task exceeded the time limit')
+
+
+def execute(name, kwargs, timeout=None):
+    """
+    在 worker 进程中执行一个任务，返回 (耗时, 错误)；错误是 traceback 文本，成功时为 None
+    异常在这里转成文本，避免不能 pickle 的异常对象传回父进程时出错
+    timeout 用 SIGALRM 实现，只在有这个信号的平台的主线程中生效；其他情况由 runjobs 在父进程中结束超时的进程
+    """
+    alarm = bool(timeout) and hasattr(signal, 'SIGALRM') and threading.current_thread() is threading.main_thread()
+    start = time.perf_counter()
+    try:
+        if alarm:
+            previous = signal.signal(signal.SIGALRM, _raise_timeout)
+            signal.setitimer(signal.ITIMER_REAL, timeout)
+        try:
+            function = import_string(name)
+            if getattr(function, 'job_name', None) != name:
+                raise ValueError('%s is not a registered task' % name)
+            function(**kwargs)
+        finally:
+            if alarm:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+                signal.signal(signal.SIGALRM, previous)
+    except Exception:
+        return time.perf_counter() - start, traceback.format_exc()[-MAX_ERROR_LENGTH:]
+    return time.perf_counter() - start, None
+
+
+def finish(job, duration, error=None):
+    """记录执行结果：成功、按退避时间重新排队或最终失败；只在租约仍属于本 worker 时更新"""
+    now = timezone.now()
+    values = {'duration': duration, 'locked_until': None}
+    if error is None:
+        values.update(status=Job.DONE, finished_at=now, last_error='')
+    elif job.attempts < job.max_attempts:
+        values.update(status=Job.QUEUED, run_after=now + timedelta(seconds=backoff(job.attempts)), last_error=error)
+    else:
+        values.update(status=Job.FAILED, finished_at=now, last_error=error)
+    return Job.objects.filter(pk=job.pk, locked_by=job.locked_by, status=Job.RUNNING).update(**values)
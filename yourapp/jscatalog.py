@@ -0,0 +1,101 @@
+"""
+预编译的前端翻译目录
+
+部署时把 LOCALE_PATHS 中每种语言的翻译编译成与 JavaScriptCatalog 视图相同的 JS（压缩后），
+文件名带内容哈希，例如 static/jsi18n/catalog.zh-hans.3f2a9c1b0d4e.js，
+语言到文件名的对应关系写在 catalogs.json 中，由 {% js_catalog %} 模板标签读取。
+"""
+import functools
+import hashlib
+import json
+import os
+
+from django.conf import settings
+from django.template import Context, Engine
+from django.urls import reverse
+from django.utils import translation
+from django.views.i18n import builtin_template_path, get_formats
+
+from .translation import _plural_expression, collect_catalog
+
+MANIFEST_NAME = 'catalogs.json'
+STATIC_PREFIX = 'jsi18n/'  # JS_CATALOG_DIR 相对 STATIC_ROOT 的路径
+
+
+def catalog_context(language):
+    """与 JavaScriptCatalog.get_context_data 相同的内容，但只包含本项目（LOCALE_PATHS）的翻译"""
+    singular, plural, expressions, info, sources = collect_catalog(
+        language, list(reversed(settings.LOCALE_PATHS))
+    )
+    catalog = {key: value for key, value in singular.items() if key}
+    for msgid, (plural_index, forms) in plural.items():
+        catalog[msgid] = forms
+    with translation.override(language):
+        formats = get_formats()
+    return {
+        'catalog': catalog,
+        'formats': formats,
+        'plural': _plural_expression(info) if info.get('plural-forms') else None,
+    }
+
+
+def render_catalog(language):
+    """渲染 Django 自带的 i18n_catalog.js 模板，JSON 不缩进，并去掉缩进、空行和注释行"""
+    context = catalog_context(language)
+    with builtin_template_path('i18n_catalog.js').open(encoding='utf-8') as fh:
+        template = Engine().from_string(fh.read())
+    context['catalog_str'] = json.dumps(context['catalog'], sort_keys=True, separators=(',', ':')) if context['catalog'] else None
+    context['formats_str'] = json.dumps(context['formats'], sort_keys=True, separators=(',', ':'))
+    lines = []
+    for line in template.render(Context(context)).splitlines():
+        line = line.strip()
+        if line and not (line.startswith('/*') and line.endswith('*/')):
+            lines.append(line)
+    return '\n'.join(lines) + '\n'
+
+
+def build_catalogs(directory=None, clear=False):
+    """为 LANGUAGES 中的每种语言生成带内容哈希的目录文件，返回 {语言: 文件名}"""
+    directory = directory or settings.JS_CATALOG_DIR
+    os.makedirs(directory, exist_ok=True)
+    manifest = {}
+    for language, name in settings.LANGUAGES:
+        content = render_catalog(language).encode('utf-8')
+        filename = 'catalog.%s.%s.js' % (language, hashlib.md5(content).hexdigest()[:12])
+        path = os.path.join(directory, filename)
+        if not os.path.exists(path):
+            with open(path + '.tmp', 'wb') as fp:
+                fp.write(content)
+            os.replace(path + '.tmp', path)
+        manifest[language] = filename
+
+    manifest_path = os.path.join(directory, MANIFEST_NAME)
+    with open(manifest_path + '.tmp', 'w', encoding='utf-8') as fp:
+        json.dump(manifest, fp, sort_keys=True)
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+    if clear:
+        # 旧文件默认保留，缓存中的旧页面仍然引用它们
+        current = set(manifest.values())
+        for entry in os.scandir(directory):
+            if entry.name.startswith('catalog.') and entry.name.endswith('.js') and entry.name not in current:
+                os.remove(entry.path)
+    return manifest
+
+
+@functools.lru_cache
+def load_manifest():
+    """读取 catalogs.json，没有生成过时返回空字典（模板标签退回 JavaScriptCatalog 视图）"""
+    try:
+        with open(os.path.join(settings.JS_CATALOG_DIR, MANIFEST_NAME), encoding='utf-8') as fp:
+            return json.load(fp)
+    except FileNotFoundError:
+        return {}
+
+
+def catalog_url():
+    """当前语言的前端翻译目录地址：compilejscatalogs 生成的静态文件，没有生成时为 JavaScriptCatalog 视图"""
+    filename = load_manifest().get(translation.get_language())
+    if filename:
+        return settings.STATIC_URL + STATIC_PREFIX + filename
+    return reverse('javascript-catalog')
@@ -0,0 +1,387 @@
+import itertools
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.contrib.auth.hashers import make_password
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.template.base import Template
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext, setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+
+from accounts.avatars import generate_derivatives
+from accounts.models import CustomUser, DocumentBlob, UserDocument
+from yourapp.metrics import registry
+
+BENCH_PASSWORD = 'bench-Passw0rd!'
+LANGUAGES = ('en', 'zh-hans')
+# 低于这个差值的延迟/内存变化视为噪声，不算退化
+LATENCY_NOISE_MS = 1.0
+MEMORY_NOISE_KB = 256
+
+
+class RenderTimer:
+    """统计最外层 Template.render 的耗时（{% include %} 的嵌套渲染已包含在内）"""
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def __enter__(self):
+        self.original = original = Template.render
+        local = self.local
+
+        def render(template, context):
+            depth = getattr(local, 'depth', 0)
+            local.depth = depth + 1
+            start = time.perf_counter()
+            try:
+                return original(template, context)
+            finally:
+                local.depth = depth
+                if depth == 0:
+                    local.elapsed = getattr(local, 'elapsed', 0.0) + time.perf_counter() - start
+
+        Template.render = render
+        return self
+
+    def __exit__(self, *exc_info):
+        Template.render = self.original
+
+    def take(self):
+        """返回并清零当前线程累计的渲染时间（秒）"""
+        elapsed = getattr(self.local, 'elapsed', 0.0)
+        self.local.elapsed = 0.0
+        return elapsed
+
+
+class Case:
+    """一个被测 URL：method、地址、是否需要登录（user 为登录的用户，默认是测试用户），data 为每次请求生成 POST 数据的函数"""
+
+    def __init__(self, name, url_name, path, method='get', auth=False, data=None, before=None, user=None):
+        self.name = name
+        self.url_name = url_name
+        self.path = path
+        self.method = method
+        self.auth = auth
+        self.user = user
+        self.data = data
+        self.before = before  # 每次请求前执行、不计时，例如退出前先登录
+
+    def request(self, client, counter):
+        if self.before:
+            self.before(client)
+        kwargs = {}
+        if self.data:
+            kwargs['data'] = self.data(counter)
+        return getattr(client, self.method)(self.path, **kwargs)
+
+
+def url_names(patterns=None, namespace=''):
+    """所有带名字的 URL，admin 只保留 admin:index 作为代表"""
+    names = set()
+    for pattern in get_resolver().url_patterns if patterns is None else patterns:
+        if isinstance(pattern, URLResolver):
+            if pattern.namespace == 'admin':
+                names.add('admin:index')
+                continue
+            prefix = namespace + pattern.namespace + ':' if pattern.namespace else namespace
+            names |= url_names(pattern.url_patterns, prefix)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            names.add(namespace + pattern.name)
+    return names
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, int(round(fraction * (len(values) - 1)))))
+    return values[index]
+
+
+class Command(BaseCommand):
+    help = ("基准测试：在临时数据库中生成测试数据，按 en/zh-hans 两种语言以单客户端和并发方式请求所有 URL，"
+            "统计每个视图的 p50/p95/p99 延迟、SQL 数量、模板渲染时间和内存峰值，可与基线比较")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20, help="生成的用户数")
+        parser.add_argument('--documents', type=int, default=50, help="每个用户的文档数")
+        parser.add_argument('--requests', type=int, default=50, help="每个URL每种语言的请求次数")
+        parser.add_argument('--concurrency', type=int, default=8, help="并发模式的客户端（线程）数，0 表示不运行并发模式")
+        parser.add_argument('--output', help="把结果写入这个JSON文件（可作为以后的基线）")
+        parser.add_argument('--baseline', help="与这个JSON基线比较，有退化时命令失败")
+        parser.add_argument('--threshold', type=float, default=0.2, help="允许的退化比例，默认 0.2 即 20%%")
+
+    def handle(self, *args, **options):
+        workdir = tempfile.mkdtemp(prefix='bench-')
+        media_root = settings.MEDIA_ROOT
+        for alias in settings.DATABASES:
+            settings.DATABASES[alias].setdefault('TEST', {})
+            if not settings.DATABASES[alias]['TEST'].get('MIRROR'):
+                # 使用文件数据库，与生产环境的 SQLite 行为（WAL、锁）一致
+                settings.DATABASES[alias]['TEST']['NAME'] = os.path.join(workdir, '%s.sqlite3' % alias)
+        caches_setting = {
+            alias: dict(config, LOCATION=os.path.join(workdir, 'cache', alias))
+            if config['BACKEND'].endswith('FileBasedCache') else config
+            for alias, config in settings.CACHES.items()
+        }
+        storages_setting = settings.STORAGES
+        try:
+            staticfiles_storage.url('css/style.css')
+        except ValueError:
+            # 生产配置下还没有运行 collectstatic（没有 staticfiles.json）
+            self.stderr.write(self.style.WARNING("没有找到静态文件 manifest，使用不带哈希的 StaticFilesStorage"))
+            storages_setting = dict(settings.STORAGES, staticfiles={
+                'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+            })
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            # 请求指标和密码哈希的名额也放在临时目录，不影响同一台机器上正在运行的服务
+            with override_settings(MEDIA_ROOT=os.path.join(workdir, 'media'), CACHES=caches_setting,
+                                   STORAGES=storages_setting, METRICS_DIR=os.path.join(workdir, 'metrics'),
+                                   PASSWORD_HASHING_LOCK_DIR=os.path.join(workdir, 'hashing')):
+                try:
+                    results = self.run_suite(options, media_root)
+                finally:
+                    registry.clear()  # 否则进程退出时（atexit）会写入真正的 METRICS_DIR
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as fp:
+                json.dump(results, fp, indent=2, sort_keys=True)
+            self.stdout.write("结果已写入 %s" % options['output'])
+        if options['baseline']:
+            self.compare(results, options['baseline'], options['threshold'])
+
+    def seed(self, users, documents, media_root):
+        """生成用户（带头像和缩略图）和文档，直接 bulk_create，不经过表单和信号"""
+        from PIL import Image
+
+        os.makedirs(os.path.join(settings.MEDIA_ROOT, 'avatars'), exist_ok=True)
+        os.makedirs(os.path.join(settings.MEDIA_ROOT, 'blobs'), exist_ok=True)
+        # 注册的新用户使用默认头像
+        default_avatar = CustomUser._meta.get_field('avatar').default
+        source = os.path.join(media_root, default_avatar)
+        if os.path.exists(source):
+            shutil.copy(source, os.path.join(settings.MEDIA_ROOT, default_avatar))
+            generate_derivatives(settings.MEDIA_ROOT, default_avatar)
+        password = make_password(BENCH_PASSWORD)  # 密码哈希很慢，所有用户共用一个
+        accounts = []
+        for i in range(users):
+            avatar = 'avatars/bench_%d.png' % i
+            Image.new('RGB', (400, 400), (i * 37 % 256, 90, 160)).save(os.path.join(settings.MEDIA_ROOT, avatar))
+            generate_derivatives(settings.MEDIA_ROOT, avatar)
+            accounts.append(CustomUser(username='bench%d' % i, email='bench%d@example.com' % i,
+                                       password=password, avatar=avatar))
+        CustomUser.objects.bulk_create(accounts)
+        accounts = list(CustomUser.objects.order_by('pk'))
+
+        content = b'benchmark document\n' * 64
+        blob = DocumentBlob.objects.create(sha256='0' * 64, file='blobs/bench.txt', size=len(content),
+                                           content_type='text/plain', refcount=users * documents)
+        with open(os.path.join(settings.MEDIA_ROOT, blob.file.name), 'wb') as fp:
+            fp.write(content)
+        UserDocument.objects.bulk_create(
+            [UserDocument(owner=user, title='Document %d' % i, document=blob.file.name, blob=blob)
+             for user in accounts for i in range(documents)],
+            batch_size=500,
+        )
+        return accounts
+
+    def build_cases(self, user):
+        document = UserDocument.objects.filter(owner=user).order_by('-uploaded_at', '-id').first()
+        profile_page = Client()
+        profile_page.force_login(user)
+        cursor = profile_page.get(reverse('document_list')).json()['next']
+
+        sequence = itertools.count()  # 注册的用户名不能重复（包括两种语言和并发模式之间）
+
+        def register_data(number):
+            return {'username': 'new%d' % number, 'email': 'new%d@example.com' % number,
+                    'password1': BENCH_PASSWORD, 'password2': BENCH_PASSWORD}
+
+        def login_again(client):
+            client.force_login(user)
+
+        def log_out(client):
+            client.logout()
+
+        staff = CustomUser.objects.create(username='bench-staff', email='bench-staff@example.com',
+                                          password=user.password, is_staff=True, is_superuser=True)
+
+        cases = [
+            Case('home', 'home', reverse('home')),
+            Case('about', 'about', reverse('about')),
+            Case('login', 'login', reverse('login')),
+            # 每次提交前先退出，否则已登录的客户端会被 redirect_authenticated_user 直接跳转，测不到密码校验
+            Case('login POST', 'login', reverse('login'), 'post', before=log_out,
+                 data=lambda n: {'username': user.username, 'password': BENCH_PASSWORD}),
+            Case('register', 'register', reverse('register')),
+            Case('register POST', 'register', reverse('register'), 'post',
+                 data=lambda n: register_data(next(sequence))),
+            Case('profile', 'profile', reverse('profile'), auth=True),
+            Case('upload', 'upload_document', reverse('upload_document'), auth=True),
+            Case('upload POST', 'upload_document', reverse('upload_document'), 'post', auth=True,
+                 data=lambda n: {'title': 'Upload %d' % n,
+                                 'document': SimpleUploadedFile('upload.txt', b'upload %d %d\n' % (threading.get_ident(), n))}),
+            Case('document list', 'document_list', reverse('document_list'), auth=True),
+            Case('document list (page 2)', 'document_list', '%s?cursor=%s' % (reverse('document_list'), cursor), auth=True),
+            Case('download', 'download_document', reverse('download_document', args=[document.uuid]), auth=True),
+            Case('search documents', 'search_documents', '%s?q=Document+1' % reverse('search_documents'), auth=True),
+            Case('logout', 'logout', reverse('logout'), 'post', before=login_again),
+            Case('set language', 'set_language', reverse('set_language'), 'post',
+                 data=lambda n: {'language': 'en', 'next': '/'}),
+            Case('switch language', 'switch_language', reverse('switch_language'), 'post', auth=True,
+                 data=lambda n: {'language': 'en', 'next': reverse('profile')}),
+            Case('javascript catalog', 'javascript-catalog', reverse('javascript-catalog')),
+            Case('csrf cookie', 'csrf_cookie', reverse('csrf_cookie')),
+            Case('metrics', 'metrics', reverse('metrics'), auth=True, user=staff),
+            Case('admin', 'admin:index', reverse('admin:index'), auth=True, user=staff),
+        ]
+        missing = url_names() - {case.url_name for case in cases}
+        if missing:
+            self.stderr.write(self.style.WARNING("以下 URL 没有对应的测试用例：%s" % ', '.join(sorted(missing))))
+        return cases
+
+    def client(self, language, user, case):
+        client = Client()
+        client.cookies[settings.LANGUAGE_COOKIE_NAME] = language
+        if case.auth:
+            client.force_login(case.user or user)
+        return client
+
+    def run_single(self, case, language, user, count, timer):
+        """单客户端顺序请求：记录延迟、SQL 数量和模板渲染时间，最后用 tracemalloc 单独测一次内存峰值"""
+        client = self.client(language, user, case)
+        case.request(client, -1)  # 预热
+        latencies, queries, renders, statuses = [], [], [], set()
+        for n in range(count):
+            timer.take()
+            with ExitStack() as stack:
+                # 生产配置中读查询走 read 连接，所有连接的查询都要统计
+                captured = [stack.enter_context(CaptureQueriesContext(connection)) for connection in connections.all()]
+                start = time.perf_counter()
+                response = case.request(client, n)
+                latencies.append((time.perf_counter() - start) * 1000)
+            queries.append(sum(len(context) for context in captured))
+            renders.append(timer.take() * 1000)
+            statuses.add(response.status_code)
+
+        tracemalloc.start()
+        try:
+            baseline = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            case.request(client, count)
+            peak = tracemalloc.get_traced_memory()[1] - baseline
+        finally:
+            tracemalloc.stop()
+        return {
+            'requests': count,
+            'p50_ms': percentile(latencies, 0.50),
+            'p95_ms': percentile(latencies, 0.95),
+            'p99_ms': percentile(latencies, 0.99),
+            'mean_ms': statistics.mean(latencies),
+            'queries': max(queries),
+            'render_ms': statistics.median(renders),
+            'peak_kb': peak / 1024,
+            'status': sorted(statuses),
+        }
+
+    def run_concurrent(self, case, language, user, count, concurrency):
+        """concurrency 个客户端（线程）同时请求，共 count 次：只记录延迟和吞吐量"""
+        latencies, statuses = [], set()
+        lock = threading.Lock()
+
+        def worker(index):
+            client = self.client(language, user, case)
+            try:
+                for n in range(index, count, concurrency):
+                    start = time.perf_counter()
+                    response = case.request(client, n)
+                    elapsed = (time.perf_counter() - start) * 1000
+                    with lock:
+                        latencies.append(elapsed)
+                        statuses.add(response.status_code)
+            finally:
+                connections.close_all()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(worker, range(concurrency)))
+        elapsed = time.perf_counter() - start
+        return {
+            'requests': count,
+            'concurrency': concurrency,
+            'p50_ms': percentile(latencies, 0.50),
+            'p95_ms': percentile(latencies, 0.95),
+            'p99_ms': percentile(latencies, 0.99),
+            'throughput_rps': count / elapsed,
+            'status': sorted(statuses),
+        }
+
+    def run_suite(self, options, media_root):
+        started = time.perf_counter()
+        accounts = self.seed(options['users'], options['documents'], media_root)
+        self.stdout.write("已生成 %d 个用户、%d 个文档（%.1f 秒）" % (
+            len(accounts), len(accounts) * options['documents'], time.perf_counter() - started))
+        user = accounts[0]
+        cases = self.build_cases(user)
+        results = {}
+        with RenderTimer() as timer:
+            for language in LANGUAGES:
+                for case in cases:
+                    result = self.run_single(case, language, user, options['requests'], timer)
+                    results['single:%s:%s' % (language, case.name)] = result
+                    self.stdout.write(
+                        "%-8s %-24s p50 %7.2f  p95 %7.2f  p99 %7.2f ms  %3d 次查询  渲染 %6.2f ms  内存峰值 %7.1f KB  %s" % (
+                            language, case.name, result['p50_ms'], result['p95_ms'], result['p99_ms'],
+                            result['queries'], result['render_ms'], result['peak_kb'], result['status']))
+        if options['concurrency'] > 0:
+            for language in LANGUAGES:
+                for case in cases:
+                    result = self.run_concurrent(case, language, user, options['requests'], options['concurrency'])
+                    results['concurrent:%s:%s' % (language, case.name)] = result
+                    self.stdout.write("%-8s %-24s p50 %7.2f  p95 %7.2f  p99 %7.2f ms  %7.1f 请求/秒 (x%d)  %s" % (
+                        language, case.name, result['p50_ms'], result['p95_ms'], result['p99_ms'],
+                        result['throughput_rps'], options['concurrency'], result['status']))
+        return results
+
+    def compare(self, results, path, threshold):
+        try:
+            with open(path, encoding='utf-8') as fp:
+                baseline = json.load(fp)
+        except FileNotFoundError:
+            raise CommandError("基线文件不存在：%s（先用 --output 生成）" % path)
+
+        regressions = []
+        for key, result in sorted(results.items()):
+            previous = baseline.get(key)
+            if previous is None:
+                continue
+            for metric in ('p95_ms', 'p99_ms'):
+                if (result[metric] > previous[metric] * (1 + threshold)
+                        and result[metric] - previous[metric] > LATENCY_NOISE_MS):
+                    regressions.append("%s %s: %.2f -> %.2f" % (key, metric, previous[metric], result[metric]))
+            if 'queries' in result and result['queries'] > previous.get('queries', result['queries']):
+                regressions.append("%s queries: %d -> %d" % (key, previous['queries'], result['queries']))
+            if ('peak_kb' in result and result['peak_kb'] > previous['peak_kb'] * (1 + threshold)
+                    and result['peak_kb'] - previous['peak_kb'] > MEMORY_NOISE_KB):
+                regressions.append("%s peak_kb: %.1f -> %.1f" % (key, previous['peak_kb'], result['peak_kb']))
+        if regressions:
+            raise CommandError("与基线 %s 相比出现退化（阈值 %d%%）：\n%s" % (
+                path, threshold * 100, '\n'.join(regressions)))
+        self.stdout.write(self.style.SUCCESS("与基线 %s 相比没有退化" % path))
@@ -0,0 +1,26 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from yourapp.i18n import build_messages, po_files
+
+
+class Command(BaseCommand):
+    help = ("增量编译翻译文件：只编译内容变化过的 django.po（多个文件时在进程池中并行），"
+            "生成的 .mo 与原来相同时不写入；之后如有 .mo 更新再运行 compiletranslationindex")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--locale', '-l', action='append', default=[],
+                            help="只编译这些语言目录（如 zh_Hans），可重复，默认全部")
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help="编译进程数，1 表示在当前进程中处理")
+        parser.add_argument('--all', action='store_true', help="不使用缓存，重新编译所有 .po")
+
+    def handle(self, *args, **options):
+        paths = po_files(options['locale'])
+        if not paths:
+            raise CommandError("没有找到 django.po")
+        written, skipped = build_messages(paths, options['workers'], use_cache=not options['all'])
+        for path in written:
+            self.stdout.write("已写入 %s" % path)
+        self.stdout.write(self.style.SUCCESS("%d 个 .mo 已更新，%d 个 .po 没有变化" % (len(written), skipped)))
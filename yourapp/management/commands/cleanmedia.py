@@ -0,0 +1,45 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.storage import GC_MIN_AGE, collect_garbage, managed_directories, recount
+
+
+class Command(BaseCommand):
+    help = (
+        "删除 MEDIA_ROOT 中没有被任何用户、文档引用的文件（删除用户、替换头像后留下的文件等），"
+        "或用 --quarantine 移动到另一个目录。-v 2 列出每个文件"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="只统计，不删除或移动文件")
+        parser.add_argument('--quarantine', metavar='DIR', help="把文件移动到这个目录（保留相对路径），而不是删除")
+        parser.add_argument('--min-age', type=int, default=GC_MIN_AGE,
+                            help="只处理修改时间在这么多秒之前的文件，避免删除上传中或事务尚未提交的文件")
+        parser.add_argument('--recount', action='store_true', help="同时按文档大小重新统计每个用户的存储用量")
+
+    def handle(self, *args, **options):
+        media_root = os.path.realpath(settings.MEDIA_ROOT)
+        quarantine = options['quarantine'] and os.path.realpath(options['quarantine'])
+        for directory in managed_directories() if quarantine else ():
+            managed = os.path.join(media_root, directory)
+            if os.path.commonpath([quarantine, managed]) == managed:
+                raise CommandError("--quarantine 不能位于被清理的媒体目录 %s 中" % managed)
+
+        action = "发现" if options['dry_run'] else "移动" if quarantine else "删除"
+
+        def on_orphan(name, size):
+            if options['verbosity'] >= 2:
+                self.stdout.write("%s %s (%d bytes)" % (action, name, size))
+
+        report = collect_garbage(media_root, quarantine=quarantine, dry_run=options['dry_run'],
+                                 min_age=options['min_age'], on_orphan=on_orphan)
+        self.stdout.write(self.style.SUCCESS("检查 %d 个文件，%s %d 个未被引用的文件，共 %.1f MB" % (
+            report.files, action, report.orphan_count, report.orphan_bytes / 1024 / 1024)))
+        if report.skipped_recent:
+            self.stdout.write("跳过 %d 个最近修改的未引用文件" % report.skipped_recent)
+        if report.removed_dirs:
+            self.stdout.write("删除 %d 个空目录" % report.removed_dirs)
+        if options['recount']:
+            self.stdout.write("已重新统计 %d 个用户的存储用量" % recount())
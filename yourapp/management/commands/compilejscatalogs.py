@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from yourapp.jscatalog import build_catalogs
+
+
+class Command(BaseCommand):
+    help = "为 LANGUAGES 中的每种语言生成压缩、带内容哈希的前端翻译目录（在 compilemessages 之后、collectstatic 旁运行）"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help="输出目录，默认为 settings.JS_CATALOG_DIR")
+        parser.add_argument('--clear', action='store_true', help="删除不再使用的旧目录文件")
+
+    def handle(self, *args, **options):
+        manifest = build_catalogs(options['output'], clear=options['clear'])
+        for language, filename in sorted(manifest.items()):
+            self.stdout.write("%s: %s" % (language, filename))
+        self.stdout.write(self.style.SUCCESS("前端翻译目录已生成"))
@@ -0,0 +1,26 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from yourapp.translation import build_index
+
+
+class Command(BaseCommand):
+    help = "把 LANGUAGES 中所有语言的翻译目录编译成一个可被各worker mmap共享的索引文件（在compilemessages之后运行）"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output', default=getattr(settings, 'TRANSLATION_INDEX', None),
+            help="索引文件路径，默认为 settings.TRANSLATION_INDEX",
+        )
+
+    def handle(self, *args, **options):
+        path = options['output']
+        if not path:
+            raise CommandError("未配置 TRANSLATION_INDEX，请用 --output 指定索引文件路径")
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        stats = build_index(path)
+        for language, count in stats.items():
+            self.stdout.write("%s: %d 条翻译" % (language, count))
+        self.stdout.write(self.style.SUCCESS("翻译索引已写入 %s (%d 字节)" % (path, os.path.getsize(path))))
@@ -0,0 +1,63 @@
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.transfer import (
+    BATCH_SIZE, DOCUMENT_FIELDS, FORMATS, USER_FIELDS, RecordWriter, Throughput, detect_format, export_batches,
+    load_checkpoint, save_checkpoint,
+)
+
+FIELDS = {'users': USER_FIELDS, 'documents': DOCUMENT_FIELDS}
+
+
+class Command(BaseCommand):
+    help = (
+        "把用户或文档按主键顺序导出为 JSONL/CSV（文件字段是相对 MEDIA_ROOT 的路径，文件本身需另行复制）。"
+        "每批写入后记录检查点，中断后用 --resume 追加"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(FIELDS))
+        parser.add_argument('path', help="输出文件，- 表示标准输出")
+        parser.add_argument('--format', choices=FORMATS, help="默认按扩展名判断（.csv 为 CSV，其余为 JSONL）")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--resume', action='store_true', help="从检查点继续，追加到已有文件")
+
+    def handle(self, *args, **options):
+        kind, path = options['kind'], options['path']
+        format = detect_format(path, options['format'])
+        checkpoint_path = path + '.checkpoint'
+        checkpoint = None
+        if options['resume']:
+            if path == '-':
+                raise CommandError("输出到标准输出时不能使用 --resume")
+            checkpoint = load_checkpoint(checkpoint_path)
+            if checkpoint is None or checkpoint['kind'] != kind:
+                raise CommandError("没有找到 %s 导出的检查点 %s" % (kind, checkpoint_path))
+
+        stats = Throughput(checkpoint['rows'] if checkpoint else 0)
+        if path == '-':
+            fp = sys.stdout
+        else:
+            fp = open(path, 'a' if checkpoint else 'w', newline='', encoding='utf-8')
+            if checkpoint:
+                fp.truncate(checkpoint['offset'])  # 丢掉检查点之后写了一半的数据
+        try:
+            writer = RecordWriter(fp, format, FIELDS[kind], header=checkpoint is None)
+            for last_pk, records in export_batches(kind, checkpoint['last_pk'] if checkpoint else 0,
+                                                   options['batch_size']):
+                for record in records:
+                    writer.write(record)
+                stats.rows += len(records)
+                if fp is not sys.stdout:
+                    fp.flush()
+                    save_checkpoint(checkpoint_path, {
+                        'kind': kind, 'last_pk': last_pk, 'offset': fp.tell(), 'rows': stats.rows,
+                    })
+        finally:
+            if fp is not sys.stdout:
+                fp.close()
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        self.stderr.write("%s exported: %s" % (kind, stats.report()))
@@ -0,0 +1,29 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from yourapp.i18n import extract_messages, po_files
+
+
+class Command(BaseCommand):
+    help = ("增量更新翻译文件：只重新提取内容变化的 .py/.html/.txt 文件（多个文件时在进程池中并行），"
+            "合并到 LOCALE_PATHS 下已有的 django.po，效果与 makemessages --no-obsolete 相同")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--locale', '-l', action='append', default=[],
+                            help="只更新这些语言目录（如 zh_Hans），可重复，默认全部")
+        parser.add_argument('--ignore', '-i', action='append', default=[], metavar='PATTERN',
+                            help="忽略与这个 glob 模式匹配的文件或目录，可重复")
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help="提取进程数，1 表示在当前进程中处理")
+        parser.add_argument('--all', action='store_true', help="不使用缓存，重新提取所有文件")
+
+    def handle(self, *args, **options):
+        paths = po_files(options['locale'])
+        if not paths:
+            raise CommandError("没有找到 django.po（新语言先用 django-admin makemessages -l <语言> 创建）")
+        stats = extract_messages(paths, options['ignore'], options['workers'], use_cache=not options['all'])
+        self.stdout.write("扫描 %d 个文件，重新提取 %d 个，删除 %d 个" % (
+            stats['files'], stats['extracted'], stats['removed']))
+        for path in paths:
+            self.stdout.write("%s: %s" % (path, "已更新" if path in stats['updated'] else "没有变化"))
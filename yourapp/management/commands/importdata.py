@@ -0,0 +1,75 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.transfer import (
+    BATCH_SIZE, FORMATS, RecordReader, Throughput, detect_format, import_documents, import_users,
+    load_checkpoint, save_checkpoint,
+)
+
+IMPORTERS = {'users': import_users, 'documents': import_documents}
+PROGRESS_INTERVAL = 5.0
+
+
+class Command(BaseCommand):
+    help = (
+        "从 JSONL/CSV 批量导入用户或文档（先导入用户，文档的 owner 是用户的 uuid）。"
+        "每批一个事务，提交后写入检查点（<文件>.checkpoint），中断后用 --resume 继续"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(IMPORTERS))
+        parser.add_argument('path', help="JSONL 或 CSV 文件")
+        parser.add_argument('--format', choices=FORMATS, help="默认按扩展名判断（.csv 为 CSV，其余为 JSONL）")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help="复制头像、文档文件的进程数，1 表示在当前进程中处理")
+        parser.add_argument('--source-media', default=settings.MEDIA_ROOT,
+                            help="记录中文件路径所相对的目录（原系统的 MEDIA_ROOT），默认为本机 MEDIA_ROOT")
+        parser.add_argument('--resume', action='store_true', help="从检查点继续")
+
+    def handle(self, *args, **options):
+        kind, path = options['kind'], options['path']
+        format = detect_format(path, options['format'])
+        checkpoint_path = path + '.checkpoint'
+        checkpoint = load_checkpoint(checkpoint_path) if options['resume'] else None
+        if options['resume'] and checkpoint is None:
+            raise CommandError("没有找到检查点 %s" % checkpoint_path)
+        if checkpoint and checkpoint['kind'] != kind:
+            raise CommandError("检查点属于 %s 导入" % checkpoint['kind'])
+
+        importer = IMPORTERS[kind]
+        stats = Throughput(checkpoint['rows'] if checkpoint else 0)
+        executor = ProcessPoolExecutor(options['workers']) if options['workers'] > 1 else None
+        last_report = stats.elapsed
+        try:
+            with open(path, newline='', encoding='utf-8') as fp:
+                reader = RecordReader(
+                    fp, format,
+                    offset=checkpoint['offset'] if checkpoint else None,
+                    fieldnames=checkpoint['fieldnames'] if checkpoint else None,
+                )
+                batch = []
+                for record in reader:
+                    batch.append(record)
+                    if len(batch) < options['batch_size']:
+                        continue
+                    stats.rows += importer(batch, options['source_media'], settings.MEDIA_ROOT, executor, stats)
+                    batch = []
+                    # 事务已提交，记录下一批的起点
+                    save_checkpoint(checkpoint_path, {
+                        'kind': kind, 'offset': reader.tell(), 'fieldnames': reader.fieldnames, 'rows': stats.rows,
+                    })
+                    if stats.elapsed - last_report >= PROGRESS_INTERVAL:
+                        last_report = stats.elapsed
+                        self.stdout.write(stats.report())
+                if batch:
+                    stats.rows += importer(batch, options['source_media'], settings.MEDIA_ROOT, executor, stats)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        self.stdout.write(self.style.SUCCESS("%s imported: %s" % (kind, stats.report())))
@@ -0,0 +1,75 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.http import HttpResponse
+from django.middleware.locale import LocaleMiddleware as DjangoLocaleMiddleware
+from django.test import RequestFactory
+from django.utils import translation
+
+from yourapp.middleware import LocaleMiddleware
+
+# 常见的浏览器请求头组合：不同的 Accept-Language，以及带/不带语言 cookie
+ACCEPT_LANGUAGES = [
+    'zh-CN,zh;q=0.9,en;q=0.8',
+    'en-US,en;q=0.9',
+    'zh-TW,zh;q=0.9,en-US;q=0.8,en;q=0.7',
+    'en-GB,en;q=0.9,zh-CN;q=0.8',
+    'ja,en-US;q=0.9,en;q=0.8',
+    'fr-FR,fr;q=0.9',
+    '*',
+    '',
+]
+COOKIES = [None, 'en', 'zh-hans', 'de']
+
+
+class Command(BaseCommand):
+    help = "语言协商中间件基准测试：比较 Django 自带的 LocaleMiddleware 与 yourapp.middleware.LocaleMiddleware 的单次请求耗时"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50000, help="每个中间件处理的请求数")
+
+    def build_requests(self):
+        factory = RequestFactory()
+        requests = []
+        for accept in ACCEPT_LANGUAGES:
+            for cookie in COOKIES:
+                request = factory.get('/about/', HTTP_ACCEPT_LANGUAGE=accept)
+                if cookie:
+                    request.COOKIES['django_language'] = cookie
+                requests.append(request)
+        return requests
+
+    def run(self, middleware, requests, count):
+        response = HttpResponse()
+        start = time.perf_counter()
+        for i in range(count):
+            request = requests[i % len(requests)]
+            middleware.process_request(request)
+            middleware.process_response(request, response)
+        return (time.perf_counter() - start) / count * 1e6
+
+    def handle(self, *args, **options):
+        requests = self.build_requests()
+        django_middleware = DjangoLocaleMiddleware(lambda request: None)
+        fast_middleware = LocaleMiddleware(lambda request: None)
+
+        # 先确认两者对每种请求协商出的语言和响应头都相同
+        for request in requests:
+            results = []
+            for middleware in (django_middleware, fast_middleware):
+                response = HttpResponse()
+                middleware.process_request(request)
+                middleware.process_response(request, response)
+                results.append((request.LANGUAGE_CODE, response.get('Vary'), response.get('Content-Language')))
+            if results[0] != results[1]:
+                raise CommandError("结果不一致 %r: %r != %r" % (request.headers, results[0], results[1]))
+        translation.deactivate()
+
+        timings = {}
+        for label, middleware in (("django LocaleMiddleware", django_middleware),
+                                  ("yourapp LocaleMiddleware", fast_middleware)):
+            timings[label] = self.run(middleware, requests, options['requests'])
+            self.stdout.write("%-26s %6.2f 微秒/请求" % (label, timings[label]))
+        translation.deactivate()
+        django_time, fast_time = timings.values()
+        self.stdout.write(self.style.SUCCESS("每个请求节省 %.2f 微秒（%.1f 倍）" % (django_time - fast_time, django_time / fast_time)))
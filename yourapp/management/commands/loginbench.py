@@ -0,0 +1,216 @@
+import http.client
+import logging
+import os
+import shutil
+import signal
+import socket
+import statistics
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import override_settings
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+from django.urls import reverse
+
+from accounts.models import CustomUser
+
+from .bench import BENCH_PASSWORD, percentile
+
+# 不限制哈希时的哈希器列表：把 PooledPBKDF2PasswordHasher 换回 Django 的 PBKDF2PasswordHasher
+UNPOOLED_HASHER = 'django.contrib.auth.hashers.PBKDF2PasswordHasher'
+POOLED_HASHER = 'accounts.hashing.PooledPBKDF2PasswordHasher'
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(listener):
+    """在 fork 出的子进程中运行：与 gunicorn 的同步 worker 一样，从共享的监听 socket 上逐个接受请求并处理"""
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    logging.getLogger('django.request').disabled = True  # 风暴中大量的 503 不输出日志
+    server = WSGIServer(listener.getsockname(), QuietHandler, bind_and_activate=False)
+    server.socket.close()
+    server.socket = listener
+    server.server_name, server.server_port = listener.getsockname()
+    server.setup_environ()
+    server.set_app(WSGIHandler())
+    server.serve_forever()
+
+
+class HttpClient:
+    """最简单的 HTTP 客户端：每个请求一个连接，保存响应中的 cookie"""
+
+    def __init__(self, port):
+        self.port = port
+        self.cookies = {}
+
+    def request(self, method, path, data=None):
+        headers = {'Host': 'localhost'}
+        if self.cookies:
+            headers['Cookie'] = '; '.join('%s=%s' % item for item in self.cookies.items())
+        body = None
+        if data is not None:
+            body = urlencode(dict(data, csrfmiddlewaretoken=self.cookies.get(settings.CSRF_COOKIE_NAME, '')))
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=120)
+        try:
+            connection.request(method, path, body, headers)
+            response = connection.getresponse()
+            response.read()
+        finally:
+            connection.close()
+        for header in response.headers.get_all('Set-Cookie') or ():
+            for morsel in SimpleCookie(header).values():
+                self.cookies[morsel.key] = morsel.value
+        return response.status
+
+
+class Command(BaseCommand):
+    help = ("登录风暴基准测试：在临时数据库上 fork 出多个同步 worker 进程（与 gunicorn --workers N 相同的模型），"
+            "一组客户端线程不停地通过 HTTP 提交登录表单（一半密码错误），同时另一个已登录的客户端顺序请求普通页面，"
+            "比较限制/不限制密码哈希时页面的 p50/p95/p99 延迟")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help="worker 进程数，相当于 gunicorn 的 --workers")
+        parser.add_argument('--storm', type=int, default=16, help="同时提交登录表单的客户端线程数")
+        parser.add_argument('--requests', type=int, default=100, help="每个阶段请求普通页面的次数")
+        parser.add_argument('--page', default='profile', help="测量延迟的页面（URL名称）")
+        parser.add_argument('--retry-delay', type=float, default=0.5,
+                            help="登录线程收到 503 后等待多少秒再重试（相当于用户再次点击登录）")
+
+    def handle(self, *args, **options):
+        if not hasattr(os, 'fork'):
+            raise CommandError("loginbench 需要 os.fork()")
+        workdir = tempfile.mkdtemp(prefix='loginbench-')
+        for alias in settings.DATABASES:
+            settings.DATABASES[alias].setdefault('TEST', {})
+            if not settings.DATABASES[alias]['TEST'].get('MIRROR'):
+                settings.DATABASES[alias]['TEST']['NAME'] = os.path.join(workdir, '%s.sqlite3' % alias)
+        storages_setting = settings.STORAGES
+        try:
+            staticfiles_storage.url('css/style.css')
+        except ValueError:
+            storages_setting = dict(settings.STORAGES, staticfiles={
+                'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+            })
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        # 用户保存时会生成默认头像的缩略图，把默认头像复制到临时的 MEDIA_ROOT
+        default_avatar = CustomUser._meta.get_field('avatar').default
+        os.makedirs(os.path.join(workdir, 'media', os.path.dirname(default_avatar)))
+        source = os.path.join(settings.MEDIA_ROOT, default_avatar)
+        if os.path.exists(source):
+            shutil.copy(source, os.path.join(workdir, 'media', default_avatar))
+        try:
+            with override_settings(MEDIA_ROOT=os.path.join(workdir, 'media'), STORAGES=storages_setting,
+                                   ALLOWED_HOSTS=['localhost'], METRICS_DIR=os.path.join(workdir, 'metrics'),
+                                   PASSWORD_HASHING_LOCK_DIR=os.path.join(workdir, 'hashing')):
+                self.run_suite(options)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def run_suite(self, options):
+        user = CustomUser.objects.create(username='bench', email='bench@example.com',
+                                         password=make_password(BENCH_PASSWORD))
+        page = reverse(options['page'])
+        self.stdout.write("页面 %s，worker 进程 %d，登录线程 %d，同时哈希 %d 个 + %d 个排队（所有进程共享），CPU %d 核" % (
+            page, options['workers'], options['storm'], settings.PASSWORD_HASHING_WORKERS,
+            settings.PASSWORD_HASHING_BACKLOG, os.cpu_count() or 1))
+        hashers = [h for h in settings.PASSWORD_HASHERS if h != POOLED_HASHER]
+        for label, first, storm in (('idle', POOLED_HASHER, False), ('storm, no limit', UNPOOLED_HASHER, True),
+                                    ('storm, limit', POOLED_HASHER, True)):
+            with override_settings(PASSWORD_HASHERS=[first] + hashers):
+                with self.workers(options['workers']) as port:
+                    latencies, statuses = self.run_phase(port, user, page, options, storm)
+            self.report(label, latencies, statuses)
+
+    @contextmanager
+    def workers(self, count):
+        """fork 出 count 个 worker 进程，返回监听的端口"""
+        listener = socket.create_server(('127.0.0.1', 0), backlog=128)
+        connections.close_all()  # 子进程各自建立数据库连接
+        pids = []
+        try:
+            for n in range(count):
+                pid = os.fork()
+                if pid == 0:
+                    try:
+                        serve(listener)
+                    finally:
+                        os._exit(0)
+                pids.append(pid)
+            yield listener.getsockname()[1]
+        finally:
+            for pid in pids:
+                os.kill(pid, signal.SIGTERM)
+            for pid in pids:
+                os.waitpid(pid, 0)
+            listener.close()
+
+    def login(self, client, user, password):
+        if settings.CSRF_COOKIE_NAME not in client.cookies:
+            client.request('GET', reverse('csrf_cookie'))
+        return client.request('POST', reverse('login'), {'username': user.username, 'password': password})
+
+    def probe(self, port, user, page, count):
+        client = HttpClient(port)
+        while self.login(client, user, BENCH_PASSWORD) == 503:
+            time.sleep(0.1)
+        client.request('GET', page)  # 预热
+        latencies = []
+        for n in range(count):
+            start = time.perf_counter()
+            client.request('GET', page)
+            latencies.append((time.perf_counter() - start) * 1000)
+        return latencies
+
+    def run_phase(self, port, user, page, options, storm):
+        stop = threading.Event()
+        statuses = Counter()
+        lock = threading.Lock()
+
+        def login_storm():
+            client = HttpClient(port)
+            n = 0
+            while not stop.is_set():
+                password = BENCH_PASSWORD if n % 2 else 'wrong-password'
+                client.cookies = {key: value for key, value in client.cookies.items()
+                                  if key == settings.CSRF_COOKIE_NAME}  # 每次都以未登录状态提交
+                status = self.login(client, user, password)
+                with lock:
+                    statuses[status] += 1
+                n += 1
+                if status == 503:
+                    stop.wait(options['retry_delay'])
+
+        threads = [threading.Thread(target=login_storm) for i in range(options['storm'] if storm else 0)]
+        for thread in threads:
+            thread.start()
+        try:
+            time.sleep(0.5 if storm else 0)  # 等登录请求占满 worker
+            return self.probe(port, user, page, options['requests']), statuses
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+    def report(self, label, latencies, statuses):
+        self.stdout.write("%-16s p50 %8.2f  p95 %8.2f  p99 %8.2f  mean %8.2f ms  登录响应 %s" % (
+            label, percentile(latencies, 0.50), percentile(latencies, 0.95), percentile(latencies, 0.99),
+            statistics.mean(latencies), dict(sorted(statuses.items())) or '-'))
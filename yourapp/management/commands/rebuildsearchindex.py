@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from accounts import search
+
+
+class Command(BaseCommand):
+    help = "重新创建文档全文索引的触发器并根据现有数据重建索引（migrate 结束时会自动执行，这里用于手动修复）"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if not search.is_supported(connection):
+            raise CommandError("全文索引只支持 SQLite 数据库")
+        with transaction.atomic(using=options['database']):
+            count = search.rebuild(connection)
+        self.stdout.write(self.style.SUCCESS("已索引 %d 个文档" % count))
@@ -0,0 +1,133 @@
+import multiprocessing
+import signal
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from yourapp import jobs
+
+PRUNE_INTERVAL = 3600
+KILL_GRACE = 10  # 任务超时后等待子进程自己报告超时的秒数，之后结束进程池
+
+
+class Command(BaseCommand):
+    help = "执行后台任务队列中的任务（yourapp/jobs.py）：领取到期任务，在进程池中执行，失败时按退避时间重试"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=2, help="执行任务的进程数，0 表示在当前进程中执行")
+        parser.add_argument('--lease', type=int, default=jobs.LEASE_SECONDS,
+                            help="租约秒数，超过这个时间没有完成的任务会被其他 worker 重新领取")
+        parser.add_argument('--timeout', type=int, default=jobs.TIMEOUT_SECONDS,
+                            help="单个任务的最长执行秒数，不能超过 --lease")
+        parser.add_argument('--keep-days', type=int, default=jobs.KEEP_DAYS,
+                            help="完成或失败超过这个天数的任务会被删除，0 表示不删除")
+        parser.add_argument('--poll', type=float, default=1.0, help="没有任务时的轮询间隔（秒）")
+        parser.add_argument('--once', action='store_true', help="执行完当前所有到期任务后退出")
+
+    def handle(self, *args, **options):
+        if not 0 < options['timeout'] <= options['lease']:
+            raise CommandError("--timeout must be between 1 and --lease (%d)" % options['lease'])
+        self.worker = jobs.worker_id()
+        self.stopping = False
+        self.last_prune = None
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        if options['processes'] == 0:
+            self.run_inline(options)
+        else:
+            self.run_pool(options)
+
+    def stop(self, signum, frame):
+        self.stopping = True
+
+    def housekeeping(self, options):
+        """每次领取前把放弃的任务标记为失败，每小时删除一次旧任务"""
+        jobs.expire_abandoned()
+        now = time.monotonic()
+        if options['keep_days'] and (self.last_prune is None or now - self.last_prune >= PRUNE_INTERVAL):
+            self.last_prune = now
+            deleted = jobs.prune(options['keep_days'])
+            if deleted:
+                self.stdout.write("Deleted %d jobs older than %d days" % (deleted, options['keep_days']))
+
+    def report(self, job, duration, error):
+        jobs.finish(job, duration, error)
+        if error is None:
+            self.stdout.write("%s #%d done in %.3fs" % (job.name, job.pk, duration))
+        else:
+            self.stderr.write("%s #%d failed (attempt %d/%d) in %.3fs:\n%s" % (
+                job.name, job.pk, job.attempts, job.max_attempts, duration, error))
+
+    def run_inline(self, options):
+        while not self.stopping:
+            self.housekeeping(options)
+            claimed = jobs.claim(self.worker, 1, options['lease'])
+            if not claimed:
+                if options['once']:
+                    return
+                time.sleep(options['poll'])
+                continue
+            job = claimed[0]
+            self.report(job, *jobs.execute(job.name, job.kwargs, options['timeout']))
+
+    def new_pool(self, processes):
+        # 用 spawn 而不是 fork，子进程不会继承父进程的数据库连接；子进程先初始化 Django 再接收任务
+        connections.close_all()
+        return ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context('spawn'), initializer=django.setup)
+
+    def kill_pool(self, pool, running, overdue, timeout):
+        """
+        结束子进程中的 SIGALRM 没能中断的任务（阻塞在 C 扩展中、没有 SIGALRM 的平台）：
+        ProcessPoolExecutor 不能单独结束一个子进程，只能结束整个进程池，同一进程池中的其他任务放回队列
+        """
+        for process in list(pool._processes.values()):
+            process.terminate()
+        pool.shutdown(wait=False, cancel_futures=True)
+        for future, (job, started) in running.items():
+            if future in overdue:
+                self.report(job, time.monotonic() - started, "Killed after exceeding the %ds time limit" % timeout)
+            else:
+                jobs.release(job)
+        running.clear()
+
+    def run_pool(self, options):
+        deadline = min(options['timeout'] + KILL_GRACE, options['lease'])
+        pool = self.new_pool(options['processes'])
+        running = {}
+        try:
+            while not (self.stopping and not running):
+                free = options['processes'] - len(running)
+                if free and not self.stopping:
+                    self.housekeeping(options)
+                    for job in jobs.claim(self.worker, free, options['lease']):
+                        future = pool.submit(jobs.execute, job.name, job.kwargs, options['timeout'])
+                        running[future] = (job, time.monotonic())
+                if not running:
+                    if options['once']:
+                        return
+                    time.sleep(options['poll'])
+                    continue
+                done, _ = wait(running, timeout=options['poll'], return_when=FIRST_COMPLETED)
+                broken = False
+                for future in done:
+                    job, started = running.pop(future)
+                    try:
+                        duration, error = future.result()
+                    except BrokenProcessPool as exc:  # 子进程被杀死，进程池不能再用
+                        duration, error = 0.0, repr(exc)
+                        broken = True
+                    self.report(job, duration, error)
+                now = time.monotonic()
+                overdue = {future for future, (job, started) in running.items() if now - started > deadline}
+                if overdue:
+                    self.kill_pool(pool, running, overdue, options['timeout'])
+                    broken = True
+                if broken and not running:
+                    pool.shutdown()
+                    pool = self.new_pool(options['processes'])
+        finally:
+            pool.shutdown()
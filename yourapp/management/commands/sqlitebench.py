@@ -0,0 +1,94 @@
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from yourapp.db.sqlite3.base import DEFAULT_PRAGMAS, apply_pragmas
+
+SCHEMA = """
+CREATE TABLE documents (id INTEGER PRIMARY KEY AUTOINCREMENT, owner_id INTEGER, title TEXT, uploaded_at REAL);
+CREATE INDEX documents_owner ON documents (owner_id, uploaded_at);
+"""
+
+
+def _connect(path, tuned):
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    if tuned:
+        apply_pragmas(conn, DEFAULT_PRAGMAS)
+    return conn
+
+
+def _writer(path, tuned, writes, worker):
+    """模拟上传/注册：每个事务插入一行文档并读取该用户的文档数"""
+    conn = _connect(path, tuned)
+    begin = 'BEGIN IMMEDIATE' if tuned else 'BEGIN'
+    for i in range(writes):
+        conn.execute(begin)
+        conn.execute('INSERT INTO documents (owner_id, title, uploaded_at) VALUES (?, ?, ?)',
+                     (worker, 'doc %d' % i, time.time()))
+        conn.execute('SELECT COUNT(*) FROM documents WHERE owner_id = ?', (worker,)).fetchone()
+        conn.execute('COMMIT')
+    conn.close()
+
+
+def _reader(path, tuned):
+    """模拟页面浏览：不停地按用户查询最新文档，直到写入结束后被终止"""
+    conn = _connect(path, tuned)
+    if tuned:
+        conn.execute('PRAGMA query_only = ON')
+    reads = 0
+    while True:
+        conn.execute('SELECT id, title FROM documents WHERE owner_id = ? ORDER BY uploaded_at DESC LIMIT 20',
+                     (reads % 8,)).fetchall()
+        reads += 1
+
+
+class Command(BaseCommand):
+    help = "SQLite 并发基准测试：比较默认配置与 WAL+调优PRAGMA 下的写入吞吐量（使用临时数据库，不影响项目数据）"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4, help="并发写入进程数（模拟gunicorn worker）")
+        parser.add_argument('--readers', type=int, default=2, help="同时运行的只读进程数")
+        parser.add_argument('--writes', type=int, default=200, help="每个写入进程的事务数")
+
+    def run(self, tuned, options):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'bench.sqlite3')
+        conn = _connect(path, tuned)
+        conn.executescript(SCHEMA)
+        conn.close()
+
+        writers = [
+            multiprocessing.Process(target=_writer, args=(path, tuned, options['writes'], worker))
+            for worker in range(options['writers'])
+        ]
+        readers = [
+            multiprocessing.Process(target=_reader, args=(path, tuned))
+            for _ in range(options['readers'])
+        ]
+        start = time.time()
+        for process in writers + readers:
+            process.start()
+        for process in writers:
+            process.join()
+        elapsed = time.time() - start
+        for process in readers:
+            process.terminate()
+        for process in readers:
+            process.join()
+
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+        return options['writers'] * options['writes'] / elapsed, elapsed
+
+    def handle(self, *args, **options):
+        results = {}
+        for label, tuned in (("默认配置 (rollback journal)", False), ("WAL + 调优PRAGMA", True)):
+            throughput, elapsed = self.run(tuned, options)
+            results[tuned] = throughput
+            self.stdout.write("%-28s %8.1f 写事务/秒  (%.2f 秒)" % (label, throughput, elapsed))
+        self.stdout.write(self.style.SUCCESS("写入吞吐量提升 %.1f 倍" % (results[True] / results[False])))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from yourapp.warmup import format_report, warm_up
+
+
+class Command(BaseCommand):
+    help = "执行与 worker 启动时相同的预热（模板、翻译目录、URL 解析器、表单），输出每个阶段预热前后的耗时"
+
+    def handle(self, *args, **options):
+        for line in format_report(warm_up()):
+            self.stdout.write(line)
@@ -0,0 +1,251 @@
+"""
+请求指标：按视图和语言统计耗时、SQL 数量和耗时、模板渲染时间、上传字节数和翻译查找次数
+
+每个 worker 在内存中累加，最多每 FLUSH_INTERVAL 秒把自己的累计值原子地写入
+METRICS_DIR/<pid>.json；/metrics/ 读取所有 worker 的文件求和，输出 Prometheus 文本格式。
+已退出的 worker 的数据在读取时合并进 retired.json，计数器不会因为重启 worker 而减少。
+"""
+import atexit
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.utils import translation
+from django.utils.translation import trans_real
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+FLUSH_INTERVAL = 1.0
+RETIRED_NAME = 'retired.json'
+LOCK_NAME = '.lock'
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# 指标名 -> (类型, 说明)；除 request_duration 的桶以外，标签都是 (view, language)
+METRICS = {
+    'django_http_requests_total': ('counter', 'Requests by view, language and status code.'),
+    'django_http_request_duration_seconds': ('histogram', 'Wall time spent in Django per request.'),
+    'django_db_queries_total': ('counter', 'Database queries executed.'),
+    'django_db_query_duration_seconds_total': ('counter', 'Time spent executing database queries.'),
+    'django_template_render_seconds_total': ('counter', 'Time spent rendering templates.'),
+    'django_upload_bytes_total': ('counter', 'Bytes received in multipart request bodies.'),
+    'django_gettext_lookups_total': ('counter', 'gettext/ngettext lookups.'),
+}
+
+# 当前请求的计数器，DB、模板和翻译的钩子通过它找到所属的请求（ASGI 下 sync_to_async 也会带上）
+current = contextvars.ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    __slots__ = ('start', 'queries', 'query_time', 'render_time', 'gettext_lookups')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.query_time = 0.0
+        self.render_time = 0.0
+        self.gettext_lookups = 0
+
+
+class Registry:
+    """本进程的累计值：{(指标名, 标签...): 数值}"""
+
+    def __init__(self):
+        self.values = {}
+        self.lock = threading.Lock()
+        self.last_flush = 0.0
+
+    def record(self, view, language, status, metrics, duration, upload_bytes):
+        bucket = next((i for i, bound in enumerate(DURATION_BUCKETS) if duration <= bound), len(DURATION_BUCKETS))
+        labels = (view, language)
+        with self.lock:
+            values = self.values
+            for key, amount in (
+                (('django_http_requests_total', view, language, str(status)), 1),
+                (('django_http_request_duration_seconds_bucket', view, language, bucket), 1),
+                (('django_http_request_duration_seconds_sum',) + labels, duration),
+                (('django_db_queries_total',) + labels, metrics.queries),
+                (('django_db_query_duration_seconds_total',) + labels, metrics.query_time),
+                (('django_template_render_seconds_total',) + labels, metrics.render_time),
+                (('django_upload_bytes_total',) + labels, upload_bytes),
+                (('django_gettext_lookups_total',) + labels, metrics.gettext_lookups),
+            ):
+                values[key] = values.get(key, 0) + amount
+
+    def clear(self):
+        with self.lock:
+            self.values.clear()
+
+    def flush(self, force=False):
+        now = time.monotonic()
+        if not force and now - self.last_flush < FLUSH_INTERVAL:
+            return
+        self.last_flush = now
+        with self.lock:
+            snapshot = [list(key) + [value] for key, value in self.values.items()]
+        directory = settings.METRICS_DIR
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, '%d.json' % os.getpid())
+        # 多个线程可能同时写入，每个线程使用自己的临时文件
+        tmp = '%s.%d.tmp' % (path, threading.get_ident())
+        with open(tmp, 'w') as fp:
+            json.dump(snapshot, fp)
+        os.replace(tmp, path)
+
+
+registry = Registry()
+_thread_lock = threading.Lock()
+atexit.register(lambda: registry.values and registry.flush(force=True))
+
+
+def _load(path):
+    try:
+        with open(path) as fp:
+            return json.load(fp)
+    except (FileNotFoundError, ValueError):
+        return []
+
+
+def _merge(totals, snapshot):
+    for *key, value in snapshot:
+        key = tuple(key)
+        totals[key] = totals.get(key, 0) + value
+
+
+def _pid_alive(pid):
+    if fcntl is None:
+        return True  # Windows 上 os.kill(pid, 0) 会结束进程，不合并已退出 worker 的数据
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+@contextlib.contextmanager
+def _collect_lock(directory):
+    """合并 retired.json 时互斥（进程之间用 flock）；没有 fcntl 的平台只在当前进程内互斥"""
+    if fcntl is None:
+        with _thread_lock:
+            yield
+        return
+    with open(os.path.join(directory, LOCK_NAME), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def collect():
+    """所有 worker（包括已退出的）的累计值之和"""
+    registry.flush(force=True)
+    directory = settings.METRICS_DIR
+    totals = {}
+    with _collect_lock(directory):
+        retired_path = os.path.join(directory, RETIRED_NAME)
+        retired = {}
+        _merge(retired, _load(retired_path))
+        retired_changed = False
+        for entry in os.scandir(directory):
+            name, ext = os.path.splitext(entry.name)
+            if ext != '.json' or not name.isdigit():
+                continue
+            snapshot = _load(entry.path)
+            if _pid_alive(int(name)):
+                _merge(totals, snapshot)
+            else:
+                _merge(retired, snapshot)
+                os.remove(entry.path)
+                retired_changed = True
+        if retired_changed:
+            with open(retired_path + '.tmp', 'w') as fp:
+                json.dump([list(key) + [value] for key, value in retired.items()], fp)
+            os.replace(retired_path + '.tmp', retired_path)
+    for key, value in retired.items():
+        totals[key] = totals.get(key, 0) + value
+    return totals
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(view, language, **extra):
+    pairs = [('view', view), ('language', language)] + list(extra.items())
+    return '{%s}' % ','.join('%s="%s"' % (name, _escape(value)) for name, value in pairs)
+
+
+def render_prometheus(totals):
+    """Prometheus 文本格式（version 0.0.4）"""
+    by_name = {}
+    for key, value in totals.items():
+        by_name.setdefault(key[0], []).append((key[1:], value))
+
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines.append('# HELP %s %s' % (name, help_text))
+        lines.append('# TYPE %s %s' % (name, kind))
+        if kind == 'histogram':
+            buckets = {}
+            for (view, language, bucket), value in by_name.get(name + '_bucket', []):
+                buckets.setdefault((view, language), [0] * (len(DURATION_BUCKETS) + 1))[bucket] += value
+            sums = {tuple(labels): value for labels, value in by_name.get(name + '_sum', [])}
+            for (view, language), counts in sorted(buckets.items()):
+                cumulative = 0
+                for bound, count in zip(DURATION_BUCKETS + ('+Inf',), counts):
+                    cumulative += count
+                    lines.append('%s_bucket%s %d' % (name, _labels(view, language, le=bound), cumulative))
+                lines.append('%s_sum%s %r' % (name, _labels(view, language), sums.get((view, language), 0)))
+                lines.append('%s_count%s %d' % (name, _labels(view, language), cumulative))
+        elif name == 'django_http_requests_total':
+            for (view, language, status), value in sorted(by_name.get(name, [])):
+                lines.append('%s%s %d' % (name, _labels(view, language, status=status), value))
+        else:
+            for (view, language), value in sorted(by_name.get(name, [])):
+                lines.append('%s%s %r' % (name, _labels(view, language), value))
+    return '\n'.join(lines) + '\n'
+
+
+def _record_query(execute, sql, params, many, context):
+    metrics = current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.query_time += time.perf_counter() - start
+
+
+def _install_query_hook(sender, connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+def _counted(function):
+    def wrapper(*args, **kwargs):
+        metrics = current.get()
+        if metrics is not None:
+            metrics.gettext_lookups += 1
+        return function(*args, **kwargs)
+    wrapper.__wrapped__ = function
+    return wrapper
+
+
+def install():
+    """启动时安装 DB 查询和翻译查找的钩子（模板渲染由 yourapp.template_backend 统计）"""
+    connection_created.connect(_install_query_hook, dispatch_uid='yourapp.metrics')
+    # pgettext/npgettext 内部调用的是这两个函数，不会重复计数
+    for name in ('gettext', 'ngettext'):
+        function = getattr(trans_real, name)
+        if not hasattr(function, '__wrapped__'):
+            setattr(trans_real, name, _counted(function))
+    translation._trans.__dict__.clear()  # 让已经缓存的函数引用重新指向 trans_real
@@ -0,0 +1,297 @@
+import hashlib
+import re
+import time
+from functools import lru_cache, wraps
+
+from asgiref.sync import iscoroutinefunction
+
+from django.conf import settings
+from django.conf.urls.i18n import is_language_prefix_patterns_used
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.middleware.locale import LocaleMiddleware as DjangoLocaleMiddleware
+from django.utils import translation
+from django.utils.cache import cc_delim_re, get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.translation import trans_real
+
+from .metrics import RequestMetrics, current, registry
+from .translation import catalog_version
+
+# 缓存的页面中 CSRF token 被替换成占位符，命中时再换成当前请求的 token
+CSRF_PLACEHOLDER = b'__PAGE_CACHE_CSRF_TOKEN__'
+csrf_input_re = re.compile(rb'name="csrfmiddlewaretoken" value="([^"]+)"')
+
+# 语言协商结果的缓存大小：客户端发来的 Accept-Language 取值种类很少，超出时按 LRU 淘汰
+LANGUAGE_CACHE_SIZE = 256
+
+
+def cache_anonymous_page(view_func):
+    """标记视图的匿名访问结果可以被 PageCacheMiddleware 按语言缓存（同步、异步视图均可）"""
+    if iscoroutinefunction(view_func):
+        async def _view_wrapper(request, *args, **kwargs):
+            return await view_func(request, *args, **kwargs)
+    else:
+        def _view_wrapper(request, *args, **kwargs):
+            return view_func(request, *args, **kwargs)
+
+    _view_wrapper.page_cacheable = True
+    return wraps(view_func)(_view_wrapper)
+
+
+def switchable(view_func):
+    """
+    标记视图可以在切换语言时由 yourapp.views.switch_language 直接调用，取出新语言下的页面主体
+    只用于 GET 没有副作用（不写数据、不添加消息）且不依赖视图之外的中间件的页面；没有标记的页面整页重新加载
+    """
+    view_func.language_switchable = True
+    return view_func
+
+
+def page_cache_key(request):
+    """缓存键：翻译版本 + 当前语言 + 登录状态 + 完整URL"""
+    url = hashlib.md5(request.build_absolute_uri().encode('utf-8')).hexdigest()
+    auth = 'auth' if request.user.is_authenticated else 'anon'
+    return 'page:%s:%s:%s:%s' % (catalog_version(), request.LANGUAGE_CODE, auth, url)
+
+
+def get_cached_page(key):
+    """先查进程内LRU，未命中再查各worker共享的磁盘层，并回填到进程内"""
+    entry = caches['pages_local'].get(key)
+    if entry is None:
+        entry = caches['pages'].get(key)
+        if entry is not None:
+            caches['pages_local'].set(key, entry)
+    return entry
+
+
+def set_cached_page(key, entry):
+    caches['pages_local'].set(key, entry)
+    caches['pages'].set(key, entry)
+
+
+class PageCacheMiddleware(MiddlewareMixin):
+    """
+    匿名用户的整页缓存，必须放在 LocaleMiddleware 和 AuthenticationMiddleware 之后
+    只缓存用 @cache_anonymous_page 标记过的视图，并支持 ETag/304 条件请求
+    """
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method not in ('GET', 'HEAD') or not getattr(view_func, 'page_cacheable', False):
+            return None
+        if request.user.is_authenticated:
+            return None
+        key = page_cache_key(request)
+        entry = get_cached_page(key)
+        if entry is None:
+            if request.method == 'GET':
+                request._page_cache_key = key  # 由 process_response 写入缓存
+            return None
+
+        content = entry['content']
+        if CSRF_PLACEHOLDER in content:
+            content = content.replace(CSRF_PLACEHOLDER, get_token(request).encode('ascii'))
+        response = HttpResponse(content, content_type=entry['content_type'])
+        response['ETag'] = entry['etag']
+        return get_conditional_response(request, etag=entry['etag'], response=response)
+
+    def process_response(self, request, response):
+        key = getattr(request, '_page_cache_key', None)
+        if key is None or response.status_code != 200 or response.streaming or response.cookies:
+            return response
+
+        content = response.content
+        match = csrf_input_re.search(content)
+        if match:
+            content = content.replace(match.group(1), CSRF_PLACEHOLDER)
+        # 页面中的 CSRF token 每次不同，所以使用弱 ETag
+        etag = 'W/"%s"' % hashlib.md5(content + key.encode('utf-8')).hexdigest()
+        set_cached_page(key, {
+            'content': content,
+            'content_type': response['Content-Type'],
+            'etag': etag,
+        })
+        response['ETag'] = etag
+        return get_conditional_response(request, etag=etag, response=response)
+
+
+
+@lru_cache(maxsize=LANGUAGE_CACHE_SIZE)
+def language_from_cookie(lang_code):
+    """语言 cookie 的值对应的语言，不可用时返回 None"""
+    if lang_code in trans_real.get_languages() and trans_real.check_for_language(lang_code):
+        return lang_code
+    try:
+        return trans_real.get_supported_language_variant(lang_code)
+    except LookupError:
+        return None
+
+
+@lru_cache(maxsize=LANGUAGE_CACHE_SIZE)
+def language_from_accept_header(accept):
+    """Accept-Language 请求头对应的语言，都不支持时使用 LANGUAGE_CODE"""
+    for accept_lang, unused in trans_real.parse_accept_lang_header(accept):
+        if accept_lang == '*':
+            break
+        if not trans_real.language_code_re.search(accept_lang):
+            continue
+        try:
+            return trans_real.get_supported_language_variant(accept_lang)
+        except LookupError:
+            continue
+    try:
+        return trans_real.get_supported_language_variant(settings.LANGUAGE_CODE)
+    except LookupError:
+        return settings.LANGUAGE_CODE
+
+
+@receiver(setting_changed)
+def clear_language_caches(*, setting, **kwargs):
+    if setting in ('LANGUAGES', 'LANGUAGE_CODE', 'LOCALE_PATHS'):
+        language_from_cookie.cache_clear()
+        language_from_accept_header.cache_clear()
+
+
+def get_language_from_request(request, check_path=False):
+    """与 django.utils.translation.get_language_from_request 的判断顺序和结果完全相同，只是每一步都查缓存"""
+    if check_path:
+        lang_code = translation.get_language_from_path(request.path_info)
+        if lang_code is not None:
+            return lang_code
+    lang_code = request.COOKIES.get(settings.LANGUAGE_COOKIE_NAME)
+    if lang_code is not None:
+        language = language_from_cookie(lang_code)
+        if language is not None:
+            return language  # cookie 有效时不再解析 Accept-Language
+    return language_from_accept_header(request.META.get('HTTP_ACCEPT_LANGUAGE', ''))
+
+
+def set_language_cookie(response, language):
+    """与 django.views.i18n.set_language 写入相同的语言 cookie"""
+    response.set_cookie(
+        settings.LANGUAGE_COOKIE_NAME, language,
+        max_age=settings.LANGUAGE_COOKIE_AGE,
+        path=settings.LANGUAGE_COOKIE_PATH,
+        domain=settings.LANGUAGE_COOKIE_DOMAIN,
+        secure=settings.LANGUAGE_COOKIE_SECURE,
+        httponly=settings.LANGUAGE_COOKIE_HTTPONLY,
+        samesite=settings.LANGUAGE_COOKIE_SAMESITE,
+    )
+
+
+class LocaleMiddleware(DjangoLocaleMiddleware):
+    """
+    django.middleware.locale.LocaleMiddleware 的替代品，行为（包括 Vary 和 Content-Language 响应头）完全相同
+    每个请求只需一两次字典查找，不再重复解析 Accept-Language 和探测翻译目录
+    未使用 i18n_patterns 时跳过 URL 前缀检查
+    请求处理中设置了 request.language_cookie 时（登录时应用用户保存的语言），在响应中写入语言 cookie
+    """
+
+    def process_request(self, request):
+        urlconf = getattr(request, 'urlconf', settings.ROOT_URLCONF)
+        i18n_patterns_used, prefixed_default_language = is_language_prefix_patterns_used(urlconf)
+        language = get_language_from_request(request, check_path=i18n_patterns_used)
+        if (
+            i18n_patterns_used
+            and not prefixed_default_language
+            and not translation.get_language_from_path(request.path_info)
+        ):
+            language = settings.LANGUAGE_CODE
+        translation.activate(language)
+        request.LANGUAGE_CODE = translation.get_language()
+
+    def process_response(self, request, response):
+        language = getattr(request, 'language_cookie', None)
+        if language is not None:
+            set_language_cookie(response, language)
+        urlconf = getattr(request, 'urlconf', settings.ROOT_URLCONF)
+        if is_language_prefix_patterns_used(urlconf)[0]:
+            return super().process_response(request, response)
+        patch_vary_headers(response, ('Accept-Language',))
+        response.headers.setdefault('Content-Language', translation.get_language())
+        return response
+
+
+def is_public_request(request, view_func):
+    """
+    LOCALE_URLS 开启时，匿名用户对带语言前缀的公开页面（@cache_anonymous_page）的 GET 请求：
+    没有会话和消息 cookie，响应只取决于 URL，可以由反向代理缓存
+    """
+    return (
+        settings.LOCALE_URLS
+        and request.method in ('GET', 'HEAD')
+        and getattr(view_func, 'page_cacheable', False)
+        and settings.SESSION_COOKIE_NAME not in request.COOKIES
+        and CookieStorage.cookie_name not in request.COOKIES
+        and translation.get_language_from_path(request.path_info) is not None
+    )
+
+
+class PublicCacheMiddleware(MiddlewareMixin):
+    """
+    公开页面的代理缓存（LOCALE_URLS）。必须放在 SessionMiddleware 之前，process_response 在会话、CSRF
+    中间件之后执行：
+    - 匿名、没有会话 cookie 的请求（is_public_request）页面中不输出 CSRF token（见 yourapp.context_processors），
+      响应没有设置 cookie 时改为 Cache-Control: public，并去掉 Vary 中的 Cookie 和 Accept-Language
+      （语言已经由 URL 决定，有会话 cookie 的请求由 nginx 绕过缓存，见 README）
+    - 同一页面的其他响应（已登录等）标记为 private，代理不会缓存
+    """
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if is_public_request(request, view_func):
+            request.public_cacheable = True
+        elif settings.LOCALE_URLS and getattr(view_func, 'page_cacheable', False):
+            request.public_cacheable = False
+
+    def process_response(self, request, response):
+        public = getattr(request, 'public_cacheable', None)
+        if public is None:
+            return response
+        if public and response.status_code == 200 and not response.streaming and not response.cookies:
+            # 登录页面的 never_cache 也一并替换，页面中没有 CSRF token，可以缓存
+            response.headers.pop('Expires', None)
+            response['Cache-Control'] = 'public, max-age=%d' % settings.PUBLIC_CACHE_SECONDS
+            vary = [field for field in cc_delim_re.split(response.get('Vary', ''))
+                    if field and field.lower() not in ('cookie', 'accept-language')]
+            if vary:
+                response['Vary'] = ', '.join(vary)
+            else:
+                response.headers.pop('Vary', None)
+        else:
+            patch_cache_control(response, private=True)
+        return response
+
+
+class MetricsMiddleware(MiddlewareMixin):
+    """
+    按视图和语言记录请求指标（见 yourapp.metrics），放在 MIDDLEWARE 的最前面以包含其他中间件的耗时
+    每个请求只是几次计数器累加，可以在生产环境一直开启
+    """
+
+    def process_request(self, request):
+        request._metrics = RequestMetrics()
+        current.set(request._metrics)
+
+    def process_response(self, request, response):
+        metrics = getattr(request, '_metrics', None)
+        if metrics is None:
+            return response
+        current.set(None)
+        match = request.resolver_match
+        upload_bytes = 0
+        if request.content_type == 'multipart/form-data':
+            upload_bytes = int(request.META.get('CONTENT_LENGTH') or 0)
+        registry.record(
+            match.view_name if match else 'unresolved',
+            getattr(request, 'LANGUAGE_CODE', settings.LANGUAGE_CODE),
+            response.status_code,
+            metrics,
+            time.perf_counter() - metrics.start,
+            upload_bytes,
+        )
+        registry.flush()
+        return response
@@ -0,0 +1,43 @@
+from django.db import models
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+
+class Job(models.Model):
+    """后台任务队列中的一个任务（yourapp/jobs.py），由 manage.py runjobs 领取执行"""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, _('Queued')),
+        (RUNNING, _('Running')),
+        (DONE, _('Done')),
+        (FAILED, _('Failed')),
+    ]
+
+    name = models.CharField(max_length=200, verbose_name=_('Task'))  # 任务函数的导入路径
+    kwargs = models.JSONField(default=dict, verbose_name=_('Arguments'))
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED, verbose_name=_('Status'))
+    attempts = models.PositiveIntegerField(default=0, verbose_name=_('Attempts'))
+    max_attempts = models.PositiveIntegerField(default=5, verbose_name=_('Max Attempts'))
+    run_after = models.DateTimeField(default=timezone.now, verbose_name=_('Run After'))
+    # 租约：worker 领取任务时写入自己的标识和到期时间，到期仍未完成的任务可以被重新领取
+    locked_by = models.CharField(max_length=100, blank=True, verbose_name=_('Locked By'))
+    locked_until = models.DateTimeField(null=True, blank=True, verbose_name=_('Locked Until'))
+    last_error = models.TextField(blank=True, verbose_name=_('Last Error'))
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('Created At'))
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name=_('Started At'))
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name=_('Finished At'))
+    duration = models.FloatField(null=True, blank=True, verbose_name=_('Duration (s)'))  # 最后一次执行的耗时
+
+    class Meta:
+        verbose_name = _('Job')
+        verbose_name_plural = _('Jobs')
+        indexes = [
+            # worker 按 (status, run_after) 查找可以领取的任务
+            models.Index(fields=['status', 'run_after'], name='yourapp_job_ready_idx'),
+        ]
+
+    def __str__(self):
+        return '%s #%s (%s)' % (self.name, self.pk, self.status)
@@ -0,0 +1,61 @@
+import functools
+import mimetypes
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+from .jscatalog import STATIC_PREFIX, load_manifest
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'public, max-age=0, must-revalidate'
+# 按优先级排列的预压缩版本（yourapp.storage 在 collectstatic 时生成）
+PRECOMPRESSED = (
+    ('br', '.br', re.compile(r'\bbr\b')),
+    ('gzip', '.gz', re.compile(r'\bgzip\b')),
+)
+
+
+@functools.lru_cache
+def hashed_names():
+    """文件名带内容哈希、可以永久缓存的静态文件"""
+    names = set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+    names.update(STATIC_PREFIX + filename for filename in load_manifest().values())
+    return frozenset(names)
+
+
+def serve_static(request, path):
+    """
+    没有 nginx 时的静态文件兜底（与 nginx 的 gzip_static/brotli_static 配置效果相同）：
+    客户端支持时发送预压缩的 .br/.gz 文件，带内容哈希的文件永久缓存，其他文件每次协商
+    """
+    fullpath = Path(safe_join(settings.STATIC_ROOT, path))
+    if not fullpath.is_file() or fullpath.suffix in ('.br', '.gz'):
+        raise Http404("File not found")
+    content_type = mimetypes.guess_type(fullpath.name)[0] or 'application/octet-stream'
+
+    served, content_encoding = fullpath, None
+    accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    for encoding, suffix, accept_re in PRECOMPRESSED:
+        candidate = fullpath.with_name(fullpath.name + suffix)
+        if accept_re.search(accept_encoding) and candidate.is_file():
+            served, content_encoding = candidate, encoding
+            break
+
+    mtime = fullpath.stat().st_mtime
+    if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), mtime):
+        response = HttpResponseNotModified()
+    else:
+        response = FileResponse(served.open('rb'), content_type=content_type, filename=fullpath.name)
+        response['Last-Modified'] = http_date(mtime)
+        if content_encoding:
+            response['Content-Encoding'] = content_encoding
+    patch_vary_headers(response, ('Accept-Encoding',))
+    response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if path in hashed_names() else REVALIDATE_CACHE_CONTROL
+    return response
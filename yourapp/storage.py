@@ -0,0 +1,100 @@
+"""
+collectstatic 使用的静态文件存储
+
+在 ManifestStaticFilesStorage（文件名加内容哈希，写入 staticfiles.json）的基础上：
+- 检查 TEMPLATES 目录中所有 {% static '...' %} 引用的文件都存在，拼错的文件名在部署时就报错
+- 为文本类文件并行生成 gzip 和 brotli 压缩版本，由 nginx（gzip_static/brotli_static）
+  或 yourapp.static.serve_static 直接发送，运行时不再压缩
+"""
+import gzip
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import brotli
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+COMPRESSED_SUFFIXES = ('.br', '.gz')
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.json', '.map', '.svg', '.txt', '.html', '.xml', '.ico', '.ttf', '.otf', '.eot'}
+MIN_COMPRESS_SIZE = 256  # 太小的文件压缩后反而更大
+static_tag_re = re.compile(r"""{%\s*static\s+(['"])(?P<name>[^'"]+)\1""")
+
+
+def _gzip(data):
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def _brotli(data):
+    return brotli.compress(data, quality=11)
+
+
+def compress_file(path):
+    """生成 path.br 和 path.gz（已是最新的跳过，压缩后没有变小的不保存），返回新生成的文件数"""
+    with open(path, 'rb') as fp:
+        data = fp.read()
+    mtime = os.path.getmtime(path)
+    written = 0
+    for suffix, compress in (('.br', _brotli), ('.gz', _gzip)):
+        target = path + suffix
+        if os.path.exists(target) and os.path.getmtime(target) >= mtime:
+            continue
+        compressed = compress(data)
+        if len(compressed) >= len(data):
+            if os.path.exists(target):
+                os.remove(target)
+            continue
+        with open(target + '.tmp', 'wb') as fp:
+            fp.write(compressed)
+        os.replace(target + '.tmp', target)
+        written += 1
+    return written
+
+
+def template_static_references():
+    """TEMPLATES 的 DIRS 中用字符串字面量引用的静态文件，返回 [(模板路径, 文件名)]"""
+    references = []
+    for engine in settings.TEMPLATES:
+        for directory in engine.get('DIRS', []):
+            for root, dirs, files in os.walk(directory):
+                for filename in files:
+                    if not filename.endswith(('.html', '.txt', '.js')):
+                        continue
+                    path = os.path.join(root, filename)
+                    with open(path, encoding='utf-8') as fp:
+                        for match in static_tag_re.finditer(fp.read()):
+                            references.append((os.path.relpath(path, directory), match.group('name')))
+    return references
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    compress_workers = None  # 默认使用全部CPU核
+
+    def missing_template_references(self):
+        return [
+            (template, name) for template, name in template_static_references()
+            if self.hash_key(self.clean_name(name)) not in self.hashed_files
+        ]
+
+    def compress(self, names):
+        paths = []
+        for name in names:
+            if os.path.splitext(name)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+                continue
+            path = self.path(name)
+            if os.path.getsize(path) >= MIN_COMPRESS_SIZE:
+                paths.append(path)
+        with ProcessPoolExecutor(max_workers=self.compress_workers) as pool:
+            return sum(pool.map(compress_file, paths, chunksize=16))
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        missing = self.missing_template_references()
+        if missing:
+            yield 'templates', None, ValueError(
+                "模板引用了不存在的静态文件：\n" + '\n'.join('  %s: %s' % item for item in missing)
+            )
+            return
+        self.compress(set(paths) | set(self.hashed_files.values()))
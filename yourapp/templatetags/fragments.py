@@ -0,0 +1,45 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from ..fragments import (
+    CSRF_PLACEHOLDER, FragmentRequest, fill_fragment, fragment_cache_key, get_fragment, set_fragment,
+)
+
+register = template.Library()
+
+
+class CacheFragmentNode(template.Node):
+    def __init__(self, name, nodelist):
+        self.name = name
+        self.nodelist = nodelist
+
+    def render(self, context):
+        request = context.get('request')
+        if request is None or not hasattr(request, 'user'):
+            return self.nodelist.render(context)  # 没有请求上下文（如错误页面），不缓存
+        csrf_token = context.get('csrf_token')
+        key = fragment_cache_key(self.name, request, csrf_token)
+        content = get_fragment(key)
+        if content is None:
+            overrides = {'request': FragmentRequest(request)}
+            if csrf_token and csrf_token != 'NOTPROVIDED':
+                overrides['csrf_token'] = CSRF_PLACEHOLDER
+            with context.push(**overrides):
+                content = str(self.nodelist.render(context))
+            set_fragment(key, content)
+        return mark_safe(fill_fragment(content, request, csrf_token))
+
+
+@register.tag
+def cachefragment(parser, token):
+    """
+    缓存一段与用户无关的模板片段，按语言、登录状态和请求路径区分；
+    片段中的 {% csrf_token %} 和 request.get_full_path 在每次请求时替换为当前的值
+    用法：{% cachefragment "chrome" %}...{% endcachefragment %}
+    """
+    bits = token.split_contents()
+    if len(bits) != 2 or bits[1][0] not in '"\'' or bits[1][0] != bits[1][-1]:
+        raise template.TemplateSyntaxError("%r tag requires a quoted fragment name" % bits[0])
+    nodelist = parser.parse(('endcachefragment',))
+    parser.delete_first_token()
+    return CacheFragmentNode(bits[1][1:-1], nodelist)
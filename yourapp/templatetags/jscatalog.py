@@ -0,0 +1,16 @@
+from django import template
+from django.utils.html import format_html
+
+from ..jscatalog import catalog_url
+
+register = template.Library()
+
+
+@register.simple_tag
+def js_catalog():
+    """
+    输出当前语言的前端翻译目录 <script>，提供 gettext/ngettext/interpolate 等函数
+    优先使用 compilejscatalogs 生成的静态文件，没有生成时退回 JavaScriptCatalog 视图
+    用法：{% js_catalog %}
+    """
+    return format_html('<script src="{}"></script>', catalog_url())
@@ -0,0 +1,326 @@
+import gettext
+import io
+import json
+import os
+import shutil
+import signal
+import tempfile
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone, translation
+
+from accounts.models import CustomUser
+from accounts.tests import isolate_pages
+
+from . import i18n, jobs, metrics
+from .jscatalog import catalog_url
+from .models import Job
+
+CALLS = []
+
+
+@jobs.task
+def record(value):
+    CALLS.append(value)
+
+
+@jobs.task
+def explode():
+    raise ValueError('boom')
+
+
+@jobs.task
+def sleep(seconds, ignore_alarm=False):
+    if ignore_alarm:  # 模拟 SIGALRM 不能中断的任务
+        signal.signal(signal.SIGALRM, signal.SIG_IGN)
+    time.sleep(seconds)
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        CALLS.clear()
+
+    def enqueue(self, **kwargs):
+        return jobs.enqueue(record.job_name, value=1, **kwargs)
+
+    def expire_lease(self, job):
+        Job.objects.filter(pk=job.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+
+    def test_claim_takes_due_jobs_once(self):
+        first = self.enqueue()
+        second = self.enqueue()
+        self.enqueue(run_after=timezone.now() + timedelta(hours=1))
+        claimed = jobs.claim('a', 10)
+        self.assertEqual([job.pk for job in claimed], [first.pk, second.pk])
+        self.assertEqual(jobs.claim('b', 10), [])
+        job = Job.objects.get(pk=first.pk)
+        self.assertEqual((job.status, job.attempts), (Job.RUNNING, 1))
+        self.assertTrue(job.locked_by.startswith('a/'))
+        self.assertGreater(job.locked_until, timezone.now())
+
+    def test_claim_respects_limit(self):
+        for n in range(3):
+            self.enqueue()
+        self.assertEqual(len(jobs.claim('a', 2)), 2)
+        self.assertEqual(len(jobs.claim('b', 2)), 1)
+
+    def test_expired_lease_reclaimed_and_old_worker_cannot_finish(self):
+        self.enqueue()
+        [stale] = jobs.claim('a', 1)
+        self.expire_lease(stale)
+        [job] = jobs.claim('b', 1)
+        self.assertEqual(job.attempts, 2)
+        self.assertEqual(jobs.finish(stale, 0.1), 0)  # 租约已经属于 b
+        self.assertEqual(jobs.finish(job, 0.1), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_until), (Job.DONE, None))
+
+    def test_failure_retried_with_backoff_then_failed(self):
+        job = jobs.enqueue(explode.job_name, max_attempts=2)
+        [job] = jobs.claim('a', 1)
+        duration, error = jobs.execute(job.name, job.kwargs)
+        self.assertIn('ValueError: boom', error)
+        with mock.patch('random.uniform', return_value=1.0):
+            jobs.finish(job, duration, error)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertAlmostEqual((job.run_after - timezone.now()).total_seconds(), jobs.BACKOFF_BASE, delta=2)
+        self.assertEqual(jobs.claim('a', 1), [])  # 退避时间内不会被领取
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        [job] = jobs.claim('a', 1)
+        jobs.finish(job, *jobs.execute(job.name, job.kwargs))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertIsNotNone(job.finished_at)
+
+    def test_backoff_capped(self):
+        with mock.patch('random.uniform', return_value=1.0):
+            self.assertEqual(jobs.backoff(1), jobs.BACKOFF_BASE)
+            self.assertEqual(jobs.backoff(3), jobs.BACKOFF_BASE * 4)
+            self.assertEqual(jobs.backoff(100), jobs.BACKOFF_MAX)
+
+    def test_expire_abandoned_only_when_attempts_used_up(self):
+        retry = self.enqueue()
+        used_up = self.enqueue(max_attempts=1)
+        jobs.claim('a', 2)
+        self.expire_lease(retry)
+        self.expire_lease(used_up)
+        self.assertEqual(jobs.expire_abandoned(), 1)
+        used_up.refresh_from_db()
+        self.assertEqual((used_up.status, used_up.last_error), (Job.FAILED, 'Lease expired'))
+        self.assertEqual([job.pk for job in jobs.claim('b', 10)], [retry.pk])
+
+    def test_execute_timeout(self):
+        duration, error = jobs.execute(sleep.job_name, {'seconds': 5}, timeout=0.2)
+        self.assertIn('TaskTimeout', error)
+        self.assertLess(duration, 2)
+        self.assertIsNone(jobs.execute(sleep.job_name, {'seconds': 0}, timeout=0.2)[1])
+
+    def test_release_does_not_use_an_attempt(self):
+        self.enqueue()
+        [job] = jobs.claim('a', 1)
+        self.assertEqual(jobs.release(job), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.locked_until), (Job.QUEUED, 0, None))
+
+    def test_prune_old_finished_jobs(self):
+        old = timezone.now() - timedelta(days=jobs.KEEP_DAYS + 1)
+        done = self.enqueue()
+        failed = self.enqueue()
+        recent = self.enqueue()
+        queued = self.enqueue()
+        Job.objects.filter(pk=done.pk).update(status=Job.DONE, finished_at=old)
+        Job.objects.filter(pk=failed.pk).update(status=Job.FAILED, finished_at=old)
+        Job.objects.filter(pk=recent.pk).update(status=Job.DONE, finished_at=timezone.now())
+        Job.objects.filter(pk=queued.pk).update(created_at=old)
+        self.assertEqual(jobs.prune(), 2)
+        self.assertEqual(set(Job.objects.values_list('pk', flat=True)), {recent.pk, queued.pk})
+
+    def test_timeout_not_longer_than_lease(self):
+        with self.assertRaises(CommandError):
+            call_command('runjobs', timeout=400, lease=300, once=True)
+
+    def test_execute_runs_registered_tasks_only(self):
+        self.assertIsNone(jobs.execute(record.job_name, {'value': 7})[1])
+        self.assertEqual(CALLS, [7])
+        duration, error = jobs.execute('os.remove', {'path': '/nonexistent'})
+        self.assertIn('is not a registered task', error)
+
+
+class MetricsTests(TestCase):
+    dead_pid = 2 ** 22 + 1  # 大于 Linux 的 pid_max 上限
+    key = ('django_db_queries_total', 'test_view', 'en')
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.enterContext(override_settings(METRICS_DIR=self.directory))
+
+    def write_worker(self, value):
+        path = os.path.join(self.directory, '%d.json' % self.dead_pid)
+        with open(path, 'w') as fp:
+            json.dump([list(self.key) + [value]], fp)
+        return path
+
+    def test_exited_workers_merged_into_retired(self):
+        path = self.write_worker(3)
+        self.assertEqual(metrics.collect()[self.key], 3)
+        self.assertFalse(os.path.exists(path))
+        self.write_worker(2)  # pid 被新的 worker 重新使用
+        self.assertEqual(metrics.collect()[self.key], 5)
+
+    def test_without_fcntl(self):
+        path = self.write_worker(3)
+        with mock.patch.object(metrics, 'fcntl', None):
+            self.assertEqual(metrics.collect()[self.key], 3)
+        self.assertTrue(os.path.exists(path))  # 不判断进程是否存在，也不合并
+
+
+class RunJobsPoolTests(TransactionTestCase):
+    # 生产配置中事务外的读取发到 read 连接
+    databases = '__all__'
+
+    def test_stuck_task_killed(self):
+        job = jobs.enqueue(sleep.job_name, seconds=60, ignore_alarm=True, max_attempts=1)
+        start = time.monotonic()
+        with mock.patch('signal.signal'):
+            call_command('runjobs', processes=1, timeout=1, lease=5, poll=0.2, once=True,
+                         stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertLess(time.monotonic() - start, 30)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertIn('Killed after exceeding the 1s time limit', job.last_error)
+
+
+PO_HEADER = r'''msgid ""
+msgstr ""
+"Project-Id-Version: test\n"
+"POT-Creation-Date: 2025-01-01 00:00+0000\n"
+"Content-Type: text/plain; charset=UTF-8\n"
+"Plural-Forms: nplurals=1; plural=0;\n"
+'''
+
+
+class MessagesTests(TestCase):
+    def setUp(self):
+        self.project_po = os.path.join(settings.LOCALE_PATHS[0], 'zh_Hans', 'LC_MESSAGES', 'django.po')
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.po = os.path.join(self.root, 'locale', 'zh_Hans', 'LC_MESSAGES', 'django.po')
+        os.makedirs(os.path.dirname(self.po))
+        self.enterContext(override_settings(
+            BASE_DIR=self.root, LOCALE_PATHS=[os.path.join(self.root, 'locale')],
+            I18N_CACHE_DIR=os.path.join(self.root, 'cache', 'i18n'), MEDIA_ROOT=os.path.join(self.root, 'media'),
+        ))
+
+    def write(self, name, content):
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as fp:
+            fp.write(content)
+
+    def catalog(self):
+        with open(self.po[:-3] + '.mo', 'rb') as fp:
+            return gettext.GNUTranslations(fp)
+
+    def test_project_catalog_round_trip(self):
+        # 仓库中的 .po 解析后原样输出，编译结果与提交的 .mo 相同
+        with open(self.project_po, encoding='utf-8') as fp:
+            text = fp.read()
+        entries = i18n.parse_po(text)
+        self.assertEqual(i18n.format_po(entries, i18n._nplurals(entries[0])), text)
+        with open(self.project_po[:-3] + '.mo', 'rb') as fp:
+            self.assertEqual(i18n.compile_mo(entries), fp.read())
+
+    def test_extract_merge_and_compile(self):
+        self.write('app/views.py', (
+            'from django.utils.translation import gettext as _, ngettext, pgettext\n'
+            '# Translators: greeting on the home page\n'
+            'GREETING = _("Hello")\n'
+            'FILES = ngettext("%(n)s file", "%(n)s files", 2)\n'
+            'MONTH = pgettext("month name", "May")\n'
+        ))
+        self.write('templates/home.html', '{% load i18n %}\n<p>{% translate "Welcome" %}</p>\n')
+        self.write('app/tests.py', 'from django.utils.translation import gettext as _\nASSERTED = _("Test only")\n')
+        self.write(self.po, PO_HEADER + (
+            '\n# 保留的译者注释\nmsgid "Hello"\nmsgstr "你好"\n'
+            '\nmsgid "Removed"\nmsgstr "已删除"\n'
+        ))
+        stats = i18n.extract_messages([self.po])
+        self.assertEqual((stats['files'], stats['extracted'], stats['updated']), (2, 2, [self.po]))
+        entries = {entry.key: entry for entry in i18n.parse_po(open(self.po, encoding='utf-8').read())}
+        self.assertNotIn((None, 'Removed'), entries)
+        self.assertNotIn((None, 'Test only'), entries)  # 不提取测试代码
+        hello = entries[None, 'Hello']
+        self.assertEqual((hello.msgstr, hello.comments), ('你好', ['保留的译者注释']))
+        self.assertEqual(hello.extracted, ['Translators: greeting on the home page'])
+        self.assertEqual(hello.references, ['app/views.py:3'])
+        self.assertEqual(entries[None, '%(n)s file'].flags, ['python-format'])
+        self.assertEqual(entries[None, '%(n)s file'].msgstr, [''])  # nplurals=1
+        self.assertIn(('month name', 'May'), entries)
+        self.assertEqual(entries[None, 'Welcome'].references, ['templates/home.html:2'])
+
+        entries[None, 'Welcome'].msgstr = '欢迎'
+        entries[None, '%(n)s file'].msgstr = ['%(n)s 个文件']
+        entries['month name', 'May'].msgstr = '五月'
+        with open(self.po, 'w', encoding='utf-8') as fp:
+            fp.write(i18n.format_po(entries.values(), nplurals=1))
+        written, skipped = i18n.build_messages([self.po])
+        self.assertEqual((written, skipped), ([self.po[:-3] + '.mo'], 0))
+        catalog = self.catalog()
+        self.assertEqual(catalog.gettext('Hello'), '你好')
+        self.assertEqual(catalog.gettext('Welcome'), '欢迎')
+        self.assertEqual(catalog.ngettext('%(n)s file', '%(n)s files', 5), '%(n)s 个文件')
+        self.assertEqual(catalog.pgettext('month name', 'May'), '五月')
+
+        # 没有变化时不重新提取、不改写 .po、不重新编译
+        stats = i18n.extract_messages([self.po])
+        self.assertEqual((stats['extracted'], stats['updated']), (0, []))
+        self.assertEqual(i18n.build_messages([self.po]), ([], 1))
+
+    def test_plural_change_marks_entry_fuzzy(self):
+        old = i18n.parse_po(PO_HEADER + '\nmsgid "%(n)s file"\nmsgstr "%(n)s 个文件"\n')
+        merged = i18n.merge(old, {'a.py': [(None, '%(n)s file', '%(n)s files', 1, [], ['python-format'])]})
+        entry = merged[1]
+        self.assertEqual((entry.msgstr, entry.flags), ([], ['fuzzy', 'python-format']))
+        self.assertNotIn(b'file', i18n.compile_mo(merged))  # fuzzy 条目不编译
+
+
+class SwitchLanguageTests(TestCase):
+    def setUp(self):
+        isolate_pages(self)
+        self.user = CustomUser.objects.create_user('alice', 'alice@example.com', 'pw-12345678x')
+        self.client.force_login(self.user)
+
+    def switch(self, language, next_url):
+        response = self.client.post(reverse('switch_language'), {'language': language, 'next': next_url})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_returns_page_content_in_new_language(self):
+        data = self.switch('en', reverse('profile'))
+        self.assertNotIn('reload', data)
+        self.assertIn('alt="User avatar"', data['fragments']['content'])
+        self.assertNotIn('<!--content-->', data['fragments']['content'])
+        self.assertIn('data-switch-url', data['fragments']['chrome'])
+        with translation.override('en'):
+            self.assertEqual(data['catalog'], catalog_url())
+        data = self.switch('zh-hans', reverse('profile'))
+        self.assertIn('alt="用户头像"', data['fragments']['content'])
+        self.assertEqual(data['title'], 'Django项目测试网站')
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.preferred_language, 'zh-hans')
+
+    def test_reload_when_content_cannot_be_rendered(self):
+        # 没有标记 @switchable 的视图（document_list 等）不直接调用
+        for next_url in ('/admin/', '/no-such-page/', reverse('document_list'), reverse('search_documents') + '?q=x'):
+            with self.subTest(next_url=next_url):
+                data = self.switch('en', next_url)
+                self.assertTrue(data['reload'])
+                self.assertNotIn('content', data['fragments'])
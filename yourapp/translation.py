@@ -0,0 +1,351 @@
+"""
+预编译翻译索引
+
+把 LANGUAGES 中每种语言的全部翻译目录（Django 自带、各 app、LOCALE_PATHS）
+在部署时合并成一个二进制索引文件，运行时各 gunicorn worker 通过 mmap 只读共享，
+不再各自解析 .mo 文件并在内存里保留一份 dict 副本。
+
+索引文件格式：
+    MAGIC | 版本(u32) | 目录长度(u32) | 目录JSON | 各语言的记录表与槽位表 | 字符串区
+每种语言一张开放寻址哈希表（槽位存记录序号+1，0 表示空槽），
+记录为定长结构：哈希、msgid 偏移/长度、译文偏移/长度、复数表达式序号（-1 为单数）。
+"""
+import functools
+import gettext as gettext_module
+import glob
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+
+from django.apps import apps
+from django.conf import settings
+from django.utils.translation import to_language, to_locale, trans_real
+
+MAGIC = b'DJTI'
+VERSION = 1
+HEADER = struct.Struct('<4sII')
+RECORD = struct.Struct('<IIIIIi')  # 哈希, key偏移, key长度, 值偏移, 值长度, 复数表达式序号
+SLOT = struct.Struct('<I')
+PLURAL_SEPARATOR = '\x00'
+DOMAIN = 'django'
+
+
+def catalog_localedirs():
+    """按 DjangoTranslation 的合并顺序返回翻译目录，越靠后优先级越高"""
+    settingsfile = sys.modules[settings.__module__].__file__
+    localedirs = [os.path.join(os.path.dirname(settingsfile), 'locale')]
+    for app_config in reversed(apps.get_app_configs()):
+        localedir = os.path.join(app_config.path, 'locale')
+        if os.path.exists(localedir):
+            localedirs.append(localedir)
+    localedirs.extend(reversed(settings.LOCALE_PATHS))
+    return localedirs
+
+
+def _plural_expression(info):
+    plural_forms = info.get('plural-forms')
+    if not plural_forms:
+        return 'n != 1'
+    return plural_forms.split(';')[1].split('plural=')[1].strip()
+
+
+def collect_catalog(language, localedirs=None):
+    """
+    读取并合并某个语言的所有 .mo 文件（默认是 catalog_localedirs() 中的全部目录，越靠后优先级越高）
+    返回 (单数译文dict, 复数译文dict, 复数表达式列表, 头信息, 源文件列表)
+    """
+    singular = {}
+    plural = {}
+    expressions = []
+    info = None
+    sources = []
+    for localedir in catalog_localedirs() if localedirs is None else localedirs:
+        mofiles = gettext_module.find(DOMAIN, localedir, [to_locale(language)], all=True)
+        # gettext 的查找结果中排在前面的优先，所以倒序合并
+        for mofile in reversed(mofiles):
+            with open(mofile, 'rb') as fp:
+                trans = gettext_module.GNUTranslations(fp)
+            sources.append(os.path.abspath(mofile))
+            if info is None:
+                info = trans._info.copy()  # 和 Django 一样取第一个目录的头信息
+            expression = _plural_expression(trans._info)
+            if expression not in expressions:
+                expressions.append(expression)
+            plural_index = expressions.index(expression)
+            forms = {}
+            for key, value in trans._catalog.items():
+                if isinstance(key, tuple):
+                    forms.setdefault(key[0], {})[key[1]] = value
+                else:
+                    singular[key] = value
+                    plural.pop(key, None)
+            for msgid, values in forms.items():
+                plural[msgid] = (plural_index, [values[i] for i in sorted(values)])
+                singular.pop(msgid, None)
+    return singular, plural, expressions, info or {}, sources
+
+
+def _slot_count(n):
+    size = 8
+    while size < n * 2:
+        size *= 2
+    return size
+
+
+def build_index(path, languages=None):
+    """把 languages（默认 settings.LANGUAGES）的翻译目录编译成索引文件，返回每种语言的条目数"""
+    if languages is None:
+        languages = [code for code, name in settings.LANGUAGES]
+
+    strings = bytearray()
+    tables = []
+    directory = {'languages': {}, 'sources': []}
+    stats = {}
+    for language in languages:
+        singular, plural, expressions, info, sources = collect_catalog(language)
+        entries = [(key, value, -1) for key, value in singular.items()]
+        entries += [(key, PLURAL_SEPARATOR.join(forms), index) for key, (index, forms) in plural.items()]
+
+        records = bytearray()
+        slots = [0] * _slot_count(len(entries))
+        mask = len(slots) - 1
+        for number, (key, value, plural_index) in enumerate(entries):
+            key_bytes = key.encode('utf-8')
+            value_bytes = value.encode('utf-8')
+            key_hash = zlib.crc32(key_bytes)
+            key_offset = len(strings)
+            strings += key_bytes
+            value_offset = len(strings)
+            strings += value_bytes
+            records += RECORD.pack(key_hash, key_offset, len(key_bytes),
+                                   value_offset, len(value_bytes), plural_index)
+            slot = key_hash & mask
+            while slots[slot]:
+                slot = (slot + 1) & mask
+            slots[slot] = number + 1
+        tables.append((language, records, b''.join(SLOT.pack(s) for s in slots)))
+        directory['languages'][language] = {
+            'records': len(entries),
+            'slots': len(slots),
+            'plurals': expressions,
+            'info': info,
+        }
+        directory['sources'].extend(sources)
+        stats[language] = len(entries)
+
+    # 偏移量都相对于数据区起点（目录之后），目录长度不影响偏移
+    offset = 0
+    for language, records, slot_bytes in tables:
+        directory['languages'][language]['records_offset'] = offset
+        offset += len(records)
+        directory['languages'][language]['slots_offset'] = offset
+        offset += len(slot_bytes)
+    directory['strings_offset'] = offset
+    directory_bytes = json.dumps(directory, sort_keys=True).encode('utf-8')
+
+    # 写入临时文件后原子替换，正在运行的 worker 仍映射旧文件，重启后加载新文件
+    tmp_path = '%s.tmp' % path
+    with open(tmp_path, 'wb') as fp:
+        fp.write(HEADER.pack(MAGIC, VERSION, len(directory_bytes)))
+        fp.write(directory_bytes)
+        for language, records, slot_bytes in tables:
+            fp.write(records)
+            fp.write(slot_bytes)
+        fp.write(strings)
+    os.replace(tmp_path, path)
+    return stats
+
+
+class MappedCatalog:
+    """
+    模拟 DjangoTranslation._catalog 的接口（get/__getitem__/__contains__/keys/items/plural），
+    数据直接从 mmap 中读取
+    """
+
+    def __init__(self, buffer, base, strings_offset, section):
+        self._buffer = buffer
+        self._strings_offset = base + strings_offset
+        self._records_offset = base + section['records_offset']
+        self._record_count = section['records']
+        self._slots_offset = base + section['slots_offset']
+        self._mask = section['slots'] - 1
+        self._plurals = [gettext_module.c2py(expression) for expression in section['plurals']]
+
+    def _read(self, offset, length):
+        start = self._strings_offset + offset
+        return self._buffer[start:start + length].decode('utf-8')
+
+    def _record(self, number):
+        return RECORD.unpack_from(self._buffer, self._records_offset + number * RECORD.size)
+
+    def _find(self, msgid):
+        key_bytes = msgid.encode('utf-8')
+        key_hash = zlib.crc32(key_bytes)
+        slot = key_hash & self._mask
+        while True:
+            (number,) = SLOT.unpack_from(self._buffer, self._slots_offset + slot * SLOT.size)
+            if not number:
+                return None
+            record = self._record(number - 1)
+            if record[0] == key_hash and record[2] == len(key_bytes):
+                start = self._strings_offset + record[1]
+                if self._buffer[start:start + record[2]] == key_bytes:
+                    return record
+            slot = (slot + 1) & self._mask
+
+    def _forms(self, record):
+        return self._read(record[3], record[4]).split(PLURAL_SEPARATOR)
+
+    def get(self, key, default=None):
+        if isinstance(key, tuple):
+            # GNUTranslations 用 (msgid, 复数序号) 查复数形式
+            msgid, index = key
+            record = self._find(msgid)
+            if record is None or record[5] < 0:
+                return default
+            forms = self._forms(record)
+            return forms[index] if index < len(forms) else default
+        record = self._find(key)
+        if record is None or record[5] >= 0:
+            return default
+        return self._read(record[3], record[4])
+
+    def __getitem__(self, key):
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        missing = object()
+        return self.get(key, missing) is not missing
+
+    def items(self):
+        for number in range(self._record_count):
+            record = self._record(number)
+            msgid = self._read(record[1], record[2])
+            if record[5] < 0:
+                yield msgid, self._read(record[3], record[4])
+            else:
+                for index, form in enumerate(self._forms(record)):
+                    yield (msgid, index), form
+
+    def keys(self):
+        for key, value in self.items():
+            yield key
+
+    def plural(self, msgid, num):
+        record = self._find(msgid)
+        if record is None or record[5] < 0:
+            raise KeyError
+        forms = self._forms(record)
+        index = self._plurals[record[5]](num)
+        if index >= len(forms):
+            raise KeyError
+        return forms[index]
+
+
+class MappedTranslation(gettext_module.GNUTranslations):
+    """与 DjangoTranslation 行为一致，但译文来自共享的 mmap 索引"""
+
+    domain = DOMAIN
+
+    def __init__(self, language, catalog, info, plural):
+        gettext_module.GNUTranslations.__init__(self)
+        self.__language = language
+        self.__to_language = to_language(language)
+        self._catalog = catalog
+        self._info = info
+        self.plural = plural
+
+    def __repr__(self):
+        return '<MappedTranslation lang:%s>' % self.__language
+
+    def language(self):
+        return self.__language
+
+    def to_language(self):
+        return self.__to_language
+
+    def ngettext(self, msgid1, msgid2, n):
+        try:
+            tmsg = self._catalog.plural(msgid1, n)
+        except KeyError:
+            if self._fallback:
+                return self._fallback.ngettext(msgid1, msgid2, n)
+            if n == 1:
+                tmsg = msgid1
+            else:
+                tmsg = msgid2
+        return tmsg
+
+
+def load_index(path):
+    """映射索引文件，返回 {语言代码: MappedTranslation}；文件不存在或格式不符时返回空dict"""
+    try:
+        with open(path, 'rb') as fp:
+            buffer = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return {}
+    try:
+        magic, version, directory_length = HEADER.unpack_from(buffer, 0)
+    except struct.error:
+        magic = version = None
+    if magic != MAGIC or version != VERSION:
+        buffer.close()
+        return {}
+    directory = json.loads(buffer[HEADER.size:HEADER.size + directory_length])
+    base = HEADER.size + directory_length
+
+    # 有 .mo 比索引新，说明编译翻译后忘了重建索引，此时退回 Django 默认的加载方式
+    index_mtime = os.path.getmtime(path)
+    for source in directory['sources']:
+        if not os.path.exists(source) or os.path.getmtime(source) > index_mtime:
+            buffer.close()
+            return {}
+
+    translations = {}
+    for language, section in directory['languages'].items():
+        catalog = MappedCatalog(buffer, base, directory['strings_offset'], section)
+        plural = gettext_module.c2py(section['plurals'][0]) if section['plurals'] else (lambda n: int(n != 1))
+        translations[language] = MappedTranslation(language, catalog, section['info'], plural)
+
+    # 和 DjangoTranslation 一样，非默认语言且非英语时回退到默认语言
+    for language, translation in translations.items():
+        if language != settings.LANGUAGE_CODE and not language.startswith('en'):
+            default = translations.get(settings.LANGUAGE_CODE) or trans_real.translation(settings.LANGUAGE_CODE)
+            translation.add_fallback(default)
+    return translations
+
+
+@functools.lru_cache(maxsize=None)
+def catalog_version():
+    """
+    当前翻译目录的版本号（LOCALE_PATHS 下各 .mo 与翻译索引的修改时间、大小的摘要）
+    翻译在进程启动时加载，部署新 .mo 后重启 worker 即得到新版本号，可用于缓存键
+    """
+    paths = [getattr(settings, 'TRANSLATION_INDEX', None) or '']
+    for localedir in settings.LOCALE_PATHS:
+        paths.extend(glob.glob(os.path.join(localedir, '*', 'LC_MESSAGES', '*.mo')))
+    digest = hashlib.md5()
+    for path in sorted(paths):
+        if os.path.exists(path):
+            stat = os.stat(path)
+            digest.update(('%s:%d:%d;' % (path, stat.st_mtime_ns, stat.st_size)).encode('utf-8'))
+    return digest.hexdigest()[:12]
+
+
+def install():
+    """启动时把索引中的翻译放进 Django 的翻译缓存，gettext_lazy/{% trans %} 无需任何改动"""
+    path = getattr(settings, 'TRANSLATION_INDEX', None)
+    if not path or not settings.USE_I18N:
+        return
+    supported = {code for code, name in settings.LANGUAGES}
+    for language, translation in load_index(path).items():
+        if language in supported:
+            trans_real._translations[language] = translation
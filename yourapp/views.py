@@ -1,7 +1,159 @@
+import copy
+import html
+import re
+from urllib.parse import urlsplit
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpResponse, JsonResponse, QueryDict
 from django.shortcuts import render
+from django.template.loader import render_to_string
+from django.urls import Resolver404, resolve, translate_url
+from django.utils import translation
+from django.utils.crypto import constant_time_compare
+from django.utils.datastructures import MultiValueDict
+from django.utils.http import url_has_allowed_host_and_scheme
+from django.utils.translation import gettext as _
+from django.views import i18n
+from django.views.decorators.cache import never_cache
+from django.views.decorators.csrf import ensure_csrf_cookie
+from django.views.decorators.http import require_POST
+
+from .jscatalog import catalog_url
+from .metrics import collect, render_prometheus
+from .middleware import cache_anonymous_page, language_from_cookie, set_language_cookie, switchable
 
+# 切换语言时返回的页面片段：名称对应页面中 data-fragment 属性，见 templates/base.html
+LANGUAGE_FRAGMENTS = {
+    'chrome': 'includes/chrome.html',
+}
+# 页面主体（data-fragment="content"）在 templates/base.html 中的起止标记
+CONTENT_START = '<!--content-->'
+CONTENT_END = '<!--/content-->'
+TITLE_RE = re.compile(r'<title>(.*?)</title>', re.S)
+
+@switchable
+@cache_anonymous_page
 def about_view(request):
     return render(request, 'pages/about.html')
 
+@switchable
+@cache_anonymous_page
 def home_view(request):
-    return render(request, 'pages/home.html')
\ No newline at end of file
+    return render(request, 'pages/home.html')
+
+@never_cache
+def metrics_view(request):
+    """Prometheus 抓取地址：管理员登录后可以直接访问，抓取程序使用 Authorization: Bearer <METRICS_TOKEN>"""
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    token_ok = bool(settings.METRICS_TOKEN) and constant_time_compare(authorization, 'Bearer ' + settings.METRICS_TOKEN)
+    if not token_ok and not request.user.is_staff:
+        return HttpResponse(status=403)
+    return HttpResponse(render_prometheus(collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def set_language(request):
+    """
+    django.views.i18n.set_language，但 next 带语言前缀时（LOCALE_URLS）按前缀对应的语言解析，
+    跳转到新语言前缀下的同一页面（/en/about/ -> /zh-hans/about/）。
+    Django 的 translate_url 只按当前语言解析，当前语言来自 cookie，与 URL 前缀不同时会解析失败而留在原页面
+    """
+    next_url = request.POST.get('next', request.GET.get('next')) or request.META.get('HTTP_REFERER')
+    language = translation.get_language_from_path(urlsplit(next_url).path) if next_url else None
+    with translation.override(language or translation.get_language()):
+        response = i18n.set_language(request)
+    # Django 只在语言有效时写入 cookie，已登录用户同时保存到 preferred_language
+    cookie = response.cookies.get(settings.LANGUAGE_COOKIE_NAME)
+    if cookie is not None and request.user.is_authenticated:
+        request.user.set_preferred_language(cookie.value)
+    return response
+
+
+def page_request(request, url):
+    """
+    request 的浅拷贝，路径和查询字符串换成 url 的，渲染页面片段时 request.path、get_full_path() 与该页面一致
+    已经解析并缓存的 GET、POST、FILES 不带到拷贝中：GET 按新的查询字符串重新解析，POST、FILES 为空
+    """
+    parts = urlsplit(url)
+    page = copy.copy(request)
+    page.path = page.path_info = parts.path or '/'
+    page.META = dict(request.META, QUERY_STRING=parts.query, REQUEST_METHOD='GET')
+    page.method = 'GET'
+    page.__dict__.pop('GET', None)
+    page._post, page._files = QueryDict(), MultiValueDict()
+    return page
+
+
+def render_page_content(page):
+    """
+    在当前语言下执行 page 对应的视图（GET），返回 (页面标题, 页面主体)
+    只调用标记了 @switchable 的同步视图；其他视图、不是 200 的 HTML 页面（跳转、404、没有主体标记的页面）
+    返回 None，由浏览器整页重新打开
+    """
+    try:
+        match = resolve(page.path_info)
+    except Resolver404:
+        return None
+    if not getattr(match.func, 'language_switchable', False) or iscoroutinefunction(match.func):
+        return None
+    page.resolver_match = match
+    try:
+        response = match.func(page, *match.args, **match.kwargs)
+    except (Http404, PermissionDenied):
+        return None
+    if callable(getattr(response, 'render', None)):
+        response = response.render()
+    if (response.status_code != 200 or response.streaming
+            or not response.get('Content-Type', '').startswith('text/html')):
+        return None
+    content = response.content.decode(response.charset)
+    start, end = content.find(CONTENT_START), content.rfind(CONTENT_END)
+    if start < 0 or end < start:
+        return None
+    title = TITLE_RE.search(content)
+    return html.unescape(title.group(1).strip()) if title else None, content[start + len(CONTENT_START):end]
+
+
+@require_POST
+def switch_language(request):
+    """
+    不跳转的语言切换（static/js/language.js）：保存选择（语言 cookie，已登录用户同时保存到 preferred_language），
+    返回新语言下的页面公共片段（LANGUAGE_FRAGMENTS）、页面主体和标题，由页面原地替换，省去 set_language 的 302。
+    next 是当前页面，带语言前缀时（LOCALE_URLS）同时返回新前缀下的地址。
+    页面主体不能单独渲染时返回 reload，由浏览器重新打开这个地址
+    """
+    language = language_from_cookie(request.POST.get('language', ''))
+    if language is None:
+        return JsonResponse({'error': _("Unsupported language")}, status=400)
+    next_url = request.POST.get('next', '')
+    if not url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()},
+                                           require_https=request.is_secure()):
+        next_url = '/'
+    with translation.override(translation.get_language_from_path(urlsplit(next_url).path) or translation.get_language()):
+        next_url = translate_url(next_url, language)
+    page = page_request(request, next_url)
+    with translation.override(language):
+        page.LANGUAGE_CODE = language
+        fragments = {
+            name: render_to_string(template_name, request=page)
+            for name, template_name in LANGUAGE_FRAGMENTS.items()
+        }
+        page_content = render_page_content(page)
+        data = {'language': language, 'url': next_url, 'fragments': fragments, 'catalog': catalog_url()}
+    if page_content is None:
+        data['reload'] = True
+    else:
+        data['title'], fragments['content'] = page_content
+    if request.user.is_authenticated:
+        request.user.set_preferred_language(language)
+    response = JsonResponse(data)
+    set_language_cookie(response, language)
+    return response
+
+
+@never_cache
+@ensure_csrf_cookie
+def csrf_cookie_view(request):
+    """设置 CSRF cookie，供可被代理缓存（没有 CSRF token）的页面在提交表单前获取"""
+    return HttpResponse(status=204)
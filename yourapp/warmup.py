@@ -0,0 +1,124 @@
+"""
+worker 接收请求之前的预热
+
+myproject/wsgi.py、asgi.py 加载应用后调用 warm_up()（settings.WARMUP 为 True 时）：
+编译 templates/ 下的全部模板放进 cached loader，加载所有 LANGUAGES 的翻译目录，
+按语言构建 URL 解析器，并实例化、渲染常用表单。
+gunicorn --preload 时这些工作在父进程完成，fork 出的 worker 通过写时复制共享；
+最后 gc.freeze() 把预热产生的对象移出垃圾回收的扫描范围，避免 worker 因 GC 写入而复制内存页。
+
+每个阶段执行两次：第一次的耗时是没有预热时由第一个请求承担的开销，第二次是预热之后的开销。
+预热不能打开数据库连接，否则 fork 出的 worker 会共享同一个连接。
+"""
+import gc
+import logging
+import os
+import time
+
+from django.conf import settings
+from django.template import engines
+from django.template.backends.django import DjangoTemplates
+from django.urls import get_resolver
+from django.utils import translation
+from django.utils.module_loading import import_string
+from django.utils.translation import trans_real
+
+logger = logging.getLogger(__name__)
+
+# 预热时实例化并渲染的表单
+FORMS = (
+    'accounts.forms.RegisterForm',
+    'accounts.forms.ProfileForm',
+    'accounts.forms.DocumentUploadForm',
+)
+
+
+def project_templates(engine):
+    """引擎 DIRS（即 templates/）下所有模板的名称"""
+    for directory in engine.dirs:
+        for root, dirs, files in os.walk(directory):
+            for name in files:
+                if name.endswith(('.html', '.txt', '.xml')):
+                    yield os.path.relpath(os.path.join(root, name), directory).replace(os.sep, '/')
+
+
+def load_templates():
+    count = 0
+    for engine in engines.all():
+        if not isinstance(engine, DjangoTemplates):
+            continue
+        for name in project_templates(engine):
+            engine.get_template(name)
+            count += 1
+    return count
+
+
+def load_catalogs():
+    from .jscatalog import load_manifest
+    from .translation import catalog_version
+
+    for code, name in settings.LANGUAGES:
+        trans_real.translation(code)
+    catalog_version()
+    load_manifest()
+    return len(settings.LANGUAGES)
+
+
+def load_urls():
+    resolver = get_resolver()
+    count = 0
+    for code, name in settings.LANGUAGES:
+        # 反向解析表按当前语言分别构建
+        with translation.override(code):
+            count = len(resolver.reverse_dict)
+    resolver.resolve('/')
+    return count
+
+
+def load_forms():
+    count = 0
+    for code, name in settings.LANGUAGES:
+        with translation.override(code):
+            for path in FORMS:
+                import_string(path)().as_p()
+                count += 1
+    return count
+
+
+PHASES = (
+    ('templates', load_templates),
+    ('catalogs', load_catalogs),
+    ('urls', load_urls),
+    ('forms', load_forms),
+)
+
+
+def _timed(phase):
+    start = time.perf_counter()
+    count = phase()
+    return count, time.perf_counter() - start
+
+
+def warm_up():
+    """执行所有预热阶段，返回 [(阶段, 数量, 预热前耗时, 预热后耗时)] 并写入日志"""
+    start = time.perf_counter()
+    results = []
+    for name, phase in PHASES:
+        count, cold = _timed(phase)
+        count, warm = _timed(phase)
+        results.append((name, count, cold, warm))
+    gc.freeze()
+    total = time.perf_counter() - start
+    logger.info("Warm-up finished in %.0fms (pid %d)", total * 1000, os.getpid())
+    for line in format_report(results):
+        logger.info(line)
+    return results
+
+
+def format_report(results):
+    lines = ['%-10s %6s %12s %12s' % ('phase', 'items', 'before (ms)', 'after (ms)')]
+    for name, count, cold, warm in results:
+        lines.append('%-10s %6d %12.1f %12.1f' % (name, count, cold * 1000, warm * 1000))
+    lines.append('%-10s %6s %12.1f %12.1f' % (
+        'total', '', sum(r[2] for r in results) * 1000, sum(r[3] for r in results) * 1000))
+    return lines